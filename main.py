@@ -1,17 +1,23 @@
+import os
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
+from src.conf.config import settings
 from src.database.db import get_db
 from src.routes import users, auth, product_category, prices, products, favorites, favorite_items, baskets, \
-    basket_items, images, product_sub_category, reviews, orders, cooperation, posts, ukr_poshta, nova_poshta
+    basket_items, images, product_sub_category, reviews, orders, cooperation, posts, ukr_poshta, nova_poshta, \
+    sales_analytics
 
 import logging
 from sentry_sdk.integrations.asgi import SentryAsgiMiddleware
 from src.conf.logging_config import setup_logging
+from src.services.image_storage import image_uploader
+from src.services.nova_poshta_client import nova_poshta_client
 from src.services.scheduler_tasks import start_scheduler, stop_scheduler
 from src.services.sentry import sentry_sdk
 
@@ -23,17 +29,24 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await nova_poshta_client.start()
     start_scheduler()
     try:
         yield
     finally:
         stop_scheduler()
+        image_uploader.shutdown()
+        await nova_poshta_client.close()
 
 
 app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(SentryAsgiMiddleware)
 
+if settings.image_storage == "local":
+    os.makedirs(settings.image_storage_local_dir, exist_ok=True)
+    app.mount(settings.image_storage_local_url, StaticFiles(directory=settings.image_storage_local_dir), name="media")
+
 origins = ["*"]
 
 app.add_middleware(
@@ -101,3 +114,4 @@ app.include_router(cooperation.router, prefix='/api')
 app.include_router(posts.router, prefix='/api')
 app.include_router(ukr_poshta.router, prefix='/api')
 app.include_router(nova_poshta.router, prefix='/api')
+app.include_router(sales_analytics.router, prefix='/api')
@@ -14,6 +14,14 @@ class Settings(BaseSettings):
     cloudinary_api_key: str = '_'
     cloudinary_api_secret: str = '_'
 
+    image_storage: str = 'cloudinary'
+    image_storage_local_dir: str = 'media'
+    image_storage_local_url: str = '/media'
+    image_upload_concurrency: int = 4
+    image_upload_max_files: int = 10
+    image_process_workers: int = 2
+    image_max_megabytes: int = 10
+
     mail_username: str = 'username'
     mail_password: str = 'password'
     mail_from: str = 'from'
@@ -28,8 +36,47 @@ class Settings(BaseSettings):
     redis_password: str = 'password'
     sentry_url: str = 'sentry_url'
 
+    stock_reservation_enabled: bool = False
+    stock_hold_minutes_wayforpay: int = 30
+    stock_hold_minutes_requisite: int = 0
+
+    idempotency_key_ttl_hours: int = 24
+    idempotency_wait_seconds: int = 30
+
+    sales_reconciliation_days: int = 7
+
+    outbox_batch_size: int = 50
+    outbox_poll_seconds: int = 5
+    outbox_max_attempts: int = 8
+    outbox_retry_base_seconds: int = 30
+    outbox_retry_max_seconds: int = 3600
+    outbox_retention_days: int = 30
+
+    admin_digest_window_seconds: int = 60
+    admin_digest_max_orders: int = 50
+    admin_addresses_cache_seconds: int = 300
+    # order confirmations cached at checkout, apart from the response cache that is flushed on every order
+    order_email_redis_db: int = 2
+
+    basket_store_enabled: bool = False
+    basket_redis_db: int = 1
+    basket_store_ttl_days: int = 14
+    basket_flush_seconds: int = 5
+    basket_flush_batch_size: int = 200
+
     api_key_nova_poshta: str = ""
     api_url_nova_poshta: str = "https://api.novaposhta.ua/v2.0/json/"
+    nova_poshta_sync_concurrency: int = 4
+    nova_poshta_requests_per_second: float = 5
+    nova_poshta_timeout_seconds: float = 15
+    nova_poshta_max_connections: int = 10
+    nova_poshta_retries: int = 3
+    nova_poshta_backoff_seconds: float = 0.5
+    nova_poshta_breaker_failures: int = 5
+    nova_poshta_breaker_reset_seconds: float = 30
+    nova_poshta_cache_seconds: int = 600
+    nova_poshta_directory_ttl_seconds: int = 3600
+    nova_poshta_settlements_file: str = ""
 
     class Config:
         env_file = '.env'
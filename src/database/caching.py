@@ -8,11 +8,11 @@ from src.conf.config import settings
 logger = logging.getLogger(__name__)
 
 
-def get_redis():
+def get_redis(db: int = 0):
     redis_client = redis.Redis(
         host=settings.redis_host,
         port=settings.redis_port,
-        db=0
+        db=db
     )
 # password = settings.redis_password,
     try:
@@ -1,6 +1,9 @@
 import enum
 
-from sqlalchemy import Column, ForeignKey, String, Integer, DateTime, func, Boolean, Table, Enum, Float
+from sqlalchemy import (
+    Column, ForeignKey, String, Integer, DateTime, Date, func, Boolean, Table, Enum, Float, Text, Index, UniqueConstraint,
+    JSON, and_
+)
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
@@ -97,6 +100,23 @@ class PostType(enum.Enum):
     ukr_poshta: str = 'ukr_poshta'
 
 
+class OutboxMessageType(enum.Enum):
+    """
+    Emails sent by the outbox worker.
+    """
+    order_confirmation: str = 'order_confirmation'
+    order_admin_notification: str = 'order_admin_notification'
+
+
+class OutboxStatus(enum.Enum):
+    """
+    Delivery status of an outbox message.
+    """
+    pending: str = 'pending'
+    sent: str = 'sent'
+    failed: str = 'failed'
+
+
 class UpdateFromDictMixin:
     def update_from_dict(self, data_dict):
         for key, value in data_dict.items():
@@ -157,6 +177,10 @@ class Product(Base):
     created_at = Column('created_at', DateTime, default=func.now())
     updated_at = Column('updated_at', DateTime, default=func.now())
     ordered_products = relationship("OrderedProduct", back_populates="products")
+    # rating of the checked reviews, recounted whenever a review of the product changes
+    rating_count = Column(Integer, default=0, server_default='0', nullable=False)
+    rating_average = Column(Float, default=0, server_default='0', nullable=False)
+    rating_histogram = Column(JSON, default=lambda: {str(rating.value): 0 for rating in Rating}, nullable=False)
 
 
 class Image(Base):
@@ -172,6 +196,18 @@ class Image(Base):
     image_type = Column('image_type', Enum(ImageType), default=None)
     is_deleted = Column(Boolean, default=False)
     main_image = Column(Boolean, default=False)
+    # sha256 of the uploaded file, images with the same content share the stored files
+    content_hash = Column(String(64), index=True, nullable=True)
+    # resized copies of the image: [{"width": 320, "format": "webp", "url": "..."}, ...]
+    variants = Column(JSON, default=list)
+
+    @property
+    def srcset(self) -> dict[str, str]:
+        """srcset of the variants per format, e.g. {"webp": "<url> 320w, <url> 640w"}"""
+        srcset = {}
+        for variant in self.variants or []:
+            srcset.setdefault(variant["format"], []).append(f"{variant['url']} {variant['width']}w")
+        return {image_format: ", ".join(urls) for image_format, urls in srcset.items()}
 
 
 class Price(Base):
@@ -222,6 +258,21 @@ class Review(Base):
     is_checked = Column(Boolean, default=False)
 
 
+# Reviews of a product page and the recount of the product rating
+Index(
+    'ix_reviews_product_id_rating_created_at_id',
+    Review.product_id, Review.rating, Review.created_at.desc(), Review.id.desc()
+)
+# Keyset pagination of the checked reviews of the shop
+Index(
+    'ix_reviews_rating_created_at_id_checked',
+    Review.rating, Review.created_at.desc(), Review.id.desc(),
+    postgresql_where=and_(Review.is_checked == True, Review.is_deleted == False)
+)
+# Moderation queue of the CRM, is_checked=false
+Index('ix_reviews_is_checked_is_deleted_created_at', Review.is_checked, Review.is_deleted, Review.created_at.desc())
+
+
 class Basket(Base):
     __tablename__ = 'baskets'
     id = Column(Integer, primary_key=True)
@@ -233,6 +284,10 @@ class Basket(Base):
 
 class BasketItem(Base):
     __tablename__ = 'basket_items'
+    __table_args__ = (
+        UniqueConstraint('basket_id', 'product_id', 'price_id_by_the_user', name='uq_basket_items_basket_product_price'),
+    )
+
     id = Column(Integer, primary_key=True)
     basket_id = Column(Integer, ForeignKey('baskets.id'))
     basket = relationship("Basket", back_populates="basket_items")
@@ -282,6 +337,8 @@ class Order(Base, UpdateFromDictMixin):
     selected_nova_poshta = relationship("NovaPoshta", back_populates="order")
     selected_ukr_poshta_id = Column(Integer, ForeignKey('ukr_poshta.id'))
     selected_ukr_poshta = relationship("UkrPoshta", back_populates="order")
+    stock_reserved = Column(Boolean, default=False)
+    reserved_until = Column(DateTime, nullable=True)
 
 
 class OrderedProduct(Base):
@@ -291,9 +348,16 @@ class OrderedProduct(Base):
     products = relationship("Product", back_populates="ordered_products")
     price_id = Column(Integer, ForeignKey('prices.id'))
     prices = relationship("Price", back_populates="ordered_products")
-    order_id = Column(Integer, ForeignKey('orders.id'))
+    order_id = Column(Integer, ForeignKey('orders.id'), index=True)
     order = relationship("Order", back_populates="ordered_products")
     quantity = Column(Integer)
+    # the price of one unit when the order was placed, the price itself may change later
+    unit_price = Column(Float, nullable=True)
+
+
+# Keyset pagination of the CRM order list and the order history of a user
+Index('ix_orders_status_order_created_at_id', Order.status_order, Order.created_at.desc(), Order.id.desc())
+Index('ix_orders_user_id_created_at', Order.user_id, Order.created_at)
 
 
 class Post(Base):
@@ -312,6 +376,7 @@ class Post(Base):
 
 class NovaPoshta(Base, UpdateFromDictMixin):
     __tablename__ = 'nova_poshta'
+    __table_args__ = (UniqueConstraint('warehouse_ref', name='uq_nova_poshta_warehouse_ref'),)
     id = Column(Integer, primary_key=True)
     address_warehouse = Column(String(255), nullable=True)
     category_warehouse = Column(String(255), nullable=True)
@@ -324,6 +389,12 @@ class NovaPoshta(Base, UpdateFromDictMixin):
     floor = Column(Integer, nullable=True)
     is_delivery = Column(Boolean, default=False)
     settlement_ref = Column(String(500), nullable=True)
+    # Ref of the warehouse in Nova Poshta, the key of the sync
+    warehouse_ref = Column(String(36), nullable=True)
+    # the number after № in address_warehouse
+    warehouse_number = Column(String(20), nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
     is_active = Column(Boolean, default=True)
 
     post = relationship(
@@ -332,6 +403,29 @@ class NovaPoshta(Base, UpdateFromDictMixin):
     order = relationship("Order", back_populates="selected_nova_poshta")
 
 
+# Warehouses of a city by number, equality and prefix lookups
+Index(
+    'ix_nova_poshta_settlement_ref_category_number',
+    NovaPoshta.settlement_ref,
+    NovaPoshta.category_warehouse,
+    NovaPoshta.warehouse_number,
+    postgresql_ops={'warehouse_number': 'varchar_pattern_ops'},
+)
+
+
+class NovaPoshtaSettlement(Base):
+    """Settlements of the Nova Poshta directory, the source of the settlement suggestions"""
+    __tablename__ = 'nova_poshta_settlements'
+    id = Column(Integer, primary_key=True)
+    settlement_ref = Column(String(36), unique=True, nullable=False)
+    name = Column(String(255), nullable=False)
+    name_ru = Column(String(255), nullable=True)
+    settlement_type = Column(String(255), nullable=True)
+    area = Column(String(255), nullable=True)
+    region = Column(String(255), nullable=True)
+    has_warehouses = Column(Boolean, default=False)
+
+
 class UkrPoshta(Base, UpdateFromDictMixin):
     __tablename__ = 'ukr_poshta'
     id = Column(Integer, primary_key=True)
@@ -390,3 +484,74 @@ class UsedEmailToken(Base):
     id = Column(Integer, primary_key=True)
     email_token = Column(String(255), unique=True, nullable=False)
     added_at = Column(DateTime, default=func.now())
+
+
+class IdempotencyKey(Base):
+    __tablename__ = 'idempotency_keys'
+
+    id = Column(Integer, primary_key=True)
+    key = Column(String(255), unique=True, nullable=False)
+    fingerprint = Column(String(64), nullable=True)
+    status_code = Column(Integer, nullable=True)
+    response = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
+
+class OutboxMessage(Base):
+    __tablename__ = 'outbox_messages'
+
+    id = Column(Integer, primary_key=True)
+    message_type = Column('message_type', Enum(OutboxMessageType), nullable=False)
+    # admin notifications go to the admin addresses of the moment they are sent
+    recipient = Column(String(150), nullable=True)
+    order_id = Column(Integer, ForeignKey('orders.id'), nullable=False)
+    order = relationship("Order")
+    status = Column('status', Enum(OutboxStatus), default=OutboxStatus.pending, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime, default=func.now())
+    created_at = Column(DateTime, default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+
+
+# The worker only looks for due pending messages
+Index('ix_outbox_messages_status_next_attempt_at', OutboxMessage.status, OutboxMessage.next_attempt_at)
+
+
+class SalesDailyProduct(Base):
+    __tablename__ = 'sales_daily_products'
+    __table_args__ = (UniqueConstraint('day', 'status_order', 'product_id', 'price_id'),)
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    status_order = Column('status_order', Enum(OrdersStatus), nullable=False)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    price_id = Column(Integer, ForeignKey('prices.id'), nullable=False)
+    weight = Column(String(20), nullable=True)
+    orders_count = Column(Integer, default=0, nullable=False)
+    units = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0, nullable=False)
+
+
+class SalesDailyPayment(Base):
+    __tablename__ = 'sales_daily_payments'
+    __table_args__ = (UniqueConstraint('day', 'status_order', 'payment_type'),)
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    status_order = Column('status_order', Enum(OrdersStatus), nullable=False)
+    payment_type = Column('payment_type', Enum(PaymentsTypes), nullable=False)
+    orders_count = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0, nullable=False)
+
+
+class SalesDailyPost(Base):
+    __tablename__ = 'sales_daily_posts'
+    __table_args__ = (UniqueConstraint('day', 'status_order', 'post_type'),)
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    status_order = Column('status_order', Enum(OrdersStatus), nullable=False)
+    post_type = Column('post_type', Enum(PostType), nullable=False)
+    orders_count = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0, nullable=False)
@@ -1,12 +1,12 @@
 from typing import List, Optional, Type
 
 from fastapi import HTTPException, status
-from sqlalchemy import asc
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, asc, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, selectinload
 
 
-from src.database.models import BasketItem, User, Basket, Product
-from src.schemas.basket_items import BasketItemsModel
+from src.database.models import BasketItem, User, Basket, Product, Price
 
 
 async def create(
@@ -42,14 +42,29 @@ async def get_existing_basket_item(basket: Basket, product_id: int, price_id: in
     ).first()
 
 
-async def update(body: BasketItemsModel, basket: Basket, db: Session):
-    existing_basket_item = await get_existing_basket_item(basket, body.product_id, body.price_id_by_the_user, db)
-
-    if existing_basket_item:
-        existing_basket_item.quantity += body.quantity
-        db.commit()
-        db.refresh(existing_basket_item)
-        return existing_basket_item
+async def add_basket_items(basket_id: int, quantities: dict[tuple[int, int], int], db: Session) -> None:
+    """
+    Add the quantities of (product_id, price_id) lines to the basket with one INSERT ... ON CONFLICT,
+    a line that is already in the basket gets the quantity added to it.
+    """
+    if any(quantity <= 0 for quantity in quantities.values()):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid quantity. Product quantity must be greater than 0."
+        )
+    if not quantities:
+        return
+
+    rows = [
+        {"basket_id": basket_id, "product_id": product_id, "price_id_by_the_user": price_id, "quantity": quantity}
+        for (product_id, price_id), quantity in quantities.items()
+    ]
+    stmt = insert(BasketItem).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["basket_id", "product_id", "price_id_by_the_user"],
+        set_={"quantity": BasketItem.quantity + stmt.excluded.quantity},
+    ))
+    db.commit()
 
 
 async def basket_items(current_user: User, db: Session) -> List[BasketItem] | None:
@@ -62,19 +77,30 @@ async def basket_items(current_user: User, db: Session) -> List[BasketItem] | No
     return basket_items_
 
 
-async def basket_item(
-        body: BasketItemsModel, current_user: User, db: Session, price_id_by_the_user: int = None
-) -> Type[BasketItem] | None:
-    query = db.query(BasketItem).join(Basket).filter(
-        BasketItem.product_id == body.product_id,
-        Basket.user_id == current_user.id
+async def basket_lines(current_user: User, db: Session) -> list:
+    """
+    All lines of the basket of the user in one query.
+
+    A row is (BasketItem, Product, Price, subtotal, total): Price is the price chosen by the user
+    and None when it is not active anymore, total is the sum of the subtotals of the basket.
+    """
+    subtotal = Price.price * BasketItem.quantity
+    return (
+        db.query(BasketItem, Product, Price, subtotal.label("subtotal"), func.sum(subtotal).over().label("total"))
+        .join(Basket, Basket.id == BasketItem.basket_id)
+        .join(Product, Product.id == BasketItem.product_id)
+        .outerjoin(Price, and_(
+            Price.id == BasketItem.price_id_by_the_user,
+            Price.product_id == BasketItem.product_id,
+            Price.is_deleted == False,
+            Price.is_active == True
+        ))
+        .options(selectinload(Product.subcategories))
+        .filter(Basket.user_id == current_user.id)
+        .order_by(asc(Product.name), asc(BasketItem.id))
+        .all()
     )
 
-    if price_id_by_the_user is not None:
-        query = query.filter(BasketItem.price_id_by_the_user == price_id_by_the_user)
-
-    return query.first()
-
 
 async def basket_item_for_id(basket_item_id: int, db: Session) -> Type[BasketItem] | None:
     return db.query(BasketItem).filter(BasketItem.id == basket_item_id).first()
@@ -93,3 +119,49 @@ async def update_quantity(basket_item_: Type[BasketItem], quantity: int, db) ->
         db.refresh(basket_item_)
         return basket_item_
     return None
+
+
+async def basket_items_by_basket_id(basket_id: int, db: Session) -> List[BasketItem]:
+    return db.query(BasketItem).filter(BasketItem.basket_id == basket_id).all()
+
+
+async def next_basket_item_ids(count: int, db: Session) -> List[int]:
+    """Take the ids of new basket items before their rows are written"""
+    if not count:
+        return []
+    return db.execute(
+        select(func.nextval("basket_items_id_seq")).select_from(func.generate_series(1, count))
+    ).scalars().all()
+
+
+async def replace_basket_items(baskets: dict[int, list[dict]], db: Session) -> None:
+    """
+    Make the rows of the given baskets equal to the given lines:
+    one DELETE for the removed lines and one INSERT ... ON CONFLICT for the rest.
+    """
+    if not baskets:
+        return
+
+    kept_ids = [line["id"] for lines in baskets.values() for line in lines]
+
+    removed = db.query(BasketItem).filter(BasketItem.basket_id.in_(baskets.keys()))
+    if kept_ids:
+        removed = removed.filter(BasketItem.id.notin_(kept_ids))
+    removed.delete(synchronize_session=False)
+
+    rows = [
+        {
+            "id": line["id"],
+            "basket_id": basket_id,
+            "product_id": line["product_id"],
+            "quantity": line["quantity"],
+            "price_id_by_the_user": line["price_id"],
+        }
+        for basket_id, lines in baskets.items()
+        for line in lines
+    ]
+    if rows:
+        stmt = insert(BasketItem).values(rows)
+        db.execute(stmt.on_conflict_do_update(index_elements=["id"], set_={"quantity": stmt.excluded.quantity}))
+
+    db.commit()
@@ -15,3 +15,8 @@ async def create(current_user: User, db: Session):
 async def baskets(current_user: User, db: Session) -> Basket | None:
     basket = db.query(Basket).filter(Basket.user_id == current_user.id).first()
     return basket
+
+
+async def lock_baskets(basket_ids: list[int], db: Session) -> None:
+    """Lock the rows of the baskets until the transaction ends, in id order so concurrent locks never deadlock"""
+    db.query(Basket.id).filter(Basket.id.in_(basket_ids)).order_by(Basket.id).with_for_update().all()
@@ -1,7 +1,7 @@
 from typing import List
 
 from sqlalchemy import asc
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
 
 from src.database.models import FavoriteItem, User, Favorite, Product
@@ -16,14 +16,21 @@ async def create(body: FavoriteItemsModel, favorite: Favorite, db: Session):
     return new_favorite_item
 
 
-async def favorite_items(current_user: User, db: Session) -> List[FavoriteItem] | None:
-    favorite_items_ = db.query(FavoriteItem.id, FavoriteItem.favorite_id, FavoriteItem.product_id) \
-        .join(Favorite, Favorite.id == FavoriteItem.favorite_id) \
-        .join(Product, Product.id == FavoriteItem.product_id) \
-        .filter(Favorite.user_id == current_user.id) \
-        .order_by(Product.name.asc()) \
+async def favorite_products(current_user: User, db: Session) -> List[tuple[FavoriteItem, Product]]:
+    """Favorite items of the user with their products, subcategories, images and prices in four queries"""
+    return (
+        db.query(FavoriteItem, Product)
+        .join(Favorite, Favorite.id == FavoriteItem.favorite_id)
+        .join(Product, Product.id == FavoriteItem.product_id)
+        .options(
+            selectinload(Product.subcategories),
+            selectinload(Product.images),
+            selectinload(Product.prices),
+        )
+        .filter(Favorite.user_id == current_user.id)
+        .order_by(Product.name.asc())
         .all()
-    return favorite_items_
+    )
 
 
 async def favorite_item(body: FavoriteItemsModel, current_user: User, db: Session) -> Product:
@@ -36,8 +43,10 @@ async def favorite_item(body: FavoriteItemsModel, current_user: User, db: Sessio
     return favorite_item_
 
 
-async def get_f_item_from_product_id(product_id: int, db: Session):
-    favorite_item_ = db.query(FavoriteItem).filter(product_id == product_id).first()
+async def get_f_item_from_product_id(product_id: int, favorite: Favorite, db: Session):
+    favorite_item_ = db.query(FavoriteItem).filter(
+        FavoriteItem.product_id == product_id, FavoriteItem.favorite_id == favorite.id
+    ).first()
     return favorite_item_
 
 
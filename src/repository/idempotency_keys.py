@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.database.models import IdempotencyKey
+
+
+async def get_idempotency_key(key: str, db: Session) -> IdempotencyKey | None:
+    return db.query(IdempotencyKey).filter_by(key=key).populate_existing().first()
+
+
+async def add_idempotency_key(key: str, fingerprint: str, db: Session) -> bool:
+    """Insert the key as in progress, returns False when another request already owns it"""
+    db.add(IdempotencyKey(key=key, fingerprint=fingerprint))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+
+async def complete_idempotency_key(key: str, status_code: int, response: str, db: Session) -> None:
+    db.query(IdempotencyKey).filter_by(key=key).update(
+        {IdempotencyKey.status_code: status_code, IdempotencyKey.response: response}
+    )
+    db.commit()
+
+
+async def delete_idempotency_key(key: str, db: Session) -> None:
+    db.query(IdempotencyKey).filter_by(key=key).delete()
+    db.commit()
+
+
+async def delete_stale_idempotency_key(key: str, stale_after: timedelta, db: Session) -> None:
+    """Remove the in progress key of a request that died before completing it"""
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.key == key,
+        IdempotencyKey.status_code.is_(None),
+        IdempotencyKey.created_at < func.now() - stale_after,
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+async def delete_expired_idempotency_keys(ttl: timedelta, db: Session) -> None:
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.created_at < func.now() - ttl
+    ).delete(synchronize_session=False)
+    db.commit()
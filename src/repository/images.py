@@ -1,10 +1,10 @@
 from typing import List, Type
 
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc
+from sqlalchemy import and_, asc, desc
 
 from src.database.models import User, Image, ImageType
-from src.schemas.images import ImageModel, ImageResponse, ImageModelReview
+from src.schemas.images import ImageModel, ImageResponse, ImageModelReview, UploadedImage
 from src.services.cloud_image import CloudImage
 
 
@@ -20,9 +20,33 @@ async def get_image(image_id: int, user: User, db: Session) -> Image | None:
     return image
 
 
-async def create(body: ImageModel, image_url: str, product_id: int, db: Session) -> Image:
+async def main_images_by_product_ids(product_ids: List[int], db: Session) -> dict[int, Image]:
+    """The main image of every product in one query, the first image when no image is marked as main"""
+    images = db.query(Image).filter(
+        Image.product_id.in_(set(product_ids)), Image.is_deleted == False
+    ).order_by(desc(Image.main_image), asc(Image.id)).all()
+
+    main_images = {}
+    for image in images:
+        main_images.setdefault(image.product_id, image)
+    return main_images
+
+
+async def images_by_content_hashes(content_hashes: List[str], db: Session) -> dict[str, Image]:
+    """An already stored image of every known content hash, in one query"""
+    images = db.query(Image).filter(Image.content_hash.in_(set(content_hashes))).order_by(asc(Image.id)).all()
+
+    stored = {}
+    for image in images:
+        stored.setdefault(image.content_hash, image)
+    return stored
+
+
+async def create(body: ImageModel, uploaded: UploadedImage, product_id: int, db: Session) -> Image:
     image = Image(description=body.description,
-                  image_url=image_url,
+                  image_url=uploaded.image_url,
+                  content_hash=uploaded.content_hash,
+                  variants=uploaded.variants,
                   image_type=ImageType.product,
                   product_id=product_id,
                   main_image=body.main_image)
@@ -32,9 +56,30 @@ async def create(body: ImageModel, image_url: str, product_id: int, db: Session)
     return image
 
 
-async def create_image_review(body: ImageModelReview, image_url: str, product_id: int, db: Session) -> Image:
+async def create_many(body: ImageModel, uploaded_images: List[UploadedImage], product_id: int, db: Session) -> List[Image]:
+    """Images of the product uploaded together, only the first one can be the main image"""
+    images = [
+        Image(description=body.description,
+              image_url=uploaded.image_url,
+              content_hash=uploaded.content_hash,
+              variants=uploaded.variants,
+              image_type=ImageType.product,
+              product_id=product_id,
+              main_image=body.main_image and index == 0)
+        for index, uploaded in enumerate(uploaded_images)
+    ]
+    db.add_all(images)
+    db.commit()
+    for image in images:
+        db.refresh(image)
+    return images
+
+
+async def create_image_review(body: ImageModelReview, uploaded: UploadedImage, product_id: int, db: Session) -> Image:
     image = Image(description=body.description,
-                  image_url=image_url,
+                  image_url=uploaded.image_url,
+                  content_hash=uploaded.content_hash,
+                  variants=uploaded.variants,
                   image_type=ImageType.review,
                   product_id=product_id,
                   review_id=body.review_id)
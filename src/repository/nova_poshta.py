@@ -1,61 +1,21 @@
-import asyncio
+import logging
 from typing import Optional
 
-import httpx
-import logging
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import String, column, exists, func, or_, select, update, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, aliased
 
-from src.conf.config import settings
-from src.database.models import NovaPoshta, post_novaposhta_association, Post, User
+from src.database.models import NovaPoshta, NovaPoshtaSettlement, post_novaposhta_association, Post, User
 from src.services.exception_detail import ExDetail as Ex
-from src.services.nova_poshta import extract_warehouse_number, NUMBER_REGEX
 
 logger = logging.getLogger(__name__)
 
-API_KEY = settings.api_key_nova_poshta
-API_URL = settings.api_url_nova_poshta
-
-
-async def create_nova_poshta_warehouse(
-    city: str,
-    address_warehouse: str,
-    category_warehouse: str,
-    settle_ref: str,
-    area: str,
-    region: str,
-    db: Session,
-) -> NovaPoshta:
-    db_warehouse = NovaPoshta(
-        city=city,
-        address_warehouse=address_warehouse,
-        category_warehouse=category_warehouse,
-        area=area,
-        region=region,
-        settlement_ref=settle_ref,
-    )
-
-    db.add(db_warehouse)
-    db.commit()
-    db.refresh(db_warehouse)
-
-    return db_warehouse
-
 
 async def get_all_warehouses(db: Session) -> list[NovaPoshta]:
     return db.query(NovaPoshta).all()
 
 
-async def get_warehouse_by_ref_and_address_warehouse(
-    address_warehouse: str, settle_ref: str, db: Session
-) -> NovaPoshta:
-    warehouse = db.query(NovaPoshta).filter_by(
-        settlement_ref=settle_ref, address_warehouse=address_warehouse, is_active=True
-    ).first()
-
-    return warehouse
-
-
 async def get_warehouse_by_ref_and_number(
     settle_ref: str, category: str, db: Session, number: str = None,
 ) -> Optional[NovaPoshta]:
@@ -65,229 +25,195 @@ async def get_warehouse_by_ref_and_number(
         NovaPoshta.is_active == True,
     )
     if number:
-        warehouses = query.all()
-        for warehouse in warehouses:
-            branch_number = extract_warehouse_number(warehouse.address_warehouse, NUMBER_REGEX)
-            if branch_number == number:
-                return warehouse
-    else:
-        return query.first()
-
-    return None
-
-
-async def get_warehouses_specific_city(settle_ref: str) -> list:
-    url = f"{API_URL}"
-    payload = {
-        "apiKey": API_KEY,
-        "modelName": "Address",
-        "calledMethod": "getWarehouses",
-        "methodProperties": {
-            "SettlementRef": settle_ref
-        },
-    }
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url=url, json=payload)
-
-    response.raise_for_status()
-    data = response.json()
-
-    if not data.get("success"):
-        logger.error(f"Error: Query for reference {settle_ref} was not successful.")
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail="Failed to fetch warehouses from Nova Poshta")
-
-    return data.get("data", [])
-
-
-async def get_postomats(db: Session, settle_ref: str, search_term: str = None) -> list:
-    if search_term:
-        existing_postomat = await get_warehouse_by_ref_and_number(
-            db=db, settle_ref=settle_ref, category="Поштомат", number=search_term
+        query = query.filter(NovaPoshta.warehouse_number == number)
+
+    return query.first()
+
+
+async def get_warehouses_by_ref_and_number(settle_ref: str, category: str, number: str, db: Session) -> list:
+    """
+    id, address and number of the active warehouse with the number, or of the warehouses whose
+    number starts with it, both are lookups in ix_nova_poshta_settlement_ref_category_number
+    """
+    query = db.query(NovaPoshta.id, NovaPoshta.address_warehouse, NovaPoshta.warehouse_number).filter(
+        NovaPoshta.settlement_ref == settle_ref,
+        NovaPoshta.category_warehouse == category,
+        NovaPoshta.is_active == True,
+    )
+
+    warehouse = query.filter(NovaPoshta.warehouse_number == number).first()
+    if warehouse:
+        return [warehouse]
+
+    return (
+        query.filter(NovaPoshta.warehouse_number.startswith(number, autoescape=True))
+        .order_by(func.length(NovaPoshta.warehouse_number), NovaPoshta.warehouse_number)
+        .all()
+    )
+
+
+async def active_warehouses_of_city(settle_ref: str, db: Session) -> list:
+    """id, address, number and category of the active warehouses of the city"""
+    return (
+        db.query(NovaPoshta.id, NovaPoshta.address_warehouse, NovaPoshta.warehouse_number,
+                 NovaPoshta.category_warehouse)
+        .filter(
+            NovaPoshta.settlement_ref == settle_ref,
+            NovaPoshta.is_delivery.isnot(True),
+            NovaPoshta.is_active == True,
         )
-        if existing_postomat:
-            return [{"id": existing_postomat.id, "address_warehouse": existing_postomat.address_warehouse}]
-
-    warehouse_data = await get_warehouses_specific_city(settle_ref=settle_ref)
-
-    postomats = []
-    for item in warehouse_data:
-        address_warehouse = item.get("Description", "")
-        city_name = item.get("SettlementDescription", "")
-        area_name = item.get("SettlementAreaDescription", "")
-        region_name = item.get("SettlementRegionsDescription", "")
-
-        postomat_number = extract_warehouse_number(address=address_warehouse, regex=NUMBER_REGEX)
-
-        if search_term and search_term not in postomat_number:
-            continue
-
-        if "поштомат" in address_warehouse.lower():
-            existing_warehouse = await get_warehouse_by_ref_and_address_warehouse(
-                settle_ref=settle_ref, address_warehouse=address_warehouse, db=db
-            )
-
-            if not existing_warehouse:
-                new_warehouse = await create_nova_poshta_warehouse(
-                    city=city_name,
-                    area=area_name,
-                    region=region_name,
-                    address_warehouse=address_warehouse,
-                    category_warehouse="Поштомат",
-                    settle_ref=settle_ref,
-                    db=db,
-                )
-                postomats.append({"id": new_warehouse.id, "address_warehouse": address_warehouse})
-            else:
-                postomats.append({"id": existing_warehouse.id, "address_warehouse": address_warehouse})
-
-    return postomats
-
-
-async def get_branches(db: Session, settle_ref: str, search_term: str = None) -> list:
-    if search_term:
-        existing_branch = await get_warehouse_by_ref_and_number(
-            db=db, settle_ref=settle_ref, category="Відділення", number=search_term
+        .order_by(NovaPoshta.id)
+        .all()
+    )
+
+
+async def active_warehouses_with_location(db: Session) -> list:
+    """Active warehouses of all cities that have coordinates"""
+    return (
+        db.query(
+            NovaPoshta.id,
+            NovaPoshta.address_warehouse,
+            NovaPoshta.city,
+            NovaPoshta.settlement_ref,
+            NovaPoshta.category_warehouse,
+            NovaPoshta.latitude,
+            NovaPoshta.longitude,
         )
-        if existing_branch:
-            return [{"id": existing_branch.id, "address_warehouse": existing_branch.address_warehouse}]
-
-    warehouse_data = await get_warehouses_specific_city(settle_ref=settle_ref)
-
-    branches = []
-    for item in warehouse_data:
-        address_warehouse = item.get("Description", "")
-        city_name = item.get("SettlementDescription", "")
-        area_name = item.get("SettlementAreaDescription", "")
-        region_name = item.get("SettlementRegionsDescription", "")
-
-        branch_number = extract_warehouse_number(address=address_warehouse, regex=NUMBER_REGEX)
-
-        if search_term and search_term not in branch_number:
-            continue
-
-        if "поштомат" not in address_warehouse.lower():
-            existing_warehouse = await get_warehouse_by_ref_and_address_warehouse(
-                settle_ref=settle_ref, address_warehouse=address_warehouse, db=db
-            )
-
-            if not existing_warehouse:
-                new_warehouse = await create_nova_poshta_warehouse(
-                    city=city_name,
-                    area=area_name,
-                    region=region_name,
-                    address_warehouse=address_warehouse,
-                    category_warehouse="Відділення",
-                    settle_ref=settle_ref,
-                    db=db,
-                )
-                branches.append({"id": new_warehouse.id, "address_warehouse": address_warehouse})
-            else:
-                branches.append({"id": existing_warehouse.id, "address_warehouse": address_warehouse})
-
-    return branches
-
-
-async def update_warehouses_data(db: Session) -> None:
-    unique_refs = [
-        ref[0] for ref in db.query(NovaPoshta.settlement_ref).distinct().all()
-    ]
-
-    for ref in unique_refs:
-        warehouses_in_database = (
-            db.query(NovaPoshta).filter_by(settlement_ref=ref).all()
+        .filter(
+            NovaPoshta.is_delivery.isnot(True),
+            NovaPoshta.is_active == True,
+            NovaPoshta.latitude.isnot(None),
+            NovaPoshta.longitude.isnot(None),
         )
+        .all()
+    )
+
 
-        url = f"{API_URL}"
-        payload = {
-            "apiKey": API_KEY,
-            "modelName": "Address",
-            "calledMethod": "getWarehouses",
-            "methodProperties": {
-                "SettlementRef": ref
+async def settlement_refs(db: Session) -> list[str]:
+    """Refs of the cities that have warehouses in the database"""
+    refs = db.query(NovaPoshta.settlement_ref).filter(NovaPoshta.settlement_ref.isnot(None)).distinct().all()
+    return [ref[0] for ref in refs]
+
+
+def _adopt_warehouses_without_ref(settle_ref: str, warehouses: list[dict], db: Session) -> None:
+    """
+    Warehouses stored before they had a warehouse_ref get the ref of the warehouse
+    with the same number in the API data, so the upsert updates them instead of adding copies.
+    """
+    refs_by_number = {}
+    for warehouse in warehouses:
+        if warehouse["warehouse_number"]:
+            refs_by_number.setdefault(warehouse["warehouse_number"], warehouse["warehouse_ref"])
+    if not refs_by_number:
+        return
+
+    api = values(column("number", String), column("warehouse_ref", String), name="api").data(
+        list(refs_by_number.items())
+    )
+    holder = aliased(NovaPoshta)
+    matched = (
+        select(NovaPoshta.id, api.c.warehouse_ref)
+        .join(api, NovaPoshta.warehouse_number == api.c.number)
+        .filter(
+            NovaPoshta.settlement_ref == settle_ref,
+            NovaPoshta.warehouse_ref.is_(None),
+            NovaPoshta.is_delivery.isnot(True),
+            ~exists().where(holder.warehouse_ref == api.c.warehouse_ref),
+        )
+        .distinct(api.c.warehouse_ref)
+        .order_by(api.c.warehouse_ref, NovaPoshta.id)
+        .subquery()
+    )
+
+    db.execute(
+        update(NovaPoshta)
+        .where(NovaPoshta.id == matched.c.id)
+        .values(warehouse_ref=matched.c.warehouse_ref)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def upsert_city_warehouses(settle_ref: str, warehouses: list[dict], db: Session) -> None:
+    """
+    Replace the warehouses of the city with the warehouses from the API in one transaction:
+    new ones are added, changed ones are updated by warehouse_ref with one INSERT ... ON CONFLICT,
+    and the ones missing in the API data are marked as inactive.
+    """
+    _adopt_warehouses_without_ref(settle_ref, warehouses, db)
+
+    if warehouses:
+        stmt = insert(NovaPoshta).values([
+            {**warehouse, "settlement_ref": settle_ref, "is_active": True, "is_delivery": False}
+            for warehouse in warehouses
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[NovaPoshta.warehouse_ref],
+            set_={
+                "address_warehouse": stmt.excluded.address_warehouse,
+                "warehouse_number": stmt.excluded.warehouse_number,
+                "category_warehouse": stmt.excluded.category_warehouse,
+                "city": stmt.excluded.city,
+                "area": stmt.excluded.area,
+                "region": stmt.excluded.region,
+                "settlement_ref": stmt.excluded.settlement_ref,
+                "latitude": stmt.excluded.latitude,
+                "longitude": stmt.excluded.longitude,
+                "is_active": True,
+            },
+        ))
+
+    api_refs = [warehouse["warehouse_ref"] for warehouse in warehouses]
+    inactive = db.query(NovaPoshta).filter(
+        NovaPoshta.settlement_ref == settle_ref,
+        NovaPoshta.is_delivery.isnot(True),
+        NovaPoshta.is_active == True,
+        or_(NovaPoshta.warehouse_ref.is_(None), NovaPoshta.warehouse_ref.notin_(api_refs)),
+    ).update({NovaPoshta.is_active: False}, synchronize_session=False)
+
+    db.commit()
+    logger.info(f"Synced {len(warehouses)} warehouses of {settle_ref}, {inactive} marked as inactive")
+
+
+async def upsert_settlements(settlements: list[dict], db: Session, batch_size: int = 1000) -> None:
+    """Add new settlements and update the known ones by settlement_ref, in one transaction"""
+    for start in range(0, len(settlements), batch_size):
+        stmt = insert(NovaPoshtaSettlement).values(settlements[start:start + batch_size])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[NovaPoshtaSettlement.settlement_ref],
+            set_={
+                "name": stmt.excluded.name,
+                "name_ru": stmt.excluded.name_ru,
+                "settlement_type": stmt.excluded.settlement_type,
+                "area": stmt.excluded.area,
+                "region": stmt.excluded.region,
+                "has_warehouses": stmt.excluded.has_warehouses,
             },
-        }
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url=url, json=payload)
-
-        response.raise_for_status()
-        data = response.json()
-
-        if not data.get("success"):
-            logger.error(f"Error: Query for reference {ref} was not successful.")
-            continue
-
-        warehouse_data = data.get("data", [])
-
-        warehouses_from_api = []
-        for item in warehouse_data:
-            address_warehouse = item.get("Description", "")
-            city_name = item.get("SettlementDescription", "")
-            area_name = item.get("SettlementAreaDescription", "")
-            region_name = item.get("SettlementRegionsDescription", "")
-            if "поштомат" in address_warehouse.lower():
-                category_warehouse = "Поштомат"
-            else:
-                category_warehouse = "Відділення"
-
-            warehouses_from_api.append(
-                {
-                    "address_warehouse": address_warehouse,
-                    "category_warehouse": category_warehouse,
-                    "city": city_name,
-                    "area": area_name,
-                    "region": region_name,
-                    "settlement_ref": ref
-                }
-            )
-
-        warehouse_dict_db = {}
-        for warehouse_db in warehouses_in_database:
-            db_number = extract_warehouse_number(warehouse_db.address_warehouse, NUMBER_REGEX)
-            if db_number:
-                warehouse_dict_db[db_number] = warehouse_db
-
-        api_numbers = set()
-        for warehouse_api in warehouses_from_api:
-            api_number = extract_warehouse_number(warehouse_api["address_warehouse"], NUMBER_REGEX)
-            if not api_number:
-                continue
-
-            api_numbers.add(api_number)
-
-            matched_warehouse_db = warehouse_dict_db.get(api_number)
-
-            if matched_warehouse_db:
-                # Update the address if it has changed
-                if matched_warehouse_db.address_warehouse != warehouse_api["address_warehouse"]:
-                    matched_warehouse_db.address_warehouse = warehouse_api["address_warehouse"]
-                    logger.info(f"Updated address for warehouse: {matched_warehouse_db}")
-                    db.add(matched_warehouse_db)
-            else:
-                # Add a new warehouse if not found in the database
-                new_warehouse = await create_nova_poshta_warehouse(
-                    city=warehouse_api["city"],
-                    area=warehouse_api["area"],
-                    region=warehouse_api["region"],
-                    address_warehouse=warehouse_api["address_warehouse"],
-                    category_warehouse=warehouse_api["category_warehouse"],
-                    settle_ref=warehouse_api["settlement_ref"],
-                    db=db,
-                )
-                logger.info(f"Added a new warehouse into database: {new_warehouse}")
-
-        # Mark warehouses not found in the API response as inactive
-        for warehouse_db in warehouses_in_database:
-            db_number = extract_warehouse_number(warehouse_db.address_warehouse, NUMBER_REGEX)
-            if db_number and db_number not in api_numbers:
-                warehouse_db.is_active = False
-                logger.info(f"Marked the warehouse as inactive: {warehouse_db}")
-
-        await asyncio.sleep(2)
+        ))
 
     db.commit()
+    logger.info(f"Saved {len(settlements)} settlements")
+
+
+async def get_all_settlements(db: Session) -> list:
+    return db.query(
+        NovaPoshtaSettlement.settlement_ref,
+        NovaPoshtaSettlement.name,
+        NovaPoshtaSettlement.name_ru,
+        NovaPoshtaSettlement.settlement_type,
+        NovaPoshtaSettlement.area,
+        NovaPoshtaSettlement.region,
+        NovaPoshtaSettlement.has_warehouses,
+    ).all()
+
+
+async def settlement_has_warehouses(settle_ref: str, db: Session) -> bool:
+    """The settlement is in the directory of Nova Poshta and has warehouses"""
+    return db.query(
+        exists().where(
+            NovaPoshtaSettlement.settlement_ref == settle_ref,
+            NovaPoshtaSettlement.has_warehouses.isnot(False),
+        )
+    ).scalar()
 
 
 async def delete_all_warehouses(db: Session) -> None:
@@ -1,8 +1,9 @@
 import logging
+from datetime import datetime
 
 from fastapi import HTTPException, status
 from fastapi.responses import JSONResponse
-from sqlalchemy import desc
+from sqlalchemy import desc, exists, func, or_, and_, select, Select
 from sqlalchemy.orm import Session, joinedload, selectinload
 
 from src.database.models import (
@@ -11,7 +12,9 @@ from src.database.models import (
     Order,
     OrdersStatus,
     OrderedProduct,
-    Price, PostType
+    Product,
+    Price,
+    PostType
 )
 from src.schemas.orders import (
     OrderModel,
@@ -27,15 +30,17 @@ from src.schemas.posts import PostNovaPoshtaOffice
 
 from src.services.orders import (
     delete_basket_items_by_basket_id,
-    calculate_basket_total_cost,
-    calculate_basket_total_cost_for_anonym_user,
-    move_product_to_ordered,
+    calculate_ordered_products_total_cost,
+    move_basket_items_to_ordered,
 )
+from src.services.cursor import decode_cursor, encode_cursor
 from src.repository import prices as repository_prices
-from src.repository import products as repository_products
 from src.repository import nova_poshta as repository_nova_poshta
 from src.repository import ukr_poshta as repository_ukr_poshta
 from src.repository import posts as repository_posts
+from src.repository import stock as repository_stock
+from src.repository import sales_analytics as repository_sales_analytics
+from src.repository import outbox as repository_outbox
 from src.services.validation import validate_phone_number
 from src.services.exception_detail import ExDetail as Ex
 
@@ -46,6 +51,37 @@ async def get_order_by_id(order_id: int, db: Session) -> Order | None:
     return db.query(Order).filter(Order.id == order_id).first()
 
 
+async def get_order_with_lines(order_id: int, db: Session) -> Order | None:
+    return (
+        db.query(Order)
+        .options(selectinload(Order.ordered_products).selectinload(OrderedProduct.prices))
+        .filter(Order.id == order_id)
+        .first()
+    )
+
+
+async def get_order_view(order_id: int, db: Session) -> Order | None:
+    """
+    The order with everything its confirmation shows, loaded with one query:
+    the customer, the lines with their products, images and prices, and the selected post address.
+    """
+    return (
+        db.query(Order)
+        .options(
+            joinedload(Order.user).lazyload(User.posts),
+            joinedload(Order.selected_nova_poshta),
+            joinedload(Order.selected_ukr_poshta),
+            joinedload(Order.ordered_products).options(
+                joinedload(OrderedProduct.products).joinedload(Product.images),
+                joinedload(OrderedProduct.prices),
+            ),
+        )
+        .populate_existing()
+        .filter(Order.id == order_id)
+        .one_or_none()
+    )
+
+
 async def get_order_by_id_for_current_user(
         order_id: int, user_id: int, db: Session
 ) -> Order | None:
@@ -56,32 +92,41 @@ async def get_order_by_id_for_current_user(
     ).first()
 
 
+def _has_ordered_products():
+    return exists().where(OrderedProduct.order_id == Order.id)
+
+
+def _ordered_products_loading():
+    return selectinload(Order.ordered_products).options(
+        selectinload(OrderedProduct.prices),
+        selectinload(OrderedProduct.products).selectinload(Product.images),
+    )
+
+
 async def get_orders_by_auth_user(
         limit: int, offset: int, user: User, db: Session
 ) -> OrdersCurrentUserWithTotalCountResponse | None:
-    subquery = (
+    query = (
         db.query(Order)
+        .filter(Order.user_id == user.id)
+        .filter(_has_ordered_products())
+    )
+
+    total_count = query.count()
+
+    orders = (
+        query
         .options(
-            selectinload(Order.user),
-            selectinload(Order.ordered_products)
-            .selectinload(OrderedProduct.prices)
-            .options(
-                joinedload(Price.product),
-                joinedload(Price.ordered_products)
-            ),
+            _ordered_products_loading(),
             selectinload(Order.selected_nova_poshta),
             selectinload(Order.selected_ukr_poshta)
         )
-        .filter(OrderedProduct.order_id == Order.id)
-        .filter(Price.id == OrderedProduct.price_id)
-        .filter(Order.user_id == user.id)
-        .order_by(desc(Order.created_at))
+        .order_by(desc(Order.created_at), desc(Order.id))
+        .limit(limit)
+        .offset(offset)
+        .all()
     )
 
-    orders = subquery.limit(limit).offset(offset).all()
-
-    total_count = subquery.count()
-
     orders_data = [OrderResponse(**order.__dict__) for order in orders]
 
     response_data = OrdersCurrentUserWithTotalCountResponse(
@@ -161,27 +206,20 @@ async def create_order_auth_user(order_data: OrderModel, user_id: int, db: Sessi
     if not nova_poshta and not ukr_poshta:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No valid delivery method selected")
 
-    total_cost = await calculate_basket_total_cost(user.basket)
-
-    ordered_products = []
-    for basket_item in user.basket.basket_items:
-        ordered_product = await move_product_to_ordered(db, basket_item)
-
-        selected_price = await repository_prices.price_by_product_id_and_price_id(
-            ordered_product.product_id, ordered_product.price_id, db
-        )
-
-        if selected_price:
-            ordered_product.prices = selected_price
-
-        ordered_products.append(ordered_product)
-
-    if len(ordered_products) == 0:
+    if not user.basket.basket_items:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Your shopping cart is still empty. Order cannot be without products"
         )
 
+    selected_prices = await repository_prices.active_prices_by_ids(
+        [basket_item.price_id_by_the_user for basket_item in user.basket.basket_items], db
+    )
+
+    ordered_products = await move_basket_items_to_ordered(user.basket.basket_items, selected_prices)
+
+    total_cost = await calculate_ordered_products_total_cost(ordered_products)
+
     order = Order(
         user_id=user.id,
         user=user,
@@ -209,17 +247,23 @@ async def create_order_auth_user(order_data: OrderModel, user_id: int, db: Sessi
 
     order.is_authenticated = True
 
+    if order_data.phone_number_current_user:
+        user.phone_number = order_data.phone_number_current_user
+
+    try:
+        await repository_stock.reserve_stock(order, db)
+    except HTTPException:
+        db.rollback()
+        raise
+
     try:
         db.add(order)
+        await delete_basket_items_by_basket_id(user.basket.id, db)
+        await repository_sales_analytics.add_new_order(order, db)
+        await repository_outbox.add_order_messages(order, db)
         db.commit()
         db.refresh(order)
 
-        if order_data.phone_number_current_user:
-            user.phone_number = order_data.phone_number_current_user
-            db.commit()
-
-        await delete_basket_items_by_basket_id(user.basket.id, db)
-
     except Exception as e:
         db.rollback()
         logger.error(f"Failed to create order: {str(e)}")
@@ -242,47 +286,49 @@ async def create_order_anonym_user(data: OrderAnonymUserModel, db: Session):
     ordered_products_data = order_data.pop("ordered_products", [])
 
     for product_data in ordered_products_data:
-        product_id = product_data.get("product_id")
-        price_id = product_data.get("price_id")
-        quantity = product_data.get("quantity", 0)
-
-        product = await repository_products.product_by_id_and_status(product_id=product_id, db=db)
-
-        if not product:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=Ex.HTTP_404_NOT_FOUND)
-
-        prise = await repository_prices.price_by_product_id_and_price_id(product_id, price_id, db)
-
-        if not prise:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=Ex.HTTP_404_NOT_FOUND)
-
-        if quantity <= 0:
+        if product_data.get("quantity", 0) <= 0:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid quantity. Product quantity must be greater than 0"
             )
 
-    order = Order(**order_data)
-
-    db.add(order)
-    db.commit()
-    db.refresh(order)
+    selected_prices = await repository_prices.active_prices_of_activated_products(
+        [(product_data.get("product_id"), product_data.get("price_id")) for product_data in ordered_products_data], db
+    )
 
+    ordered_products = []
     for product_data in ordered_products_data:
-        product = OrderedProduct(
-            product_id=product_data.get("product_id"),
-            price_id=product_data.get("price_id"),
-            quantity=product_data.get("quantity"),
-            order_id=order.id
+        price = selected_prices.get(product_data.get("price_id"))
+
+        if not price or price.product_id != product_data.get("product_id"):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=Ex.HTTP_404_NOT_FOUND)
+
+        ordered_products.append(
+            OrderedProduct(
+                product_id=price.product_id,
+                products=price.product,
+                price_id=price.id,
+                prices=price,
+                quantity=product_data.get("quantity"),
+                unit_price=price.price,
+            )
         )
-        db.add(product)
 
-    db.commit()
+    order = Order(**order_data)
+    order.ordered_products = ordered_products
+    order.price_order = await calculate_ordered_products_total_cost(ordered_products)
 
-    total_cost_order = await calculate_basket_total_cost_for_anonym_user(order.id, db)
+    try:
+        await repository_stock.reserve_stock(order, db)
+    except HTTPException:
+        db.rollback()
+        raise
 
-    order.price_order = total_cost_order
+    db.add(order)
+    await repository_sales_analytics.add_new_order(order, db)
+    await repository_outbox.add_order_messages(order, db)
     db.commit()
+    db.refresh(order)
 
     return order
 
@@ -290,9 +336,17 @@ async def create_order_anonym_user(data: OrderAnonymUserModel, db: Session):
 async def confirm_payment_of_order(order_id: int, db: Session) -> Order | None:
     """Confirmation of payment of order by admin or moderator"""
 
-    order = await get_order_by_id(order_id=order_id, db=db)
+    order = await get_order_with_lines(order_id=order_id, db=db)
     if order and order.confirmation_pay is False:
+        if order.status_order != OrdersStatus.cancelled and not order.stock_reserved:
+            # the hold expired before the payment was confirmed
+            try:
+                await repository_stock.reserve_stock(order, db)
+            except HTTPException:
+                db.rollback()
+                logger.warning(f"Payment of the order {order.id} is confirmed, but its products are out of stock")
         order.confirmation_pay = True
+        order.reserved_until = None
         db.commit()
         return order
     return None
@@ -303,8 +357,11 @@ async def change_order_status(
 ) -> Order | None:
     """Change status of order by admin or moderator"""
 
-    order = await get_order_by_id(order_id=order_id, db=db)
+    order = await get_order_with_lines(order_id=order_id, db=db)
     if order:
+        if update_data.new_status == OrdersStatus.cancelled:
+            await repository_stock.release_stock([order], db)
+        await repository_sales_analytics.move_order(order, order.status_order, update_data.new_status, db)
         order.status_order = update_data.new_status
         order.confirmation_manager = True
         db.commit()
@@ -313,42 +370,109 @@ async def change_order_status(
 
 
 async def get_orders_all_for_crm(
-        limit: int, offset: int, order_status: OrdersStatus,  db: Session
+        limit: int, offset: int, order_status: OrdersStatus, db: Session, cursor: str = None
 ) -> OrdersCRMWithTotalCountResponse | None:
-    subquery = (
+    """
+    Orders for the CRM sorted by (status_order, created_at desc, id desc).
+
+    When a cursor of the previous page is given the page is found by the sort key
+    instead of the offset, so deep pages cost the same as the first one.
+    """
+    query = (
         db.query(Order)
         .options(
-            selectinload(Order.ordered_products)
-            .selectinload(OrderedProduct.prices)
-            .options(
-                joinedload(Price.product),
-                joinedload(Price.ordered_products)
-            ),
+            _ordered_products_loading(),
             selectinload(Order.selected_nova_poshta),
             selectinload(Order.selected_ukr_poshta)
         )
-        .filter(OrderedProduct.order_id == Order.id)
-        .filter(Price.id == OrderedProduct.price_id)
-        .order_by(Order.status_order, desc(Order.created_at))
+        .filter(_has_ordered_products())
+        .order_by(Order.status_order, desc(Order.created_at), desc(Order.id))
     )
 
     if order_status:
-        subquery = subquery.filter(Order.status_order == order_status)
+        query = query.filter(Order.status_order == order_status)
+
+    if cursor:
+        last_status, last_created_at, last_id = decode_cursor(cursor, OrdersStatus, datetime, int)
+        query = query.filter(
+            or_(
+                Order.status_order > last_status,
+                and_(
+                    Order.status_order == last_status,
+                    or_(
+                        Order.created_at < last_created_at,
+                        and_(Order.created_at == last_created_at, Order.id < last_id)
+                    )
+                )
+            )
+        )
+    else:
+        query = query.offset(offset)
 
-    orders = subquery.limit(limit).offset(offset).all()
+    orders = query.limit(limit).all()
 
-    total_count = subquery.count()
+    status_counts = dict(
+        db.query(Order.status_order, func.count(Order.id))
+        .filter(_has_ordered_products())
+        .group_by(Order.status_order)
+        .all()
+    )
+
+    if order_status:
+        total_count = status_counts.get(order_status, 0)
+    else:
+        total_count = sum(status_counts.values())
 
     orders_data = [OrdersCRMResponse(**order.__dict__) for order in orders]
 
     response_data = OrdersCRMWithTotalCountResponse(
         orders=orders_data,
-        total_count=total_count
+        total_count=total_count,
+        status_counts={order_status_.value: count for order_status_, count in status_counts.items()},
+        next_cursor=encode_cursor(orders[-1].status_order, orders[-1].created_at, orders[-1].id) if len(orders) == limit else None
     )
 
     return response_data
 
 
+def orders_for_export(order_status: OrdersStatus = None) -> Select:
+    """One row per ordered product of the orders matching the CRM list filters, in the same order"""
+    query = (
+        select(
+            Order.id.label("order_id"),
+            Order.created_at.label("created_at"),
+            Order.status_order.label("status_order"),
+            Order.payment_type.label("payment_type"),
+            Order.confirmation_pay.label("confirmation_pay"),
+            Order.post_type.label("post_type"),
+            Order.price_order.label("price_order"),
+            func.coalesce(User.first_name, Order.first_name_anon_user).label("first_name"),
+            func.coalesce(User.last_name, Order.last_name_anon_user).label("last_name"),
+            func.coalesce(User.email, Order.email_anon_user).label("email"),
+            func.coalesce(Order.phone_number_anon_user, User.phone_number).label("phone_number"),
+            Order.city.label("city"),
+            Order.address_warehouse.label("address_warehouse"),
+            Order.comment.label("comment"),
+            Order.notes_admin.label("notes_admin"),
+            OrderedProduct.product_id.label("product_id"),
+            Product.name.label("product_name"),
+            Price.weight.label("weight"),
+            OrderedProduct.unit_price.label("price"),
+            OrderedProduct.quantity.label("quantity"),
+        )
+        .join(OrderedProduct, OrderedProduct.order_id == Order.id)
+        .join(Product, Product.id == OrderedProduct.product_id)
+        .join(Price, Price.id == OrderedProduct.price_id)
+        .outerjoin(User, User.id == Order.user_id)
+        .order_by(Order.status_order, desc(Order.created_at), desc(Order.id), OrderedProduct.id)
+    )
+
+    if order_status:
+        query = query.where(Order.status_order == order_status)
+
+    return query
+
+
 async def add_notes_to_order(order_id: int, body: OrderAdminNotesModel, db: Session):
     order = await get_order_by_id(order_id=order_id, db=db)
 
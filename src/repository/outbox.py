@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+
+from src.conf.config import settings
+from src.database.models import (
+    Order,
+    OutboxMessage,
+    OutboxMessageType,
+    OutboxStatus,
+)
+
+
+async def add_order_messages(order: Order, db: Session) -> None:
+    """
+    Queue the confirmation for the customer and the admin notification together with the order.
+    The caller commits.
+    """
+    recipient = order.email_anon_user or order.user.email
+    db.add(OutboxMessage(message_type=OutboxMessageType.order_confirmation, recipient=recipient, order=order))
+    db.add(OutboxMessage(message_type=OutboxMessageType.order_admin_notification, order=order))
+
+
+def _pending(message_type: OutboxMessageType):
+    return (
+        OutboxMessage.message_type == message_type,
+        OutboxMessage.status == OutboxStatus.pending,
+        OutboxMessage.next_attempt_at <= func.now(),
+    )
+
+
+async def lock_due_messages(limit: int, db: Session) -> list[OutboxMessage]:
+    """
+    Lock a batch of pending order confirmations whose time has come, oldest first.
+
+    Locked rows are skipped, so several workers can drain the outbox side by side.
+    """
+    return (
+        db.query(OutboxMessage)
+        .filter(*_pending(OutboxMessageType.order_confirmation))
+        .order_by(OutboxMessage.id)
+        .limit(limit)
+        .with_for_update(of=OutboxMessage, skip_locked=True)
+        .all()
+    )
+
+
+async def lock_due_admin_notifications(limit: int, window: timedelta, db: Session) -> list[OutboxMessage]:
+    """
+    Lock the pending admin notifications once they make up a digest.
+
+    A digest is due when limit notifications are waiting or the oldest one has waited
+    for the whole window, otherwise nothing is returned and more orders are collected.
+    """
+    rows = (
+        db.query(OutboxMessage, OutboxMessage.created_at <= func.now() - window)
+        .options(selectinload(OutboxMessage.order))
+        .filter(*_pending(OutboxMessageType.order_admin_notification))
+        .order_by(OutboxMessage.id)
+        .limit(limit)
+        .with_for_update(of=OutboxMessage, skip_locked=True)
+        .all()
+    )
+
+    if len(rows) < limit and not any(window_passed for _, window_passed in rows):
+        return []
+    return [message for message, _ in rows]
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff after the given number of failed attempts"""
+    seconds = settings.outbox_retry_base_seconds * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.outbox_retry_max_seconds))
+
+
+async def mark_sent(message: OutboxMessage) -> None:
+    message.status = OutboxStatus.sent
+    message.attempts += 1
+    message.last_error = None
+    message.sent_at = func.now()
+
+
+async def mark_failed(message: OutboxMessage, error: str) -> None:
+    """Schedule the next attempt, or give up after outbox_max_attempts"""
+    message.attempts += 1
+    message.last_error = error
+    if message.attempts >= settings.outbox_max_attempts:
+        message.status = OutboxStatus.failed
+    else:
+        message.next_attempt_at = func.now() + retry_delay(message.attempts)
+
+
+async def delete_sent_messages(older_than: timedelta, db: Session) -> None:
+    db.query(OutboxMessage).filter(
+        OutboxMessage.status == OutboxStatus.sent,
+        OutboxMessage.sent_at < func.now() - older_than,
+    ).delete(synchronize_session=False)
+    db.commit()
@@ -1,10 +1,10 @@
 from typing import List, Type
 
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, asc
+from sqlalchemy.orm import Session, joinedload, contains_eager
+from sqlalchemy import func, asc, tuple_
 
-from src.database.models import Price, Product
+from src.database.models import Price, Product, ProductStatus
 from src.schemas.price import PriceModel, PriceResponse
 from src.services.exception_detail import ExDetail as Ex
 
@@ -28,11 +28,56 @@ async def price_by_id(id_price: int, db: Session) -> Type[Price]:
 
 
 async def price_by_product_id_and_price_id(product_id: int, price_id: int, db: Session) -> Price:
-    return db.query(Price).options(joinedload(Price.ordered_products)).filter(
+    return db.query(Price).filter(
         Price.product_id == product_id, Price.id == price_id, Price.is_deleted == False, Price.is_active == True
     ).first()
 
 
+async def active_prices_by_product_price_ids(
+        product_price_ids: List[tuple[int, int]], db: Session
+) -> dict[tuple[int, int], Price]:
+    """Active prices of the (product_id, price_id) pairs with their products and subcategories, in two queries"""
+    prices = (
+        db.query(Price)
+        .join(Product, Product.id == Price.product_id)
+        .options(contains_eager(Price.product).selectinload(Product.subcategories))
+        .filter(
+            tuple_(Price.product_id, Price.id).in_(set(product_price_ids)),
+            Price.is_deleted == False,
+            Price.is_active == True
+        )
+        .all()
+    )
+    return {(price.product_id, price.id): price for price in prices}
+
+
+async def active_prices_by_ids(price_ids: List[int], db: Session) -> dict[int, Price]:
+    """Load all active prices of the given ids with their products in one query"""
+    prices = db.query(Price).options(joinedload(Price.product)).filter(
+        Price.id.in_(set(price_ids)), Price.is_deleted == False, Price.is_active == True
+    ).all()
+    return {price.id: price for price in prices}
+
+
+async def active_prices_of_activated_products(
+        product_price_ids: List[tuple[int, int]], db: Session
+) -> dict[int, Price]:
+    """Validate all (product_id, price_id) pairs of an order with one query"""
+    prices = (
+        db.query(Price)
+        .join(Product, Product.id == Price.product_id)
+        .options(contains_eager(Price.product))
+        .filter(
+            tuple_(Price.product_id, Price.id).in_(set(product_price_ids)),
+            Product.product_status == ProductStatus.activated,
+            Price.is_deleted == False,
+            Price.is_active == True
+        )
+        .all()
+    )
+    return {price.id: price for price in prices}
+
+
 async def create_price(body: PriceModel, db: Session) -> PriceResponse:
     new_price = Price(**body.dict())
     db.add(new_price)
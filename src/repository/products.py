@@ -1,7 +1,7 @@
 from typing import Type, Union
 
 from fastapi import HTTPException, status
-from sqlalchemy import desc, asc, select, exists, and_, func
+from sqlalchemy import desc, asc, select, exists, and_, func, Select
 from sqlalchemy.orm import Session, aliased
 
 from src.database.models import Product, Price, ProductStatus
@@ -38,32 +38,69 @@ async def product_by_id_and_status(product_id: int, db: Session) -> Product | No
     return product
 
 
-async def get_products_all_for_crm(
-    limit: int,
-    offset: int,
-    db: Session,
-    search_query: Union[int, str],
-    pr_category_id: int = None,
-    pr_status: ProductStatus = None,
-) -> ProductWithTotalResponse | None:
-    subquery = await get_all_products_without_filter(db=db)
-
+def filter_products_for_crm(
+    query, search_query: Union[int, str], pr_category_id: int = None, pr_status: ProductStatus = None
+):
+    """Filters of the CRM product list, shared by the list and the export"""
     if pr_category_id is not None:
-        subquery = subquery.filter(Product.product_category_id == pr_category_id)
+        query = query.filter(Product.product_category_id == pr_category_id)
 
     if pr_status is not None:
-        subquery = subquery.filter(Product.product_status == pr_status)
+        query = query.filter(Product.product_status == pr_status)
 
     if search_query:
         if isinstance(search_query, int):
-            subquery = subquery.filter_by(id=search_query)
+            query = query.filter(Product.id == search_query)
         elif isinstance(search_query, str):
-            subquery = subquery.filter(
+            query = query.filter(
                 func.lower(Product.name).contains(func.lower(search_query))
             )
         else:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid search_query")
 
+    return query
+
+
+def products_for_export(
+    search_query: Union[int, str], pr_category_id: int = None, pr_status: ProductStatus = None
+) -> Select:
+    """One row per price of every product matching the CRM filters, products without prices included"""
+    query = (
+        select(
+            Product.id.label("product_id"),
+            Product.name.label("name"),
+            Product.product_category_id.label("product_category_id"),
+            Product.product_status.label("product_status"),
+            Product.new_product.label("new_product"),
+            Product.is_popular.label("is_popular"),
+            Product.is_deleted.label("is_deleted"),
+            Product.created_at.label("created_at"),
+            Price.id.label("price_id"),
+            Price.weight.label("weight"),
+            Price.price.label("price"),
+            Price.old_price.label("old_price"),
+            Price.quantity.label("quantity"),
+            Price.is_active.label("price_is_active"),
+            Price.is_deleted.label("price_is_deleted"),
+            Price.promotional.label("promotional"),
+        )
+        .outerjoin(Price, Price.product_id == Product.id)
+        .order_by(desc(Product.created_at), Product.id, Price.id)
+    )
+    return filter_products_for_crm(query, search_query, pr_category_id, pr_status)
+
+
+async def get_products_all_for_crm(
+    limit: int,
+    offset: int,
+    db: Session,
+    search_query: Union[int, str],
+    pr_category_id: int = None,
+    pr_status: ProductStatus = None,
+) -> ProductWithTotalResponse | None:
+    subquery = await get_all_products_without_filter(db=db)
+    subquery = filter_products_for_crm(subquery, search_query, pr_category_id, pr_status)
+
     total_count = subquery.count()
     products_ = subquery.limit(limit).offset(offset).all()
 
@@ -1017,3 +1054,45 @@ async def search_all_products(
     )
 
     return products_with_total_count
+
+
+async def get_products_rating(
+        limit: int, offset: int, db: Session, category_id: int = None, weight: list[str] = None
+) -> ProductWithTotalResponse | None:
+    """Products with the best rating first, of the category and with a price of the weights when they are given"""
+    price_alias = aliased(Price)
+
+    price_conditions = [
+        Product.id == price_alias.product_id,
+        price_alias.is_active == True,
+        price_alias.is_deleted == False,
+    ]
+    if weight:
+        price_conditions.append(price_alias.weight.in_(weight))
+
+    product_conditions = [
+        Product.is_deleted == False,
+        Product.product_status == ProductStatus.activated,
+    ]
+    if category_id is not None:
+        product_conditions.append(Product.product_category_id == category_id)
+
+    subquery = (
+        db.query(Product)
+        .join(price_alias, and_(*price_conditions))
+        .filter(*product_conditions)
+        .group_by(Product.id)
+        .order_by(desc(Product.rating_average), desc(Product.rating_count), desc(Product.created_at))
+    )
+
+    products_ = subquery.limit(limit).offset(offset).all()
+
+    total_count = subquery.count()
+
+    product_with_price = await product_with_prices_and_images(products_, db)
+
+    product_with_total_price = ProductWithTotalResponse(
+        products=product_with_price, total_count=total_count
+    )
+
+    return product_with_total_price
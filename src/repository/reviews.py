@@ -1,30 +1,122 @@
+from datetime import datetime
 from typing import Type
 
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc, and_
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import asc, desc, and_, func, or_
+
+from src.database.models import Product, Rating, Review, User
+from src.schemas.reviews import ReviewModel, ReviewsWithCursorResponse
+from src.services.cursor import decode_cursor, encode_cursor
+from src.services.reviews import review_response
+
+
+def _after_cursor(cursor: str):
+    """Reviews after the last review of the previous page in the (rating, created_at desc, id desc) order"""
+    last_rating, last_created_at, last_id = decode_cursor(cursor, Rating, datetime, int)
+    return or_(
+        Review.rating > last_rating,
+        and_(
+            Review.rating == last_rating,
+            or_(
+                Review.created_at < last_created_at,
+                and_(Review.created_at == last_created_at, Review.id < last_id)
+            )
+        )
+    )
 
-from src.database.models import Review, User
-from src.schemas.reviews import ReviewModel
 
+async def get_reviews_for_product(
+        product_id: int, limit: int, cursor: str | None, db: Session
+) -> ReviewsWithCursorResponse:
+    """
+    Checked reviews of the product, the best and newest first.
 
-async def get_reviews(limit: int, offset: int, db: Session) -> list[Type[Review]]:
-    return (
+    The rating enum is declared from five_stars down, so the ascending rating order puts
+    the best reviews first. The next page is found by the cursor of the previous one.
+    """
+    query = (
         db.query(Review)
-        .options(joinedload(Review.user))
-        .options(joinedload(Review.images))  # Завантажує всі картинки разом із відгуками
-        .filter(and_(Review.is_checked == True, Review.is_deleted == False))
-        .order_by(desc(Review.rating), desc(Review.created_at)).limit(limit).offset(offset).all()
+        .options(joinedload(Review.user), selectinload(Review.images))
+        .filter(Review.product_id == product_id, Review.is_checked == True, Review.is_deleted == False)
+        .order_by(asc(Review.rating), desc(Review.created_at), desc(Review.id))
+    )
+
+    if cursor:
+        query = query.filter(_after_cursor(cursor))
+
+    reviews = query.limit(limit).all()
+
+    return ReviewsWithCursorResponse(
+        reviews=[review_response(review) for review in reviews],
+        next_cursor=encode_cursor(reviews[-1].rating, reviews[-1].created_at, reviews[-1].id) if len(reviews) == limit else None
     )
 
 
-async def get_reviews_for_crm(limit: int, offset: int, db: Session) -> list[Type[Review]]:
-    return (
+async def refresh_product_rating(product_id: int, db: Session) -> None:
+    """
+    Recount the rating of the product from its checked reviews. The caller commits.
+
+    The product row is locked first, so reviews of one product moderated at the same time
+    are counted one after the other and no change is lost.
+    """
+    product = db.query(Product).filter(Product.id == product_id).with_for_update().first()
+    if not product:
+        return
+
+    counts = dict(
+        db.query(Review.rating, func.count(Review.id))
+        .filter(Review.product_id == product_id, Review.is_checked == True, Review.is_deleted == False)
+        .group_by(Review.rating)
+        .all()
+    )
+    rating_count = sum(counts.values())
+
+    product.rating_count = rating_count
+    product.rating_average = round(
+        sum(rating.value * count for rating, count in counts.items()) / rating_count, 2
+    ) if rating_count else 0
+    product.rating_histogram = {str(rating.value): counts.get(rating, 0) for rating in Rating}
+
+
+async def get_reviews(limit: int, offset: int, cursor: str | None, db: Session) -> ReviewsWithCursorResponse:
+    """
+    Checked reviews of the shop in the same order as the reviews of a product.
+
+    When a cursor of the previous page is given the page is found by the sort key
+    instead of the offset, so deep pages cost the same as the first one.
+    """
+    query = (
         db.query(Review)
-        .options(joinedload(Review.user))
+        .options(joinedload(Review.user), selectinload(Review.images))
+        .filter(Review.is_checked == True, Review.is_deleted == False)
+        .order_by(asc(Review.rating), desc(Review.created_at), desc(Review.id))
+    )
+
+    if cursor:
+        query = query.filter(_after_cursor(cursor))
+    else:
+        query = query.offset(offset)
+
+    reviews = query.limit(limit).all()
+
+    return ReviewsWithCursorResponse(
+        reviews=[review_response(review) for review in reviews],
+        next_cursor=encode_cursor(reviews[-1].rating, reviews[-1].created_at, reviews[-1].id) if len(reviews) == limit else None
+    )
+
+
+async def get_reviews_for_crm(limit: int, offset: int, is_checked: bool | None, db: Session) -> list[Type[Review]]:
+    query = (
+        db.query(Review)
+        .options(joinedload(Review.user), selectinload(Review.images))
         .order_by(Review.is_deleted, desc(Review.created_at))
-        .limit(limit).offset(offset).all()
     )
 
+    if is_checked is not None:
+        query = query.filter(Review.is_checked == is_checked)
+
+    return query.limit(limit).offset(offset).all()
+
 
 async def get_review_for_product_by_user(db: Session, product_id: int, user_id: int) -> Review:
     """
@@ -75,6 +167,8 @@ async def create_review(review: ReviewModel, db: Session, user_id: int) -> Revie
     )
 
     db.add(new_review)
+    db.flush()
+    await refresh_product_rating(new_review.product_id, db)
     db.commit()
     db.refresh(new_review)
     return new_review
@@ -84,6 +178,7 @@ async def archive_review(review_id: int, db: Session) -> Review | None:
     review = await get_review_by_id(review_id=review_id, db=db)
     if review:
         review.is_deleted = True
+        await refresh_product_rating(review.product_id, db)
         db.commit()
         return review
     return None
@@ -93,6 +188,7 @@ async def unarchive_review(review_id: int, db: Session) -> Review | None:
     review = await get_review_by_id(review_id=review_id, db=db)
     if review:
         review.is_deleted = False
+        await refresh_product_rating(review.product_id, db)
         db.commit()
         return review
     return None
@@ -102,6 +198,7 @@ async def check_review(review_id: int, db: Session) -> Review | None:
     review = await get_review_by_id(review_id=review_id, db=db)
     if review and review.is_checked is False:
         review.is_checked = True
+        await refresh_product_rating(review.product_id, db)
         db.commit()
         return review
     return None
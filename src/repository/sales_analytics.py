@@ -0,0 +1,232 @@
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import Date, cast, func, select, distinct
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from src.database.models import (
+    Order,
+    OrderedProduct,
+    OrdersStatus,
+    Price,
+    Product,
+    SalesDailyPayment,
+    SalesDailyPost,
+    SalesDailyProduct,
+)
+
+
+async def _upsert(model, key_columns: list[str], measure_columns: list[str], rows: list[dict], db: Session) -> None:
+    """Add the measures of the rows to the existing rollup rows, or create them"""
+    if not rows:
+        return
+
+    stmt = insert(model).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: getattr(model, column) + getattr(stmt.excluded, column) for column in measure_columns},
+    )
+    db.execute(stmt)
+
+
+async def _apply_order(order: Order, day, status_order: OrdersStatus, sign: int, db: Session) -> None:
+    lines = defaultdict(lambda: {"units": 0, "revenue": 0.0})
+    for ordered_product in order.ordered_products:
+        line = lines[(ordered_product.product_id, ordered_product.price_id)]
+        line["weight"] = ordered_product.prices.weight
+        line["units"] += ordered_product.quantity
+        line["revenue"] += ordered_product.quantity * ordered_product.unit_price
+
+    await _upsert(
+        SalesDailyProduct,
+        ["day", "status_order", "product_id", "price_id"],
+        ["orders_count", "units", "revenue"],
+        [
+            {
+                "day": day,
+                "status_order": status_order,
+                "product_id": product_id,
+                "price_id": price_id,
+                "weight": line["weight"],
+                "orders_count": sign,
+                "units": sign * line["units"],
+                "revenue": sign * line["revenue"],
+            }
+            for (product_id, price_id), line in lines.items()
+        ],
+        db,
+    )
+
+    revenue = sign * (order.price_order or 0)
+
+    if order.payment_type:
+        await _upsert(
+            SalesDailyPayment,
+            ["day", "status_order", "payment_type"],
+            ["orders_count", "revenue"],
+            [{"day": day, "status_order": status_order, "payment_type": order.payment_type,
+              "orders_count": sign, "revenue": revenue}],
+            db,
+        )
+
+    if order.post_type:
+        await _upsert(
+            SalesDailyPost,
+            ["day", "status_order", "post_type"],
+            ["orders_count", "revenue"],
+            [{"day": day, "status_order": status_order, "post_type": order.post_type,
+              "orders_count": sign, "revenue": revenue}],
+            db,
+        )
+
+
+async def add_new_order(order: Order, db: Session) -> None:
+    """
+    Count a just created order in the rollups, in the same transaction as the order.
+
+    The order is not flushed yet, so the day is taken from the database clock like created_at.
+    """
+    await _apply_order(order, func.current_date(), OrdersStatus.new, 1, db)
+
+
+async def move_order(order: Order, old_status: OrdersStatus, new_status: OrdersStatus, db: Session) -> None:
+    """Move an order between the status buckets of its day after a status change"""
+    if old_status == new_status:
+        return
+
+    day = order.created_at.date()
+    await _apply_order(order, day, old_status, -1, db)
+    await _apply_order(order, day, new_status, 1, db)
+
+
+async def reconcile(date_from: date, db: Session) -> None:
+    """Rebuild the rollups of all days starting from date_from from the raw orders"""
+    order_day = cast(Order.created_at, Date)
+
+    for model in (SalesDailyProduct, SalesDailyPayment, SalesDailyPost):
+        db.query(model).filter(model.day >= date_from).delete(synchronize_session=False)
+
+    db.execute(
+        insert(SalesDailyProduct).from_select(
+            ["day", "status_order", "product_id", "price_id", "weight", "orders_count", "units", "revenue"],
+            select(
+                order_day,
+                Order.status_order,
+                OrderedProduct.product_id,
+                OrderedProduct.price_id,
+                Price.weight,
+                func.count(distinct(Order.id)),
+                func.sum(OrderedProduct.quantity),
+                func.sum(OrderedProduct.quantity * OrderedProduct.unit_price),
+            )
+            .join(OrderedProduct, OrderedProduct.order_id == Order.id)
+            .join(Price, Price.id == OrderedProduct.price_id)
+            .where(order_day >= date_from, Order.status_order.is_not(None))
+            .group_by(order_day, Order.status_order, OrderedProduct.product_id, OrderedProduct.price_id, Price.weight)
+        )
+    )
+
+    for model, dimension in ((SalesDailyPayment, Order.payment_type), (SalesDailyPost, Order.post_type)):
+        db.execute(
+            insert(model).from_select(
+                ["day", "status_order", dimension.key, "orders_count", "revenue"],
+                select(
+                    order_day,
+                    Order.status_order,
+                    dimension,
+                    func.count(Order.id),
+                    func.coalesce(func.sum(Order.price_order), 0),
+                )
+                .where(order_day >= date_from, dimension.is_not(None), Order.status_order.is_not(None))
+                .group_by(order_day, Order.status_order, dimension)
+            )
+        )
+
+    db.commit()
+
+
+def _statuses_filter(model, order_status: OrdersStatus | None):
+    if order_status:
+        return model.status_order == order_status
+    return model.status_order != OrdersStatus.cancelled
+
+
+async def get_sales_by_products(
+        date_from: date, date_to: date, order_status: OrdersStatus | None, db: Session
+) -> list:
+    return (
+        db.query(
+            SalesDailyProduct.product_id,
+            Product.name,
+            SalesDailyProduct.price_id,
+            SalesDailyProduct.weight,
+            func.sum(SalesDailyProduct.orders_count).label("orders_count"),
+            func.sum(SalesDailyProduct.units).label("units"),
+            func.sum(SalesDailyProduct.revenue).label("revenue"),
+        )
+        .join(Product, Product.id == SalesDailyProduct.product_id)
+        .filter(
+            SalesDailyProduct.day.between(date_from, date_to),
+            _statuses_filter(SalesDailyProduct, order_status),
+        )
+        .group_by(SalesDailyProduct.product_id, Product.name, SalesDailyProduct.price_id, SalesDailyProduct.weight)
+        .order_by(func.sum(SalesDailyProduct.revenue).desc())
+        .all()
+    )
+
+
+async def get_sales_by_payment_types(
+        date_from: date, date_to: date, order_status: OrdersStatus | None, db: Session
+) -> list:
+    return (
+        db.query(
+            SalesDailyPayment.payment_type,
+            func.sum(SalesDailyPayment.orders_count).label("orders_count"),
+            func.sum(SalesDailyPayment.revenue).label("revenue"),
+        )
+        .filter(
+            SalesDailyPayment.day.between(date_from, date_to),
+            _statuses_filter(SalesDailyPayment, order_status),
+        )
+        .group_by(SalesDailyPayment.payment_type)
+        .all()
+    )
+
+
+async def get_sales_by_post_types(
+        date_from: date, date_to: date, order_status: OrdersStatus | None, db: Session
+) -> list:
+    return (
+        db.query(
+            SalesDailyPost.post_type,
+            func.sum(SalesDailyPost.orders_count).label("orders_count"),
+            func.sum(SalesDailyPost.revenue).label("revenue"),
+        )
+        .filter(
+            SalesDailyPost.day.between(date_from, date_to),
+            _statuses_filter(SalesDailyPost, order_status),
+        )
+        .group_by(SalesDailyPost.post_type)
+        .all()
+    )
+
+
+async def get_sales_by_days(
+        date_from: date, date_to: date, order_status: OrdersStatus | None, db: Session
+) -> list:
+    # every order has exactly one payment type, so this table also holds the daily totals
+    return (
+        db.query(
+            SalesDailyPayment.day,
+            func.sum(SalesDailyPayment.orders_count).label("orders_count"),
+            func.sum(SalesDailyPayment.revenue).label("revenue"),
+        )
+        .filter(
+            SalesDailyPayment.day.between(date_from, date_to),
+            _statuses_filter(SalesDailyPayment, order_status),
+        )
+        .group_by(SalesDailyPayment.day)
+        .order_by(SalesDailyPayment.day)
+        .all()
+    )
@@ -0,0 +1,132 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from fastapi import HTTPException, status
+from sqlalchemy import Integer, column, func, select, update, values
+from sqlalchemy.orm import Session, selectinload
+
+from src.conf.config import settings
+from src.database.models import Order, OrderedProduct, PaymentsTypes, Price
+from src.services.favorites_cache import favorites_cache
+
+logger = logging.getLogger(__name__)
+
+
+def quantities_by_price(ordered_products: list[OrderedProduct]) -> dict[int, int]:
+    """Sum up the ordered quantity per price, the same price can be ordered in several lines"""
+    quantities = defaultdict(int)
+    for ordered_product in ordered_products:
+        quantities[ordered_product.price_id] += ordered_product.quantity
+    return dict(quantities)
+
+
+def hold_minutes(payment_type: PaymentsTypes) -> int:
+    """Minutes the stock of an unpaid order of the payment type is held, 0 holds it until the order is cancelled"""
+    return {
+        PaymentsTypes.wayforpay: settings.stock_hold_minutes_wayforpay,
+        PaymentsTypes.requisite: settings.stock_hold_minutes_requisite,
+    }.get(payment_type, 0)
+
+
+def _quantities_table(quantities: dict[int, int]):
+    return values(
+        column("price_id", Integer), column("quantity", Integer), name="ordered_quantities"
+    ).data(sorted(quantities.items()))
+
+
+async def reserve_stock(order: Order, db: Session) -> None:
+    """
+    Decrement Price.quantity for every line of the order with one conditional UPDATE.
+
+    The rows are locked in id order, so concurrent checkouts never deadlock each other,
+    and a line is only updated when enough quantity is left. The caller commits, or rolls
+    back when there is not enough stock, the lines updated before are not restored here.
+    """
+    if not settings.stock_reservation_enabled:
+        return
+
+    quantities = quantities_by_price(order.ordered_products)
+    if not quantities:
+        return
+
+    ordered_quantities = _quantities_table(quantities)
+    locked_prices = select(Price.id).where(Price.id.in_(quantities.keys())).order_by(Price.id).with_for_update()
+
+    reserved_price_ids = db.execute(
+        update(Price)
+        .where(
+            Price.id == ordered_quantities.c.price_id,
+            Price.id.in_(locked_prices),
+            Price.quantity >= ordered_quantities.c.quantity,
+        )
+        .values(quantity=Price.quantity - ordered_quantities.c.quantity)
+        .returning(Price.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+
+    if len(reserved_price_ids) != len(quantities):
+        logger.info(f"Not enough stock for prices {set(quantities) - set(reserved_price_ids)}")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Not enough products in stock")
+
+    order.stock_reserved = True
+    minutes = hold_minutes(order.payment_type)
+    if minutes:
+        order.reserved_until = func.now() + timedelta(minutes=minutes)
+
+
+async def release_stock(orders: list[Order], db: Session) -> None:
+    """Return the reserved quantity of the orders back to the prices. The caller commits."""
+    orders = [order for order in orders if order.stock_reserved]
+
+    quantities = defaultdict(int)
+    for order in orders:
+        for price_id, quantity in quantities_by_price(order.ordered_products).items():
+            quantities[price_id] += quantity
+
+    if quantities:
+        ordered_quantities = _quantities_table(quantities)
+        db.execute(
+            update(Price)
+            .where(Price.id == ordered_quantities.c.price_id)
+            .values(quantity=Price.quantity + ordered_quantities.c.quantity)
+            .execution_options(synchronize_session=False)
+        )
+
+    for order in orders:
+        order.stock_reserved = False
+        order.reserved_until = None
+
+
+async def release_expired_holds(db: Session) -> int:
+    """
+    Give back the stock of unpaid orders whose hold has expired.
+
+    Only the reservation is released, the order itself is left to the managers: the payment
+    may have arrived and not be confirmed yet, confirming it reserves the stock again.
+    """
+    expired_orders = (
+        db.query(Order)
+        .options(selectinload(Order.ordered_products).selectinload(OrderedProduct.prices))
+        .filter(
+            Order.stock_reserved == True,
+            Order.confirmation_pay == False,
+            Order.reserved_until < func.now(),
+        )
+        .with_for_update(of=Order, skip_locked=True)
+        .all()
+    )
+
+    await release_stock(expired_orders, db)
+
+    for order in expired_orders:
+        logger.info(f"Stock hold of the order {order.id} expired, its stock is released")
+
+    db.commit()
+
+    # the response cache is not flushed here, wishlists show the quantities of the prices
+    favorites_cache.invalidate_products(
+        ordered_product.product_id for order in expired_orders for ordered_product in order.ordered_products
+    )
+
+    return len(expired_orders)
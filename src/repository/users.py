@@ -10,6 +10,7 @@ from src.repository import baskets as repository_baskets
 from src.repository import favorites as repository_favorites
 from src.repository import posts as repository_posts
 
+from src.services.admin_addresses import admin_addresses_cache
 from src.services.exception_detail import ExDetail as Ex
 
 from src.services.password_utils import hash_password
@@ -293,6 +294,7 @@ async def add_email_addresses(is_send_message: bool, emails: list[str], db: Sess
             db.refresh(db_email)
 
     db.commit()
+    admin_addresses_cache.invalidate()
 
 
 async def change_send_status(db: Session):
@@ -305,3 +307,4 @@ async def change_send_status(db: Session):
             email.is_send_message = True
 
     db.commit()
+    admin_addresses_cache.invalidate()
@@ -1,25 +1,28 @@
+from collections import defaultdict
 from typing import List
 
 from fastapi import APIRouter, Depends, status, HTTPException
 from sqlalchemy.orm import Session
 
 from src.database.db import get_db
-from src.database.models import Role, User
+from src.database.models import Role, User, ProductStatus
 from src.repository import basket_items as repository_basket_items
 from src.repository import baskets as repository_baskets
+from src.repository import images as repository_images
 from src.repository import products as repository_products
 from src.repository import prices as repository_prices
 from src.repository.products import product_by_id
 from src.schemas.basket_items import (
     BasketItemsModel,
+    BasketItemsBulkModel,
     BasketItemsResponse,
+    BasketItemsWithTotalResponse,
     ChangeQuantityBasketItemsModel,
     BasketItemsRemoveModel,
 )
-from src.schemas.images import ImageResponse
-from src.schemas.product import ProductResponse
 from src.services.auth import auth_service
-from src.services.cloud_image import CloudImage
+from src.services.basket_items import basket_with_total, product_response_for_basket
+from src.services.basket_store import basket_store
 from src.services.roles import RoleAccess
 from src.services.exception_detail import ExDetail as Ex
 
@@ -48,48 +51,63 @@ async def basket_items(current_user: User = Depends(auth_service.get_current_use
     Returns:
         A list of basket items
     """
-    basket_items_ = await repository_basket_items.basket_items(current_user, db)
-    if basket_items_ is None:
+    if basket_store.enabled:
+        return (await _basket_from_store(current_user, db)).basket_items
+
+    return (await basket_with_total(current_user, db)).basket_items
+
+
+@router.get("/with_total", response_model=BasketItemsWithTotalResponse,
+            dependencies=[Depends(allowed_operation_admin_moderator_user)])
+async def basket_items_with_total(current_user: User = Depends(auth_service.get_current_user),
+                                  db: Session = Depends(get_db)):
+    """
+    The basket_items_with_total function returns the items in the basket of the current user
+        with the subtotal of every item and the total price of the basket.
+
+    Args:
+        current_user: User: Get the current user from the database
+        db: Session: Access the database
+
+    Returns:
+        The basket items and the total price
+    """
+    if basket_store.enabled:
+        return await _basket_from_store(current_user, db)
+
+    return await basket_with_total(current_user, db)
+
+
+async def _store_basket_id(current_user: User, db: Session) -> int:
+    basket_id = await basket_store.basket_id(current_user, db)
+    if not basket_id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=Ex.HTTP_404_NOT_FOUND)
+    return basket_id
 
-    basket_items_with_product = list()
 
-    for item in basket_items_:
-        product = await product_by_id(item.product_id, db)
+def _store_line_response(line: dict, product) -> BasketItemsResponse:
+    return BasketItemsResponse(id=line["id"],
+                               basket_id=line["basket_id"],
+                               product=product,
+                               quantity=line["quantity"],
+                               price_id_by_the_user=line["price_id"],
+                               subtotal=round(product.prices[0].price * line["quantity"], 2))
 
-        selected_price = await repository_prices.price_by_product_id_and_price_id(
-            item.product_id, item.price_id_by_the_user, db
-        )
 
-        if not selected_price:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid price_id_by_the_user")
-
-        exist_product = ProductResponse(id=product.id,
-                                        name=product.name,
-                                        description=product.description,
-                                        product_category_id=product.product_category_id,
-                                        new_product=product.new_product,
-                                        is_popular=product.is_popular,
-                                        is_favorite=product.is_favorite,
-                                        product_status=product.product_status,
-                                        sub_categories=product.sub_categories,
-                                        images=[ImageResponse(id=item.id,
-                                                              product_id=item.product_id,
-                                                              image_url=CloudImage.get_transformation_image(
-                                                                  item.image_url, "product"
-                                                              ),
-                                                              description=item.description,
-                                                              image_type=item.image_type,
-                                                              main_image=item.main_image) for item in product.images],
-                                        prices=[selected_price])
-
-        basket_items_with_product.append(BasketItemsResponse(id=item.id,
-                                                             basket_id=item.basket_id,
-                                                             product=exist_product,
-                                                             quantity=item.quantity,
-                                                             price_id_by_the_user=item.price_id_by_the_user))
-
-    return basket_items_with_product
+async def _basket_from_store(current_user: User, db: Session) -> BasketItemsWithTotalResponse:
+    lines = await basket_store.lines(await _store_basket_id(current_user, db), db)
+    products = await basket_store.catalog([(line["product_id"], line["price_id"]) for line in lines], db)
+
+    if any((line["product_id"], line["price_id"]) not in products for line in lines):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid price_id_by_the_user")
+
+    basket_items_with_product = sorted(
+        [_store_line_response(line, products[(line["product_id"], line["price_id"])]) for line in lines],
+        key=lambda item: (item.product.name, item.id)
+    )
+    total_price = sum(item.subtotal for item in basket_items_with_product)
+
+    return BasketItemsWithTotalResponse(basket_items=basket_items_with_product, total_price=round(total_price, 2))
 
 
 @router.post("/add",
@@ -110,6 +128,9 @@ async def add_items_to_basket(body: BasketItemsModel,
     Returns:
         A basketitemsmodel object
     """
+    if basket_store.enabled:
+        return await _add_items_to_store(body, current_user, db)
+
     basket = await repository_baskets.baskets(current_user, db)
     if not basket:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=Ex.HTTP_404_NOT_FOUND)
@@ -125,58 +146,109 @@ async def add_items_to_basket(body: BasketItemsModel,
     if not selected_price:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid price_id_by_the_user")
 
-    basket_item = await repository_basket_items.basket_item(
-        body, current_user, db, selected_price.id,
+    await repository_basket_items.add_basket_items(
+        basket.id, {(body.product_id, selected_price.id): body.quantity}, db
+    )
+    add_product_to_basket = await repository_basket_items.get_existing_basket_item(
+        basket, body.product_id, selected_price.id, db
     )
-
-    add_product_to_basket = None
-
-    if basket_item:
-        add_product_to_basket = await repository_basket_items.update(body, basket, db)
-    elif not basket_item:
-        add_product_to_basket = await repository_basket_items.create(
-            db=db,
-            basket_id=basket.id,
-            product_id=body.product_id,
-            quantity=body.quantity,
-            price_id_by_the_user=body.price_id_by_the_user,
-        )
-
-    basket_items_with_product = list()
 
     if add_product_to_basket:
-        product = await product_by_id(add_product_to_basket.product_id, db)
-
-        exist_product = ProductResponse(id=product.id,
-                                        name=product.name,
-                                        description=product.description,
-                                        product_category_id=product.product_category_id,
-                                        new_product=product.new_product,
-                                        is_popular=product.is_popular,
-                                        is_favorite=product.is_favorite,
-                                        product_status=product.product_status,
-                                        sub_categories=product.sub_categories,
-                                        images=[ImageResponse(id=item.id,
-                                                              product_id=item.product_id,
-                                                              image_url=CloudImage.get_transformation_image(
-                                                                  item.image_url, "product"
-                                                              ),
-                                                              description=item.description,
-                                                              image_type=item.image_type,
-                                                              main_image=item.main_image) for item in product.images],
-                                        prices=[selected_price])
+        main_images = await repository_images.main_images_by_product_ids([product.id], db)
+
+        exist_product = product_response_for_basket(product, selected_price, main_images.get(product.id))
 
         add_product_to_basket = BasketItemsResponse(id=add_product_to_basket.id,
                                                     basket_id=add_product_to_basket.basket_id,
                                                     product=exist_product,
                                                     quantity=add_product_to_basket.quantity,
-                                                    price_id_by_the_user=selected_price.id)
+                                                    price_id_by_the_user=selected_price.id,
+                                                    subtotal=round(selected_price.price * add_product_to_basket.quantity, 2))
         return add_product_to_basket
 
     else:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=Ex.HTTP_404_NOT_FOUND)
 
 
+async def _add_items_to_store(body: BasketItemsModel, current_user: User, db: Session) -> BasketItemsResponse:
+    if body.quantity <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid quantity. Product quantity must be greater than 0."
+        )
+
+    basket_id = await _store_basket_id(current_user, db)
+
+    product = (await basket_store.catalog([(body.product_id, body.price_id_by_the_user)], db)).get(
+        (body.product_id, body.price_id_by_the_user)
+    )
+    if not product:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid price_id_by_the_user")
+    if product.product_status != ProductStatus.activated:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=Ex.HTTP_404_NOT_FOUND)
+
+    line = await basket_store.add(basket_id, body.product_id, body.price_id_by_the_user, body.quantity, db)
+    return _store_line_response(line, product)
+
+
+@router.post("/bulk",
+             response_model=BasketItemsWithTotalResponse,
+             dependencies=[Depends(allowed_operation_admin_moderator_user)])
+async def add_items_to_basket_in_bulk(body: BasketItemsBulkModel,
+                                      current_user: User = Depends(auth_service.get_current_user),
+                                      db: Session = Depends(get_db)):
+    """
+    The add_items_to_basket_in_bulk function adds several products to the user's basket at once.
+        Lines of a product and price that are already in the basket get the quantity added,
+        so the frontend posts the basket of a guest here to merge it after login.
+
+    Args:
+        body: BasketItemsBulkModel: Get the lines of products, prices and quantities from the request body
+        current_user: User: Get the current user
+        db: Session: Create a database session
+
+    Returns:
+        The merged basket with the total price
+    """
+    quantities = defaultdict(int)
+    for item in body.basket_items:
+        if item.quantity <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid quantity. Product quantity must be greater than 0."
+            )
+        quantities[(item.product_id, item.price_id_by_the_user)] += item.quantity
+
+    if basket_store.enabled:
+        return await _add_items_in_bulk_to_store(quantities, current_user, db)
+
+    basket = await repository_baskets.baskets(current_user, db)
+    if not basket:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=Ex.HTTP_404_NOT_FOUND)
+
+    prices = await repository_prices.active_prices_of_activated_products(list(quantities), db)
+    if len(prices) != len(quantities):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid price_id_by_the_user")
+
+    await repository_basket_items.add_basket_items(basket.id, quantities, db)
+
+    return await basket_with_total(current_user, db)
+
+
+async def _add_items_in_bulk_to_store(
+        quantities: dict[tuple[int, int], int], current_user: User, db: Session
+) -> BasketItemsWithTotalResponse:
+    basket_id = await _store_basket_id(current_user, db)
+
+    products = await basket_store.catalog(list(quantities), db)
+    if any(pair not in products or products[pair].product_status != ProductStatus.activated for pair in quantities):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid price_id_by_the_user")
+
+    await basket_store.add_lines(basket_id, quantities, db)
+
+    return await _basket_from_store(current_user, db)
+
+
 @router.delete("/remove",
                status_code=status.HTTP_204_NO_CONTENT,
                dependencies=[Depends(allowed_operation_admin_moderator_user)])
@@ -197,6 +269,11 @@ async def remove_product(body: BasketItemsRemoveModel,
     Returns:
         None
     """
+    if basket_store.enabled:
+        if not await basket_store.remove(await _store_basket_id(current_user, db), body.id, db):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=Ex.HTTP_404_NOT_FOUND)
+        return
+
     basket = await repository_baskets.baskets(current_user, db)
     if not basket:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=Ex.HTTP_404_NOT_FOUND)
@@ -212,8 +289,12 @@ async def remove_product(body: BasketItemsRemoveModel,
               response_model=BasketItemsResponse,
               dependencies=[Depends(allowed_operation_admin_moderator_user)])
 async def change_quantity_items_to_basket(body: ChangeQuantityBasketItemsModel,
+                                          current_user: User = Depends(auth_service.get_current_user),
                                           db: Session = Depends(get_db)):
 
+    if basket_store.enabled:
+        return await _change_quantity_in_store(body, current_user, db)
+
     basket_item = await repository_basket_items.basket_item_for_id(body.id, db)
 
     if not basket_item:
@@ -230,3 +311,19 @@ async def change_quantity_items_to_basket(body: ChangeQuantityBasketItemsModel,
                                                       price_id_by_the_user=update_quantity_basket_item.price_id_by_the_user)
 
     return update_quantity_basket_item
+
+
+async def _change_quantity_in_store(
+        body: ChangeQuantityBasketItemsModel, current_user: User, db: Session
+) -> BasketItemsResponse:
+    line = await basket_store.set_quantity(await _store_basket_id(current_user, db), body.id, body.quantity, db)
+    if not line:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=Ex.HTTP_404_NOT_FOUND)
+
+    product = (await basket_store.catalog([(line["product_id"], line["price_id"])], db)).get(
+        (line["product_id"], line["price_id"])
+    )
+    if not product:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid price_id_by_the_user")
+
+    return _store_line_response(line, product)
@@ -1,3 +1,5 @@
+from typing import List
+
 from fastapi import Depends, HTTPException, status, APIRouter, UploadFile, File, Form
 from sqlalchemy.orm import Session
 from pydantic import ValidationError
@@ -8,6 +10,7 @@ from src.schemas.images import ImageModel, ImageResponse, ImageResponseReview, I
 from src.repository import images as repository_images
 from src.services.cache_in_redis import delete_cache_in_redis
 from src.services.cloud_image import CloudImage
+from src.services.image_storage import image_uploader
 from src.services.roles import RoleAccess
 
 
@@ -30,11 +33,9 @@ async def create_image(description: str = Form(),
         body = ImageModel(description=description, image_type=ImageType.product, product_id=product_id, main_image=main_image)
     except ValidationError:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="UNPROCESSABLE_ENTITY")
-    file_name = CloudImage.generate_name_image()
-    CloudImage.upload(image_file.file, file_name, overwrite=False)
-    image_url = CloudImage.get_url_for_image(file_name)
-    image = await repository_images.create(body, image_url, product_id, db)
-    transformation_image_product = CloudImage.get_transformation_image(image_url, "product")
+    uploaded = await image_uploader.upload(image_file, db)
+    image = await repository_images.create(body, uploaded, product_id, db)
+    transformation_image_product = CloudImage.get_transformation_image(uploaded.image_url, "product")
     image.image_url = transformation_image_product
 
     await delete_cache_in_redis()
@@ -42,6 +43,51 @@ async def create_image(description: str = Form(),
     return image
 
 
+@router.post("/create_imgs_product", response_model=List[ImageResponse],
+             dependencies=[Depends(allowed_operation_admin_moderator)],
+             status_code=status.HTTP_201_CREATED)
+async def create_images(description: str = Form(),
+                        image_files: List[UploadFile] = File(),
+                        product_id: int = Form(),
+                        main_image: bool = Form(),
+                        db: Session = Depends(get_db)):
+    """
+    The create_images function uploads several images of the product at once, the files are
+    uploaded concurrently with their responsive variants, files that are already stored are
+    not uploaded again. When main_image is set the first file becomes the main image.
+
+    Args:
+        description: str: Description of the images
+        image_files: List[UploadFile]: The image files
+        product_id: int: Get the product of the images
+        main_image: bool: Make the first image the main image of the product
+        db: Session: Get the database session
+
+    Returns:
+        A list of images
+    """
+    try:
+        body = ImageModel(description=description, image_type=ImageType.product, product_id=product_id, main_image=main_image)
+    except ValidationError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="UNPROCESSABLE_ENTITY")
+
+    uploaded_images = await image_uploader.upload_many(image_files, db)
+    images = await repository_images.create_many(body, uploaded_images, product_id, db)
+
+    await delete_cache_in_redis()
+
+    return [
+        ImageResponse(id=image.id,
+                      product_id=image.product_id,
+                      image_url=CloudImage.get_transformation_image(image.image_url, "product"),
+                      description=image.description,
+                      image_type=image.image_type,
+                      main_image=image.main_image,
+                      srcset=image.srcset)
+        for image in images
+    ]
+
+
 @router.post("/create_img_review", response_model=ImageResponseReview, dependencies=[Depends(allowed_operation_admin_moderator_user)],
              status_code=status.HTTP_201_CREATED)
 async def create_image(description: str = Form(),
@@ -54,11 +100,9 @@ async def create_image(description: str = Form(),
         body = ImageModelReview(description=description, image_type=ImageType.review, product_id=product_id, review_id=review_id)
     except ValidationError:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="UNPROCESSABLE_ENTITY")
-    file_name = CloudImage.generate_name_image()
-    CloudImage.upload(image_file.file, file_name, overwrite=False)
-    image_url = CloudImage.get_url_for_image(file_name)
-    image = await repository_images.create_image_review(body, image_url, product_id, db)
-    transformation_image_review = CloudImage.get_transformation_image(image_url, "review")
+    uploaded = await image_uploader.upload(image_file, db)
+    image = await repository_images.create_image_review(body, uploaded, product_id, db)
+    transformation_image_review = CloudImage.get_transformation_image(uploaded.image_url, "review")
     image.image_url = transformation_image_review
 
     await delete_cache_in_redis()
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from src.database.db import get_db
@@ -8,10 +8,16 @@ from src.schemas.nova_poshta import (
     NovaPoshtaAddressDeliveryResponse,
     NovaPoshtaAddressDeliveryPartialUpdate,
     NovaPoshtaMessageResponse,
+    NovaPoshtaNearestWarehouseResponse,
+    NovaPoshtaSettlementResponse,
     NovaPoshtaWarehouseResponse,
 )
 from src.services.cache_in_redis import delete_cache_in_redis
+from src.services.nova_poshta import BRANCH_CATEGORY, POSTOMAT_CATEGORY
 from src.services.roles import RoleAccess
+from src.services.settlement_index import settlement_directory
+from src.services.warehouse_directory import warehouse_directory
+from src.services.warehouse_locator import warehouse_locator
 
 
 router = APIRouter(prefix="/nova_poshta", tags=["novaposhta offices"])
@@ -27,7 +33,8 @@ async def get_branches_route(
     settle_ref: str, search_term: str = None, db: Session = Depends(get_db)
 ) -> list[NovaPoshtaWarehouseResponse]:
     """
-    Obtain the novaposhta data from API Nova Poshta and add received branches to database
+    Obtain the branches of the city from the local warehouse directory, a city that is not
+    in the database yet is fetched from API Nova Poshta once and added to database
 
         Arguments:
             settle_ref: str: parameter to receive all branches for the specific data
@@ -38,7 +45,7 @@ async def get_branches_route(
     Returns:
         List of all branches for the specific city
     """
-    return await repository_novaposhta.get_branches(db=db, settle_ref=settle_ref, search_term=search_term)
+    return await warehouse_directory.search(settle_ref, BRANCH_CATEGORY, search_term, db)
 
 
 @router.get("/warehouses/postomats/", response_model=list[NovaPoshtaWarehouseResponse])
@@ -46,7 +53,8 @@ async def get_postomats_route(
     settle_ref: str, search_term: str = None, db: Session = Depends(get_db)
 ) -> list[NovaPoshtaWarehouseResponse]:
     """
-    Obtain the novaposhta data from API Nova Poshta and add received postomats to database
+    Obtain the postomats of the city from the local warehouse directory, a city that is not
+    in the database yet is fetched from API Nova Poshta once and added to database
 
         Arguments:
             settle_ref: str: parameter to receive all postomats for the specific data
@@ -57,7 +65,95 @@ async def get_postomats_route(
     Returns:
         List of all postomats for the specific city
     """
-    return await repository_novaposhta.get_postomats(db=db, settle_ref=settle_ref, search_term=search_term)
+    return await warehouse_directory.search(settle_ref, POSTOMAT_CATEGORY, search_term, db)
+
+
+@router.get("/warehouses/branches/nearest", response_model=list[NovaPoshtaNearestWarehouseResponse])
+async def get_nearest_branches_route(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    limit: int = Query(10, ge=1, le=50),
+    radius_km: float = Query(None, gt=0, le=1000),
+    db: Session = Depends(get_db),
+) -> list[NovaPoshtaNearestWarehouseResponse]:
+    """
+    Obtain the branches nearest to the point from the local warehouse directory
+
+        Arguments:
+            latitude: float: latitude of the point
+            longitude: float: longitude of the point
+            limit: int: the maximum number of branches
+            radius_km: float: only the branches within this distance in kilometers
+            db (Session): SQLAlchemy session object for accessing the database
+
+    Returns:
+        List of branches with their distance to the point, the closest first
+    """
+    return await warehouse_locator.nearest(BRANCH_CATEGORY, latitude, longitude, limit, radius_km, db)
+
+
+@router.get("/warehouses/postomats/nearest", response_model=list[NovaPoshtaNearestWarehouseResponse])
+async def get_nearest_postomats_route(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    limit: int = Query(10, ge=1, le=50),
+    radius_km: float = Query(None, gt=0, le=1000),
+    db: Session = Depends(get_db),
+) -> list[NovaPoshtaNearestWarehouseResponse]:
+    """
+    Obtain the postomats nearest to the point from the local warehouse directory
+
+        Arguments:
+            latitude: float: latitude of the point
+            longitude: float: longitude of the point
+            limit: int: the maximum number of postomats
+            radius_km: float: only the postomats within this distance in kilometers
+            db (Session): SQLAlchemy session object for accessing the database
+
+    Returns:
+        List of postomats with their distance to the point, the closest first
+    """
+    return await warehouse_locator.nearest(POSTOMAT_CATEGORY, latitude, longitude, limit, radius_km, db)
+
+
+@router.get("/settlements/suggest", response_model=list[NovaPoshtaSettlementResponse])
+async def suggest_settlements_route(
+    query: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+) -> list[NovaPoshtaSettlementResponse]:
+    """
+    Suggest settlements by the start of their name for the typeahead of the checkout, from the local
+    settlement directory. The name can be typed in Ukrainian, Russian or Latin letters.
+
+        Arguments:
+            query: str: the typed part of the settlement name
+            limit: int: the maximum number of suggestions
+            db (Session): SQLAlchemy session object for accessing the database
+
+    Returns:
+        List of settlements with their settle_ref, the best matches first
+    """
+    return await settlement_directory.suggest(query, limit, db)
+
+
+@router.put("/update_settlements",
+            response_model=NovaPoshtaMessageResponse,
+            dependencies=[Depends(allowed_operation_admin_moderator)])
+async def update_settlements_data(db: Session = Depends(get_db)) -> dict[str, str]:
+    """
+    Load the settlement directory from API Nova Poshta, or from the dump file when
+    NOVA_POSHTA_SETTLEMENTS_FILE is set, into database
+
+        Arguments:
+            db (Session): SQLAlchemy session object for accessing the database
+
+    Returns:
+        Message with the number of loaded settlements
+    """
+    loaded = await settlement_directory.refresh(db=db)
+
+    return {"message": f"{loaded} settlements loaded successfully."}
 
 
 @router.put("/update_warehouses",
@@ -65,7 +161,7 @@ async def get_postomats_route(
             dependencies=[Depends(allowed_operation_admin_moderator)])
 async def update_warehouses_data(db: Session = Depends(get_db)) -> dict[str, str]:
     """
-    Update the novaposhta data from API Nova Poshta in database
+    Update the novaposhta data from API Nova Poshta in database, the cities are synced concurrently
 
         Arguments:
             db (Session): SQLAlchemy session object for accessing the database
@@ -79,7 +175,8 @@ async def update_warehouses_data(db: Session = Depends(get_db)) -> dict[str, str
             status_code=status.HTTP_404_NOT_FOUND, detail="Warehouses do not exist in the database"
         )
 
-    await repository_novaposhta.update_warehouses_data(db=db)
+    await warehouse_directory.refresh(db=db)
+    warehouse_locator.invalidate()
 
     return {"message": "Warehouses data updated successfully."}
 
@@ -1,18 +1,17 @@
 import pickle
+from typing import Optional
 
-from fastapi import APIRouter, Depends, status, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, status, HTTPException, BackgroundTasks, Header
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
 from faker import Faker
 
 from src.database.caching import get_redis
 from src.database.db import get_db
-from src.database.models import Role, User, OrdersStatus, PostType
+from src.database.models import Role, User, OrdersStatus
 from src.repository import orders as repository_orders
 from src.repository import users as repository_users
-from src.repository import nova_poshta as repository_nova_poshta
-from src.repository import ukr_poshta as repository_ukr_poshta
 from src.schemas.orders import (
     OrderResponse,
     OrderModel,
@@ -29,11 +28,13 @@ from src.schemas.orders import (
 )
 
 from src.services.auth import auth_service
+from src.services.basket_store import basket_store
 from src.services.cache_in_redis import delete_cache_in_redis
-from src.services.email_admin import email_admin_service
+from src.services.idempotency import idempotency_service, request_fingerprint
 from src.services.roles import RoleAccess
 from src.services.exception_detail import ExDetail as Ex
-from src.services.order_to_email import email_service
+from src.services.export import stream_csv
+from src.services.order_to_email import email_service, order_email_data
 from src.services.account_anonym_user import email_account_service
 from src.services.password_utils import hash_password
 
@@ -54,7 +55,7 @@ allowed_operation_admin_moderator_user = RoleAccess([Role.admin, Role.moderator,
              dependencies=[Depends(allowed_operation_admin_moderator_user)])
 async def create_order_auth_user(
         order_info: OrderModel,
-        background_tasks: BackgroundTasks,
+        idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
         current_user: User = Depends(auth_service.get_current_user),
         db: Session = Depends(get_db),
 ):
@@ -63,104 +64,44 @@ async def create_order_auth_user(
 
     Args:
         order_info: OrderModel: Validate the request body
-        background_tasks: BackgroundTasks: Add a task to the background tasks queue
+        idempotency_key: str: Retries with the same key get the response of the first attempt
         db: Session: Pass the database session to the repository layer
         current_user (User): the current user attempting to create the order
 
     Returns:
         An order object
     """
+    return await idempotency_service.run(
+        scope=f"orders_auth_user:{current_user.id}",
+        key=idempotency_key,
+        handler=lambda: _create_order_auth_user(order_info, current_user, db),
+        status_code=status.HTTP_201_CREATED,
+        fingerprint=request_fingerprint(order_info),
+    )
+
+
+async def _create_order_auth_user(order_info: OrderModel, current_user: User, db: Session):
+    if basket_store.enabled:
+        basket_id = await basket_store.basket_id(current_user, db)
+        if basket_id:
+            await basket_store.flush_basket(basket_id, db)
 
     new_order = await repository_orders.create_order_auth_user(order_info, current_user.id, db)
 
     if isinstance(new_order, JSONResponse):
         return new_order
 
-    nova_poshta = (
-        await repository_nova_poshta.get_nova_poshta_by_id(new_order.selected_nova_poshta_id, db)
-    )
-    ukr_poshta = (
-        await repository_ukr_poshta.get_ukr_poshta_by_id(new_order.selected_ukr_poshta_id, db)
-    )
-
-    if nova_poshta:
-        if nova_poshta.is_delivery:
-            delivery_address = (
-                f"{new_order.selected_nova_poshta.city}, "
-                f"{new_order.selected_nova_poshta.street}, "
-                f"{new_order.selected_nova_poshta.house_number}, "
-                f"кв. {new_order.selected_nova_poshta.apartment_number}"
-            )
-            delivery_type = "Нова Пошта (адресна доставка)"
-        else:
-            delivery_address = (
-                f"{new_order.selected_nova_poshta.city}, "
-                f"{new_order.selected_nova_poshta.address_warehouse}"
-            )
-            delivery_type = "Нова Пошта (відділення/поштомат)"
-    elif ukr_poshta:
-        delivery_address = (
-            f"{new_order.selected_ukr_poshta.post_code}, "
-            f"{new_order.selected_ukr_poshta.city}, "
-            f"{new_order.selected_ukr_poshta.street}, "
-            f"{new_order.selected_ukr_poshta.house_number}, "
-            f"кв. {new_order.selected_ukr_poshta.apartment_number}"
+    if basket_store.enabled:
+        basket_store.clear(new_order.basket_id)
 
-        )
-        delivery_type = "УкрПошта (адресна доставка)"
-    else:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=Ex.HTTP_404_NOT_FOUND)
-
-    phone_number_customer = (
-        order_info.phone_number_current_user if order_info.phone_number_current_user else current_user.phone_number
-    )
-
-    if new_order.is_another_recipient:
-        recipient_name = new_order.full_name_another_recipient
-        recipient_phone = new_order.phone_number_another_recipient
-    else:
-        recipient_name = f"{current_user.first_name} {current_user.last_name}"
-        recipient_phone = phone_number_customer
-
-    order_data = {
-        "order_id": new_order.id,
-        "total_price": new_order.price_order,
-        "customer": f"{current_user.first_name} {current_user.last_name}",
-        "phone_number_customer": phone_number_customer,
-        "email_customer": current_user.email,
-        "full_name_another_recipient": recipient_name,
-        "phone_number_another_recipient": recipient_phone,
-        "delivery_mode": delivery_type,
-        "address_delivery": delivery_address,
-        "payment_mode": new_order.payment_type,
-        "ordered_products": [
-            {
-                "name": product.products.name,
-                "weight": product.prices.weight,
-                "price": product.prices.price,
-                "quantity": product.quantity,
-            }
-            for product in new_order.ordered_products
-        ],
-    }
-
-    background_tasks.add_task(email_service.send_order_confirmation_email, order_data)
-
-    email_addresses = await repository_users.get_email_addresses(db=db)
-    for email in email_addresses:
-        if email.is_send_message:
-            background_tasks.add_task(
-                email_admin_service.send_admin_email,
-                email.address,
-                new_order.id,
-                new_order.comment
-            )
+    order_view = await repository_orders.get_order_view(new_order.id, db)
 
     response_data = OrdersWithMessage(
-        message="Email sent successfully!", order_info=new_order
+        message="Email sent successfully!", order_info=order_view
     )
 
     await delete_cache_in_redis()
+    email_service.cache_order_data(order_email_data(order_view))
 
     return response_data
 
@@ -171,6 +112,7 @@ async def create_order_auth_user(
 async def create_order_anonym_user(
         order_data: OrderAnonymUserModel,
         background_tasks: BackgroundTasks,
+        idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
         db: Session = Depends(get_db),
 ):
     """
@@ -181,77 +123,29 @@ async def create_order_anonym_user(
         (post_type: (permitted: "nova_poshta_warehouse", "nova_poshta_address", "ukr_poshta"))
 
         background_tasks: BackgroundTasks: Add a task to the background tasks queue
+        idempotency_key: str: Retries with the same key get the response of the first attempt
         db: Session: Pass the database session to the repository layer
     Returns:
         An order object
     """
-
-    new_order_anonym_user = (
-        await repository_orders.create_order_anonym_user(order_data, db)
+    # guests have no account, their keys are scoped by the hashed email so one guest never gets
+    # the order of another one that happened to send the same key
+    return await idempotency_service.run(
+        scope=f"orders_anonym_user:{request_fingerprint(order_data.email_anon_user.lower())}",
+        key=idempotency_key,
+        handler=lambda: _create_order_anonym_user(order_data, background_tasks, db),
+        status_code=status.HTTP_201_CREATED,
+        fingerprint=request_fingerprint(order_data),
     )
 
-    if new_order_anonym_user.post_type == PostType.nova_poshta_warehouse:
-        delivery_address = (
-            f"{new_order_anonym_user.city}, "
-            f"{new_order_anonym_user.address_warehouse}"
-        )
-        delivery_type = "Нова Пошта (відділення)"
-    elif new_order_anonym_user.post_type == PostType.nova_poshta_address:
-        delivery_address = (
-            f"{new_order_anonym_user.city}, "
-            f"{new_order_anonym_user.street}, "
-            f"{new_order_anonym_user.house_number}, "
-            f"кв. {new_order_anonym_user.apartment_number}"
-        )
-        delivery_type = "Нова Пошта (адресна доставка)"
-    else:
-        delivery_address = (
-            f"{new_order_anonym_user.post_code}, "
-            f"{new_order_anonym_user.city}, "
-            f"{new_order_anonym_user.street}, "
-            f"{new_order_anonym_user.house_number}, "
-            f"кв. {new_order_anonym_user.apartment_number}"
-
-        )
-        delivery_type = "УкрПошта (адресна доставка)"
-
-    if new_order_anonym_user.is_another_recipient:
-        recipient_name = new_order_anonym_user.full_name_another_recipient
-        recipient_phone = new_order_anonym_user.phone_number_another_recipient
-    else:
-        recipient_name = (
-            f"{new_order_anonym_user.first_name_anon_user} "
-            f"{new_order_anonym_user.last_name_anon_user}"
-        )
-        recipient_phone = new_order_anonym_user.phone_number_anon_user
 
-    customer_name = (
-        f"{new_order_anonym_user.first_name_anon_user} "
-        f"{new_order_anonym_user.last_name_anon_user}"
+async def _create_order_anonym_user(
+        order_data: OrderAnonymUserModel, background_tasks: BackgroundTasks, db: Session
+):
+    new_order_anonym_user = (
+        await repository_orders.create_order_anonym_user(order_data, db)
     )
 
-    order_data = {
-        "order_id": new_order_anonym_user.id,
-        "total_price": new_order_anonym_user.price_order,
-        "customer": customer_name,
-        "phone_number_customer": new_order_anonym_user.phone_number_anon_user,
-        "email_customer": new_order_anonym_user.email_anon_user,
-        "full_name_another_recipient": recipient_name,
-        "phone_number_another_recipient": recipient_phone,
-        "delivery_mode": delivery_type,
-        "address_delivery": delivery_address,
-        "payment_mode": new_order_anonym_user.payment_type,
-        "ordered_products": [
-            {
-                "name": product.products.name,
-                "weight": product.prices.weight,
-                "price": product.prices.price,
-                "quantity": product.quantity,
-            }
-            for product in new_order_anonym_user.ordered_products
-        ],
-    }
-
     email_anonym_user = new_order_anonym_user.email_anon_user
     phone_number = new_order_anonym_user.phone_number_anon_user
     first_name = new_order_anonym_user.first_name_anon_user
@@ -270,9 +164,6 @@ async def create_order_anonym_user(
             exist_user.phone_number = phone_number
         elif exist_user.phone_number:
             new_order_anonym_user.phone_number_anon_user = exist_user.phone_number
-            order_data["phone_number_customer"] = new_order_anonym_user.phone_number_anon_user
-            if not new_order_anonym_user.is_another_recipient:
-                order_data["phone_number_another_recipient"] = new_order_anonym_user.phone_number_anon_user
     else:
         new_user = await repository_users.create_account_anonym_user(
             email=email_anonym_user, password=hashed_password, first_name=first_name, last_name=last_name, db=db
@@ -288,23 +179,14 @@ async def create_order_anonym_user(
 
     db.commit()
 
-    background_tasks.add_task(email_service.send_order_confirmation_email, order_data)
-
-    email_addresses = await repository_users.get_email_addresses(db=db)
-    for email in email_addresses:
-        if email.is_send_message:
-            background_tasks.add_task(
-                email_admin_service.send_admin_email,
-                email.address,
-                new_order_anonym_user.id,
-                new_order_anonym_user.comment
-            )
+    order_view = await repository_orders.get_order_view(new_order_anonym_user.id, db)
 
     response_data = OrdersResponseWithMessage(
-        message="Email sent successfully!", order_info=new_order_anonym_user
+        message="Email sent successfully!", order_info=order_view
     )
 
     await delete_cache_in_redis()
+    email_service.cache_order_data(order_email_data(order_view))
 
     return response_data
 
@@ -313,7 +195,11 @@ async def create_order_anonym_user(
             response_model=OrdersCRMWithTotalCountResponse,
             dependencies=[Depends(allowed_operation_admin_moderator)])
 async def get_orders_for_crm(
-        limit: int, offset: int, order_status: OrdersStatus = None, db: Session = Depends(get_db)
+        limit: int,
+        offset: int = 0,
+        order_status: OrdersStatus = None,
+        cursor: str = None,
+        db: Session = Depends(get_db)
 ):
 
     """
@@ -322,13 +208,14 @@ async def get_orders_for_crm(
     :param limit: int: Limit the number of orders returned
     :param offset: int: Indicate the number of records to skip
     :param order_status: OrdersStatus: Filter orders by status
+    :param cursor: str: next_cursor of the previous page, replaces the offset
     :param db: Session: Pass the database connection to the function
 
     :return: A list of orders
     """
     redis_client = get_redis()
 
-    key = f"orders:order_status_{order_status}_limit:{limit}_offset:{offset}"
+    key = f"orders:order_status_{order_status}_limit:{limit}_offset:{offset}_cursor:{cursor}"
 
     cached_orders = None
 
@@ -336,7 +223,7 @@ async def get_orders_for_crm(
         cached_orders = redis_client.get(key)
 
     if not cached_orders:
-        orders_ = await repository_orders.get_orders_all_for_crm(limit, offset, order_status, db)
+        orders_ = await repository_orders.get_orders_all_for_crm(limit, offset, order_status, db, cursor)
 
         if redis_client:
             redis_client.set(key, pickle.dumps(orders_))
@@ -351,6 +238,25 @@ async def get_orders_for_crm(
     return orders_
 
 
+@router.get("/export_for_crm",
+            response_class=StreamingResponse,
+            dependencies=[Depends(allowed_operation_admin_moderator)])
+async def export_orders_for_crm(order_status: OrdersStatus = None):
+    """
+    The export_orders_for_crm function streams the orders for the CRM as a CSV file,
+    one row per ordered product.
+
+    :param order_status: OrdersStatus: Filter orders by status
+
+    :return: A CSV file with the orders
+    """
+    return StreamingResponse(
+        stream_csv(repository_orders.orders_for_export(order_status)),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="orders.csv"'},
+    )
+
+
 @router.get("/{order_id}/for_crm",
             response_model=OrdersCRMResponse,
             dependencies=[Depends(allowed_operation_admin_moderator)])
@@ -2,6 +2,7 @@ import pickle
 from typing import Union
 
 from fastapi import APIRouter, Depends, status, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from src.database.db import get_db
@@ -17,6 +18,7 @@ from src.services.cache_in_redis import delete_cache_in_redis
 from src.services.cloud_image import CloudImage
 from src.services.roles import RoleAccess
 from src.services.exception_detail import ExDetail as Ex
+from src.services.export import stream_csv
 from src.services.products import get_products_by_sort, get_products_by_sort_and_category_id, parser_weight
 
 router = APIRouter(prefix="/product", tags=["product"])
@@ -48,7 +50,7 @@ async def products(
     :param offset: int: Specify the offset of the list
     :param weight: str: Filter the products by weight (50,100,150,200,300,400,500,1000)
     :param pr_category_id: int: Filter the products by category
-    :param sort: str: Sort the list of products by price or date
+    :param sort: str: Sort the list of products by price, date or rating
     :param db: Session: Pass the database session to the function
     :return: A list of products
     """
@@ -60,7 +62,7 @@ async def products(
     # Redis client
     redis_client = get_redis()
     # List of allowed sorts
-    allowed_sorts = ["id", "name", "low_price", "high_price", "low_date", "high_date"]
+    allowed_sorts = ["id", "name", "low_price", "high_price", "low_date", "high_date", "rating"]
     if sort not in allowed_sorts:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail=f"Invalid sort parameter. Allowed values: {', '.join(allowed_sorts)}")
@@ -163,6 +165,30 @@ async def products_for_crm(
     return products_
 
 
+@router.get("/export_for_crm",
+            response_class=StreamingResponse,
+            dependencies=[Depends(allowed_operation_admin_moderator)])
+async def export_products_for_crm(
+        search_query: Union[int, str] = Query(None, min_length=3),
+        pr_status: ProductStatus = None,
+        pr_category_id: int = None,
+):
+    """
+    The export_products_for_crm function streams the products for the CRM as a CSV file,
+    one row per price of the product.
+
+    :param pr_status: ProductStatus: Filter products by status
+    :param pr_category_id: int: Filter the products by category
+    :param search_query: product search criterion (by name or id of the product)
+    :return: A CSV file with the products
+    """
+    return StreamingResponse(
+        stream_csv(repository_products.products_for_export(search_query, pr_category_id, pr_status)),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="products.csv"'},
+    )
+
+
 @router.post("/create",
              response_model=ProductResponse,
              dependencies=[Depends(allowed_operation_admin_moderator)],
@@ -210,7 +236,8 @@ async def create_product(body: ProductModel, db: Session = Depends(get_db)):
                                                                                                       "product"),
                                                         description=item.description,
                                                         image_type=item.image_type,
-                                                        main_image=item.main_image) for item in new_product.images],
+                                                        main_image=item.main_image,
+                                                        srcset=item.srcset) for item in new_product.images],
                                   prices=await price_by_product(new_product, db))
 
     await delete_cache_in_redis()
@@ -8,11 +8,15 @@ from src.database.db import get_db
 from src.database.models import User, Role
 from src.repository import reviews as repository_reviews
 from src.repository import products as repository_products
-from src.schemas.images import ImageResponseReview
-from src.schemas.reviews import ReviewResponse, ReviewModel, ReviewArchiveModel, ReviewCheckModel
+from src.schemas.reviews import (
+    ReviewResponse,
+    ReviewModel,
+    ReviewArchiveModel,
+    ReviewCheckModel,
+    ReviewsWithCursorResponse,
+)
 from src.services.auth import auth_service
 from src.services.cache_in_redis import delete_cache_in_redis
-from src.services.cloud_image import CloudImage
 from src.services.roles import RoleAccess
 from src.services.exception_detail import ExDetail as Ex
 
@@ -23,22 +27,60 @@ allowed_operation_admin_moderator = RoleAccess([Role.admin, Role.moderator])
 allowed_operation_admin_moderator_user = RoleAccess([Role.admin, Role.moderator, Role.user])
 
 
-@router.get("/", response_model=list[ReviewResponse])
-async def get_reviews(limit: int, offset: int, db: Session = Depends(get_db)):
+@router.get("/", response_model=ReviewsWithCursorResponse)
+async def get_reviews(limit: int, offset: int = 0, cursor: str = None, db: Session = Depends(get_db)):
     """
-    The function returns a list of all reviews in the database which were checked by an admin or a moderator.
+    The function returns a list of all reviews in the database which were checked by an admin or a moderator,
+    the best and newest first.
 
     Args:
         limit: int: Limit the number of reviews returned
         offset: int: Specify the offset of the first review to be returned
+        cursor: str: next_cursor of the previous page, replaces the offset
         db: Session: Access the database
 
     Returns:
-        A list of reviews
+        A list of reviews and the cursor of the next page
+    """
+    redis_client = get_redis()
+
+    key = f"reviews_limit:{limit}:offset:{offset}:cursor:{cursor}"
+
+    cached_reviews = None
+
+    if redis_client:
+        cached_reviews = redis_client.get(key)
+
+    if not cached_reviews:
+        reviews = await repository_reviews.get_reviews(limit, offset, cursor, db)
+
+        if redis_client:
+            redis_client.set(key, pickle.dumps(reviews))
+            redis_client.expire(key, 1800)
+    else:
+        reviews = pickle.loads(cached_reviews)
+
+    return reviews
+
+
+@router.get("/product/{product_id}", response_model=ReviewsWithCursorResponse)
+async def get_reviews_for_product(product_id: int, limit: int = 10, cursor: str = None, db: Session = Depends(get_db)):
+    """
+    The function returns the reviews of the product which were checked by an admin or a moderator,
+    the best and newest first. The rating stats of the product are in the product response.
+
+    Args:
+        product_id: int: Get the reviews of the product
+        limit: int: Limit the number of reviews returned
+        cursor: str: next_cursor of the previous page
+        db: Session: Access the database
+
+    Returns:
+        A list of reviews and the cursor of the next page
     """
     redis_client = get_redis()
 
-    key = f"reviews_limit:{limit}:offset:{offset}"
+    key = f"reviews_product:{product_id}:limit:{limit}:cursor:{cursor}"
 
     cached_reviews = None
 
@@ -46,61 +88,33 @@ async def get_reviews(limit: int, offset: int, db: Session = Depends(get_db)):
         cached_reviews = redis_client.get(key)
 
     if not cached_reviews:
-        reviews = await repository_reviews.get_reviews(limit, offset, db)
-        reviews_result = list()
-
-        for review in reviews:
-            reviews_result.append(ReviewResponse(
-                id=review.id,
-                user_id=review.user_id,
-                user=review.user,
-                product_id=review.product_id,
-                rating=review.rating,
-                description=review.description,
-                created_at=review.created_at,
-                is_deleted=review.is_deleted,
-                is_checked=review.is_checked,
-                images=list()
-            ))
-
-            image_response = list()
-
-            if len(review.images) > 0:
-                review.images[0].image_url = CloudImage.get_transformation_image(review.images[0].image_url, "review")
-                for img in review.images:
-                    image_response.append((ImageResponseReview(id=img.id,
-                                                               product_id=img.product_id,
-                                                               review_id=img.review_id,
-                                                               image_url=img.image_url,
-                                                               description=img.description,
-                                                               image_type=img.image_type)))
-
-            reviews_result[-1].images = image_response
+        reviews = await repository_reviews.get_reviews_for_product(product_id, limit, cursor, db)
 
         if redis_client:
-            redis_client.set(key, pickle.dumps(reviews_result))
+            redis_client.set(key, pickle.dumps(reviews))
             redis_client.expire(key, 1800)
     else:
-        reviews_result = pickle.loads(cached_reviews)
+        reviews = pickle.loads(cached_reviews)
 
-    return reviews_result
+    return reviews
 
 
 @router.get("/all_for_crm", response_model=list[ReviewResponse],
             dependencies=[Depends(allowed_operation_admin_moderator)])
-async def get_reviews_for_crm(limit: int, offset: int, db: Session = Depends(get_db)):
+async def get_reviews_for_crm(limit: int, offset: int, is_checked: bool = None, db: Session = Depends(get_db)):
     """
     The function returns a list of all reviews in the database.
 
     Args:
         limit: int: Limit the number of reviews returned
         offset: int: Specify the offset of the first review to be returned
+        is_checked: bool: Filter reviews by moderation, is_checked=false is the moderation queue
         db: Session: Access the database
 
     Returns:
         A list of reviews
     """
-    return await repository_reviews.get_reviews_for_crm(limit, offset, db)
+    return await repository_reviews.get_reviews_for_crm(limit, offset, is_checked, db)
 
 
 @router.post("/create",
@@ -0,0 +1,134 @@
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from src.database.db import get_db
+from src.database.models import Role, OrdersStatus
+from src.repository import sales_analytics as repository_sales_analytics
+from src.schemas.sales_analytics import (
+    SalesByProductResponse,
+    SalesByPaymentTypeResponse,
+    SalesByPostTypeResponse,
+    SalesByDayResponse,
+    SalesAnalyticsMessageResponse,
+)
+from src.services.roles import RoleAccess
+
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+# role authority
+allowed_operation_admin = RoleAccess([Role.admin])
+
+
+def validate_date_range(date_from: date, date_to: date) -> None:
+    if date_from > date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from must not be after date_to")
+
+
+@router.get("/sales/products",
+            response_model=list[SalesByProductResponse],
+            dependencies=[Depends(allowed_operation_admin)])
+async def get_sales_by_products(
+        date_from: date, date_to: date, order_status: OrdersStatus = None, db: Session = Depends(get_db)
+):
+    """
+    Revenue, orders and units per product and price (weight) for the date range.
+
+    Args:
+        date_from: date: First day of the range (day of order creation)
+        date_to: date: Last day of the range
+        order_status: OrdersStatus: Count only orders in this status, all except cancelled by default
+        db: Session: Access the database
+
+    Returns:
+        A list of sales per product, the best sellers first
+    """
+    validate_date_range(date_from, date_to)
+    return await repository_sales_analytics.get_sales_by_products(date_from, date_to, order_status, db)
+
+
+@router.get("/sales/payment_types",
+            response_model=list[SalesByPaymentTypeResponse],
+            dependencies=[Depends(allowed_operation_admin)])
+async def get_sales_by_payment_types(
+        date_from: date, date_to: date, order_status: OrdersStatus = None, db: Session = Depends(get_db)
+):
+    """
+    Revenue and orders per payment type for the date range.
+
+    Args:
+        date_from: date: First day of the range (day of order creation)
+        date_to: date: Last day of the range
+        order_status: OrdersStatus: Count only orders in this status, all except cancelled by default
+        db: Session: Access the database
+
+    Returns:
+        A list of sales per payment type
+    """
+    validate_date_range(date_from, date_to)
+    return await repository_sales_analytics.get_sales_by_payment_types(date_from, date_to, order_status, db)
+
+
+@router.get("/sales/post_types",
+            response_model=list[SalesByPostTypeResponse],
+            dependencies=[Depends(allowed_operation_admin)])
+async def get_sales_by_post_types(
+        date_from: date, date_to: date, order_status: OrdersStatus = None, db: Session = Depends(get_db)
+):
+    """
+    Revenue and orders per delivery type for the date range.
+
+    Args:
+        date_from: date: First day of the range (day of order creation)
+        date_to: date: Last day of the range
+        order_status: OrdersStatus: Count only orders in this status, all except cancelled by default
+        db: Session: Access the database
+
+    Returns:
+        A list of sales per delivery type
+    """
+    validate_date_range(date_from, date_to)
+    return await repository_sales_analytics.get_sales_by_post_types(date_from, date_to, order_status, db)
+
+
+@router.get("/sales/days",
+            response_model=list[SalesByDayResponse],
+            dependencies=[Depends(allowed_operation_admin)])
+async def get_sales_by_days(
+        date_from: date, date_to: date, order_status: OrdersStatus = None, db: Session = Depends(get_db)
+):
+    """
+    Revenue and orders per day for the date range.
+
+    Args:
+        date_from: date: First day of the range (day of order creation)
+        date_to: date: Last day of the range
+        order_status: OrdersStatus: Count only orders in this status, all except cancelled by default
+        db: Session: Access the database
+
+    Returns:
+        A list of daily sales, days without orders are omitted
+    """
+    validate_date_range(date_from, date_to)
+    return await repository_sales_analytics.get_sales_by_days(date_from, date_to, order_status, db)
+
+
+@router.post("/sales/reconcile",
+             response_model=SalesAnalyticsMessageResponse,
+             dependencies=[Depends(allowed_operation_admin)])
+async def reconcile_sales(date_from: date, db: Session = Depends(get_db)):
+    """
+    Rebuild the daily sales rollups from the orders, e.g. to fill them for the orders created before they existed.
+
+    Args:
+        date_from: date: Rebuild all days starting from this one
+        db: Session: Access the database
+
+    Returns:
+        Message that the rollups were rebuilt
+    """
+    await repository_sales_analytics.reconcile(date_from, db)
+
+    return {"message": f"Sales rollups rebuilt starting from {date_from}"}
@@ -1,6 +1,6 @@
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from src.schemas.product import ProductResponse
 
@@ -11,6 +11,10 @@ class BasketItemsModel(BaseModel):
     price_id_by_the_user: Optional[int]
 
 
+class BasketItemsBulkModel(BaseModel):
+    basket_items: List[BasketItemsModel] = Field(min_items=1, max_items=100)
+
+
 class BasketItemsRemoveModel(BaseModel):
     id: int
 
@@ -21,11 +25,17 @@ class BasketItemsResponse(BaseModel):
     product: ProductResponse
     quantity: int
     price_id_by_the_user: int
+    subtotal: Optional[float] = None
 
     class Config:
         orm_mode = True
 
 
+class BasketItemsWithTotalResponse(BaseModel):
+    basket_items: List[BasketItemsResponse]
+    total_price: float
+
+
 class ChangeQuantityBasketItemsModel(BaseModel):
     id: int
     quantity: int
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -19,6 +19,7 @@ class ImageResponse(BaseModel):
     description: str = Field(min_length=1, max_length=255)
     image_type: ImageType
     main_image: bool
+    srcset: Dict[str, str] = {}
 
     class Config:
         orm_mode = True
@@ -38,6 +39,13 @@ class ImageResponseReview(BaseModel):
     image_url: str
     description: str = Field(min_length=1, max_length=255)
     image_type: ImageType
+    srcset: Dict[str, str] = {}
 
     class Config:
         orm_mode = True
+
+
+class UploadedImage(BaseModel):
+    image_url: str
+    content_hash: str
+    variants: List[dict] = []
@@ -72,3 +72,22 @@ class NovaPoshtaMessageResponse(BaseModel):
 class NovaPoshtaWarehouseResponse(BaseModel):
     id: int
     address_warehouse: str
+
+
+class NovaPoshtaNearestWarehouseResponse(BaseModel):
+    id: int
+    address_warehouse: str
+    city: str
+    settlement_ref: str
+    latitude: float
+    longitude: float
+    distance_km: float
+
+
+class NovaPoshtaSettlementResponse(BaseModel):
+    settlement_ref: str
+    name: str
+    settlement_type: Optional[str] = ""
+    area: Optional[str] = ""
+    region: Optional[str] = ""
+    has_warehouses: bool
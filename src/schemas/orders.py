@@ -30,6 +30,28 @@ class OrderedProductResponse(BaseModel):
         orm_mode = True
 
 
+class OrderedProductEmailModel(BaseModel):
+    name: str
+    weight: Optional[str]
+    price: float
+    quantity: int
+
+
+class OrderEmailModel(BaseModel):
+    """Compact order data of the order confirmation email"""
+    order_id: int
+    total_price: Optional[float]
+    customer: str
+    email_customer: str
+    phone_number_customer: Optional[str]
+    full_name_another_recipient: Optional[str]
+    phone_number_another_recipient: Optional[str]
+    delivery_mode: str
+    address_delivery: str
+    payment_mode: Optional[PaymentsTypes]
+    ordered_products: list[OrderedProductEmailModel]
+
+
 class OrderModel(BaseModel):
     phone_number_current_user: Optional[str] = ""
     selected_nova_poshta_id: Optional[int] = Field(default_factory=lambda: None)
@@ -199,6 +221,8 @@ class OrdersCurrentUserWithTotalCountResponse(BaseModel):
 class OrdersCRMWithTotalCountResponse(BaseModel):
     orders: list[OrdersCRMResponse] = []
     total_count: int
+    status_counts: dict[str, int] = {}
+    next_cursor: Optional[str] = None
 
 
 class OrdersResponseWithMessage(BaseModel):
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 
 from pydantic import BaseModel, Field
 
@@ -30,6 +30,9 @@ class ProductResponse(BaseModel):
     sub_categories: List[ProductSubCategoryResponse] = []
     images: List[ImageResponse]
     prices: List[PriceResponse]
+    rating_count: int = 0
+    rating_average: float = 0
+    rating_histogram: Dict[int, int] = {}
 
     class Config:
         orm_mode = True
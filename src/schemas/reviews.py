@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Type
+from typing import Optional, Type
 
 from pydantic import BaseModel, Field
 
@@ -31,6 +31,11 @@ class ReviewResponse(BaseModel):
         orm_mode = True
 
 
+class ReviewsWithCursorResponse(BaseModel):
+    reviews: list[ReviewResponse] = []
+    next_cursor: Optional[str] = None
+
+
 class ReviewArchiveModel(BaseModel):
     id: int
 
@@ -0,0 +1,49 @@
+from datetime import date
+
+from pydantic import BaseModel
+
+from src.database.models import PaymentsTypes, PostType
+
+
+class SalesByProductResponse(BaseModel):
+    product_id: int
+    name: str
+    price_id: int
+    weight: str
+    orders_count: int
+    units: int
+    revenue: float
+
+    class Config:
+        orm_mode = True
+
+
+class SalesByPaymentTypeResponse(BaseModel):
+    payment_type: PaymentsTypes
+    orders_count: int
+    revenue: float
+
+    class Config:
+        orm_mode = True
+
+
+class SalesByPostTypeResponse(BaseModel):
+    post_type: PostType
+    orders_count: int
+    revenue: float
+
+    class Config:
+        orm_mode = True
+
+
+class SalesByDayResponse(BaseModel):
+    day: date
+    orders_count: int
+    revenue: float
+
+    class Config:
+        orm_mode = True
+
+
+class SalesAnalyticsMessageResponse(BaseModel):
+    message: str
@@ -0,0 +1,94 @@
+"""
+Local stand-in for the Nova Poshta API, to run the warehouse sync, the settlement load and the
+checkout lookups without the real API and an API key.
+
+    uvicorn src.seed.nova_poshta_stub:app --port 8001
+
+and set API_URL_NOVA_POSHTA=http://localhost:8001/v2.0/json/ for the app. The answers are
+generated from the refs, so they are the same on every start. Failures of the real API can be
+imitated with the environment variables:
+
+    NOVA_POSHTA_STUB_FAILURE_RATE   share of the calls answered with 503, 0 by default
+    NOVA_POSHTA_STUB_DELAY_SECONDS  delay of every answer, 0 by default
+    NOVA_POSHTA_STUB_SETTLEMENTS    number of settlements of getSettlements, 500 by default
+"""
+import asyncio
+import os
+import random
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+FAILURE_RATE = float(os.getenv("NOVA_POSHTA_STUB_FAILURE_RATE", "0"))
+DELAY_SECONDS = float(os.getenv("NOVA_POSHTA_STUB_DELAY_SECONDS", "0"))
+SETTLEMENTS = int(os.getenv("NOVA_POSHTA_STUB_SETTLEMENTS", "500"))
+
+NAMESPACE = uuid.UUID("7d5f1c9e-2a4b-4c8d-9e6f-0a1b2c3d4e5f")
+
+app = FastAPI(title="Nova Poshta API stub")
+
+
+def _ref(*parts) -> str:
+    return str(uuid.uuid5(NAMESPACE, ":".join(str(part) for part in parts)))
+
+
+def _settlement(number: int) -> dict:
+    return {
+        "Ref": _ref("settlement", number),
+        "Description": f"Населений пункт {number}",
+        "DescriptionRu": f"Населенный пункт {number}",
+        "SettlementTypeDescription": "місто" if number % 10 == 0 else "село",
+        "AreaDescription": f"Область {number % 24 + 1}",
+        "RegionsDescription": f"Район {number % 7 + 1}",
+        "Warehouse": "1" if number % 3 else "0",
+    }
+
+
+def _warehouses(settle_ref: str) -> list[dict]:
+    generator = random.Random(settle_ref)
+    latitude, longitude = generator.uniform(44.5, 52), generator.uniform(22.5, 40)
+
+    warehouses = []
+    for number in range(1, generator.randint(3, 40) + 1):
+        kind = "Поштомат" if number % 4 == 0 else "Відділення"
+        warehouses.append({
+            "Ref": _ref("warehouse", settle_ref, number),
+            "Description": f"{kind} №{number}: вул. Тестова, {generator.randint(1, 200)}",
+            "SettlementRef": settle_ref,
+            "SettlementDescription": f"Населений пункт {settle_ref[:8]}",
+            "SettlementAreaDescription": "Тестова область",
+            "SettlementRegionsDescription": "Тестовий район",
+            "Latitude": f"{latitude + generator.uniform(-0.05, 0.05):.6f}",
+            "Longitude": f"{longitude + generator.uniform(-0.05, 0.05):.6f}",
+        })
+    return warehouses
+
+
+def _answer(data: list, info: dict = None, success: bool = True, errors: list = None) -> dict:
+    return {"success": success, "data": data, "errors": errors or [], "warnings": [], "info": info or {}}
+
+
+@app.post("/v2.0/json/")
+async def api(request: Request):
+    if DELAY_SECONDS:
+        await asyncio.sleep(DELAY_SECONDS)
+    if random.random() < FAILURE_RATE:
+        return JSONResponse(status_code=503, content={"detail": "Service Unavailable"})
+
+    body = await request.json()
+    called_method = body.get("calledMethod")
+    properties = body.get("methodProperties") or {}
+
+    if called_method == "getWarehouses":
+        settle_ref = properties.get("SettlementRef")
+        if not settle_ref:
+            return _answer([], success=False, errors=["SettlementRef is required"])
+        return _answer(_warehouses(settle_ref))
+
+    if called_method == "getSettlements":
+        page, limit = int(properties.get("Page", 1)), int(properties.get("Limit", 150))
+        numbers = range((page - 1) * limit + 1, min(page * limit, SETTLEMENTS) + 1)
+        return _answer([_settlement(number) for number in numbers], info={"totalCount": SETTLEMENTS})
+
+    return _answer([], success=False, errors=[f"Method {called_method} is not supported by the stub"])
@@ -1,31 +1,22 @@
 import logging
 
-from fastapi_mail import FastMail, MessageSchema, MessageType
 from pydantic import EmailStr
 
-from src.services.email import conf
+from src.services.email import mail_service
 
 logger = logging.getLogger(__name__)
 
 
 class EmailService:
-    def __init__(self):
-        self.mail = FastMail(conf)
-
     async def send_account_email(self, email: EmailStr, password: str):
         try:
-            template_data = {
-                "email": email,
-                "password": password,
-            }
-
-            message_schema = MessageSchema(
+            message_schema = mail_service.message(
                 subject="Account confirmation",
                 recipients=[email],
-                template_body=template_data,
-                subtype=MessageType.html
+                template_name="account_anonym_user.html",
+                data={"email": email, "password": password},
             )
-            await self.mail.send_message(message_schema, template_name="account_anonym_user.html")
+            await mail_service.send(message_schema)
             logger.info("Email sent successfully from the Sushka Shop")
         except Exception as e:
             logger.error(f"Error sending email from the Sushka Shop: {str(e)}")
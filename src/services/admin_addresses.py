@@ -0,0 +1,77 @@
+import logging
+import time
+import uuid
+
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.caching import get_redis
+from src.database.models import EmailAddress
+
+logger = logging.getLogger(__name__)
+
+
+class AdminAddressesCache:
+    """
+    In-memory list of the admin addresses that get order notifications.
+
+    Changing the addresses bumps a version key in Redis. Every process (web workers and the
+    outbox worker) reads the key at most once per version_check_seconds and reloads the list
+    when it has changed, other reads are served from memory. Without Redis the list is
+    reloaded after ttl seconds.
+    """
+    version_key = "admin_addresses:version"
+    ttl = settings.admin_addresses_cache_seconds
+    version_check_seconds = 5
+
+    def __init__(self):
+        self._addresses: list[str] | None = None
+        self._version: bytes | None = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._client = None
+
+    def _redis(self):
+        if self._client is None:
+            self._client = get_redis()
+        return self._client
+
+    def _current_version(self) -> bytes | None:
+        redis_client = self._redis()
+        if not redis_client:
+            return None
+        try:
+            return redis_client.get(self.version_key)
+        except Exception as e:
+            logger.error(f"Version of the admin addresses was not read: {str(e)}")
+            return None
+
+    def get(self, db: Session) -> list[str]:
+        now = time.monotonic()
+        if self._addresses is not None and now - self._checked_at < self.version_check_seconds:
+            return self._addresses
+
+        version = self._current_version()
+        self._checked_at = now
+
+        expired = now - self._loaded_at > self.ttl
+        if self._addresses is None or expired or version != self._version:
+            self._addresses = [
+                address for (address,) in
+                db.query(EmailAddress.address).filter(EmailAddress.is_send_message == True).all()
+            ]
+            self._version = version
+            self._loaded_at = now
+            logger.info(f"Loaded {len(self._addresses)} admin addresses for notifications")
+
+        return self._addresses
+
+    def invalidate(self) -> None:
+        self._addresses = None
+
+        redis_client = self._redis()
+        if redis_client:
+            redis_client.set(self.version_key, uuid.uuid4().hex)
+
+
+admin_addresses_cache = AdminAddressesCache()
@@ -0,0 +1,84 @@
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from src.database.models import Image, Price, Product, User
+from src.repository import basket_items as repository_basket_items
+from src.repository import images as repository_images
+from src.repository import prices as repository_prices
+from src.schemas.basket_items import BasketItemsResponse, BasketItemsWithTotalResponse
+from src.schemas.images import ImageResponse
+from src.schemas.product import ProductResponse
+from src.services.cloud_image import CloudImage
+
+
+def product_response_for_basket(product: Product, selected_price: Price, image: Optional[Image]) -> ProductResponse:
+    """The product of a basket line, with its main image and the price chosen by the user only"""
+    images = []
+    if image:
+        images.append(ImageResponse(id=image.id,
+                                    product_id=image.product_id,
+                                    image_url=CloudImage.get_transformation_image(image.image_url, "product"),
+                                    description=image.description,
+                                    image_type=image.image_type,
+                                    main_image=image.main_image,
+                                    srcset=image.srcset))
+
+    return ProductResponse(id=product.id,
+                           name=product.name,
+                           description=product.description,
+                           product_category_id=product.product_category_id,
+                           new_product=product.new_product,
+                           is_popular=product.is_popular,
+                           is_favorite=product.is_favorite,
+                           product_status=product.product_status,
+                           sub_categories=product.subcategories,
+                           images=images,
+                           prices=[selected_price],
+                           rating_count=product.rating_count,
+                           rating_average=product.rating_average,
+                           rating_histogram=product.rating_histogram)
+
+
+async def basket_products(
+        product_price_ids: List[tuple[int, int]], db: Session
+) -> dict[tuple[int, int], ProductResponse]:
+    """Products of basket lines by (product_id, price_id), in a fixed number of queries"""
+    if not product_price_ids:
+        return {}
+
+    prices = await repository_prices.active_prices_by_product_price_ids(product_price_ids, db)
+    main_images = await repository_images.main_images_by_product_ids([pair[0] for pair in prices], db)
+
+    return {
+        pair: product_response_for_basket(price.product, price, main_images.get(price.product_id))
+        for pair, price in prices.items()
+    }
+
+
+async def basket_with_total(current_user: User, db: Session) -> BasketItemsWithTotalResponse:
+    """
+    The basket of the user with the subtotals of the lines and the total price,
+    three queries for any number of lines.
+    """
+    lines = await repository_basket_items.basket_lines(current_user, db)
+    if any(price is None for _, _, price, _, _ in lines):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid price_id_by_the_user")
+
+    main_images = await repository_images.main_images_by_product_ids(
+        [product.id for _, product, _, _, _ in lines], db
+    ) if lines else {}
+
+    basket_items = [
+        BasketItemsResponse(id=item.id,
+                            basket_id=item.basket_id,
+                            product=product_response_for_basket(product, price, main_images.get(product.id)),
+                            quantity=item.quantity,
+                            price_id_by_the_user=item.price_id_by_the_user,
+                            subtotal=round(subtotal, 2))
+        for item, product, price, subtotal, _ in lines
+    ]
+    total_price = lines[0].total if lines else 0
+
+    return BasketItemsWithTotalResponse(basket_items=basket_items, total_price=round(total_price, 2))
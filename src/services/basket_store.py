@@ -0,0 +1,323 @@
+import json
+import logging
+import pickle
+from datetime import timedelta
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.caching import get_redis
+from src.database.models import User
+from src.repository import basket_items as repository_basket_items
+from src.repository import baskets as repository_baskets
+from src.schemas.product import ProductResponse
+from src.services.basket_items import basket_products
+
+logger = logging.getLogger(__name__)
+
+# KEYS: basket hash, dirty set. ARGV: ttl seconds, basket id, JSON [[product_id, price_id, quantity, new item id], ...].
+# Returns item id, line pairs of the changed lines, or nil when the basket has to be read again: it is not
+# loaded, or the line of a pair without a new item id was removed since it was read.
+ADD_LINES_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], 'loaded') == 0 then return false end
+
+local item_ids = {}
+local stored = redis.call('HGETALL', KEYS[1])
+for i = 1, #stored, 2 do
+    if stored[i] ~= 'loaded' then
+        local line = cjson.decode(stored[i + 1])
+        item_ids[line.product_id .. ':' .. line.price_id] = stored[i]
+    end
+end
+
+local additions = cjson.decode(ARGV[3])
+for _, addition in ipairs(additions) do
+    if not item_ids[addition[1] .. ':' .. addition[2]] and addition[4] == cjson.null then return false end
+end
+
+local changed = {}
+for _, addition in ipairs(additions) do
+    local item_id = item_ids[addition[1] .. ':' .. addition[2]]
+    local line
+    if item_id then
+        line = cjson.decode(redis.call('HGET', KEYS[1], item_id))
+    else
+        item_id = addition[4]
+        line = {product_id = addition[1], price_id = addition[2], quantity = 0}
+    end
+    line.quantity = line.quantity + addition[3]
+    line = cjson.encode(line)
+    redis.call('HSET', KEYS[1], item_id, line)
+    table.insert(changed, item_id)
+    table.insert(changed, line)
+end
+
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('SADD', KEYS[2], ARGV[2])
+return changed
+"""
+
+# KEYS: basket hash, dirty set. ARGV: item id, quantity, ttl seconds, basket id. Returns the line or nil.
+SET_QUANTITY_SCRIPT = """
+local line = redis.call('HGET', KEYS[1], ARGV[1])
+if not line then return false end
+
+line = cjson.decode(line)
+line.quantity = tonumber(ARGV[2])
+line = cjson.encode(line)
+redis.call('HSET', KEYS[1], ARGV[1], line)
+
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('SADD', KEYS[2], ARGV[4])
+return line
+"""
+
+
+class BasketStore:
+    """
+    Baskets of users kept in Redis, enabled with basket_store_enabled.
+
+    Every basket is a hash basket:<basket_id> of item id -> line. Changed baskets are
+    collected in the baskets:dirty set and written to basket_items in batches by
+    the scheduler (write-behind), a basket is also written right before checkout.
+
+    Lines are changed by Lua scripts, so concurrent requests to one basket never overwrite
+    each other's quantities. The baskets live in their own Redis database (basket_redis_db),
+    so flushing the response cache does not lose them. Products of the lines come from the catalog
+    cache in the cache database, which is flushed whenever the catalog changes.
+    """
+    enabled = settings.basket_store_enabled
+    ttl = timedelta(days=settings.basket_store_ttl_days)
+    flush_batch_size = settings.basket_flush_batch_size
+    catalog_ttl = 1800
+
+    dirty_key = "baskets:dirty"
+    # a hash always holds this field once the basket is loaded, so an empty basket is not loaded again
+    loaded_field = "loaded"
+    # attempts of add_lines when lines it read were removed before it wrote
+    add_attempts = 3
+
+    def __init__(self):
+        self._client = None
+        self._add_lines_script = None
+        self._set_quantity_script = None
+
+    def _redis(self):
+        """One client with its connection pool for the worker, created on the first use"""
+        if self._client is None:
+            redis_client = get_redis(settings.basket_redis_db)
+            if not redis_client:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="The basket is temporarily unavailable"
+                )
+            self._add_lines_script = redis_client.register_script(ADD_LINES_SCRIPT)
+            self._set_quantity_script = redis_client.register_script(SET_QUANTITY_SCRIPT)
+            self._client = redis_client
+        return self._client
+
+    @property
+    def _ttl_seconds(self) -> int:
+        return int(self.ttl.total_seconds())
+
+    @staticmethod
+    def _key(basket_id: int) -> str:
+        return f"basket:{basket_id}"
+
+    def _lines(self, basket_id: int, stored: dict) -> list[dict]:
+        lines = [
+            {"id": int(item_id), "basket_id": basket_id, **json.loads(line)}
+            for item_id, line in stored.items() if item_id.decode() != self.loaded_field
+        ]
+        return sorted(lines, key=lambda line: line["id"])
+
+    async def basket_id(self, user: User, db: Session) -> int | None:
+        redis_client = self._redis()
+        key = f"basket_user:{user.id}"
+
+        basket_id = redis_client.get(key)
+        if basket_id:
+            return int(basket_id)
+
+        basket = await repository_baskets.baskets(user, db)
+        if not basket:
+            return None
+
+        redis_client.set(key, basket.id, ex=self.ttl)
+        return basket.id
+
+    async def lines(self, basket_id: int, db: Session) -> list[dict]:
+        """Lines of the basket, it is loaded from basket_items the first time"""
+        redis_client = self._redis()
+        key = self._key(basket_id)
+
+        stored = redis_client.hgetall(key)
+        if not stored:
+            basket_items = await repository_basket_items.basket_items_by_basket_id(basket_id, db)
+            stored = {
+                str(item.id): json.dumps({
+                    "product_id": item.product_id,
+                    "price_id": item.price_id_by_the_user,
+                    "quantity": item.quantity,
+                })
+                for item in basket_items
+            }
+            # a concurrent request may have loaded it already, fields it wrote win
+            pipeline = redis_client.pipeline()
+            for item_id, line in stored.items():
+                pipeline.hsetnx(key, item_id, line)
+            pipeline.hset(key, self.loaded_field, 1)
+            pipeline.expire(key, self.ttl)
+            pipeline.hgetall(key)
+            stored = pipeline.execute()[-1]
+
+        return self._lines(basket_id, stored)
+
+    async def add(self, basket_id: int, product_id: int, price_id: int, quantity: int, db: Session) -> dict:
+        """Add the quantity to the line of the same product and price, or start a new line"""
+        lines = await self.add_lines(basket_id, {(product_id, price_id): quantity}, db)
+        return lines[(product_id, price_id)]
+
+    async def add_lines(
+            self, basket_id: int, quantities: dict[tuple[int, int], int], db: Session
+    ) -> dict[tuple[int, int], dict]:
+        """Add the quantities of several (product_id, price_id) lines with one write, returns the changed lines"""
+        self._redis()
+
+        for _ in range(self.add_attempts):
+            pairs = {(line["product_id"], line["price_id"]) for line in await self.lines(basket_id, db)}
+
+            # ids for the lines that are not in the basket yet, the script adds to a line of the same
+            # pair instead when a concurrent request has started it in the meantime
+            new_pairs = [pair for pair in quantities if pair not in pairs]
+            new_ids = dict(zip(new_pairs, await repository_basket_items.next_basket_item_ids(len(new_pairs), db)))
+            additions = [
+                [*pair, quantity, str(new_ids[pair]) if pair in new_ids else None]
+                for pair, quantity in quantities.items()
+            ]
+
+            changed = self._add_lines_script(
+                keys=[self._key(basket_id), self.dirty_key],
+                args=[self._ttl_seconds, basket_id, json.dumps(additions)],
+            )
+            if changed is not None:
+                lines = [
+                    {"id": int(item_id), "basket_id": basket_id, **json.loads(line)}
+                    for item_id, line in zip(changed[::2], changed[1::2])
+                ]
+                return {(line["product_id"], line["price_id"]): line for line in lines}
+
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="The basket was changed by another request, try again"
+        )
+
+    async def set_quantity(self, basket_id: int, item_id: int, quantity: int, db: Session) -> dict | None:
+        self._redis()
+        await self.lines(basket_id, db)
+
+        line = self._set_quantity_script(
+            keys=[self._key(basket_id), self.dirty_key],
+            args=[item_id, quantity, self._ttl_seconds, basket_id],
+        )
+        if line is None:
+            return None
+        return {"id": item_id, "basket_id": basket_id, **json.loads(line)}
+
+    async def remove(self, basket_id: int, item_id: int, db: Session) -> bool:
+        redis_client = self._redis()
+        await self.lines(basket_id, db)
+
+        pipeline = redis_client.pipeline()
+        pipeline.hdel(self._key(basket_id), item_id)
+        pipeline.sadd(self.dirty_key, basket_id)
+        removed, _ = pipeline.execute()
+        return bool(removed)
+
+    def clear(self, basket_id: int) -> None:
+        """
+        Empty the basket after checkout.
+
+        The basket stays loaded and dirty, so a flush that read it before checkout and
+        wrote old lines back is corrected by the next one.
+        """
+        redis_client = self._redis()
+        key = self._key(basket_id)
+
+        pipeline = redis_client.pipeline()
+        pipeline.delete(key)
+        pipeline.hset(key, self.loaded_field, 1)
+        pipeline.expire(key, self.ttl)
+        pipeline.sadd(self.dirty_key, basket_id)
+        pipeline.execute()
+
+    async def flush(self, db: Session, basket_ids: list[int] = None) -> int:
+        """Write changed baskets to basket_items, returns the number of written baskets"""
+        redis_client = self._redis()
+
+        if basket_ids is None:
+            basket_ids = [int(basket_id) for basket_id in redis_client.spop(self.dirty_key, self.flush_batch_size)]
+        if not basket_ids:
+            return 0
+
+        try:
+            # the lines are read under the lock, so of two concurrent writes of a basket (the scheduler
+            # of another worker and a checkout) the one that commits last also has the newest lines
+            await repository_baskets.lock_baskets(basket_ids, db)
+
+            pipeline = redis_client.pipeline()
+            for basket_id in basket_ids:
+                pipeline.hgetall(self._key(basket_id))
+
+            # an expired basket was written before, basket_items already has it
+            baskets = {
+                basket_id: self._lines(basket_id, stored)
+                for basket_id, stored in zip(basket_ids, pipeline.execute()) if stored
+            }
+
+            await repository_basket_items.replace_basket_items(baskets, db)
+        except Exception:
+            db.rollback()
+            redis_client.sadd(self.dirty_key, *basket_ids)
+            raise
+
+        logger.info(f"Flushed {len(baskets)} baskets to the database")
+        return len(baskets)
+
+    async def flush_basket(self, basket_id: int, db: Session) -> None:
+        """
+        Write the current lines of the basket before checkout. It is written even when it is not
+        in the dirty set, the scheduler of another worker may have taken it and not written it yet.
+        """
+        redis_client = self._redis()
+        redis_client.srem(self.dirty_key, basket_id)
+        await self.flush(db, [basket_id])
+
+    @staticmethod
+    def _catalog_key(product_id: int, price_id: int) -> str:
+        return f"basket_catalog:{product_id}:{price_id}"
+
+    async def catalog(self, pairs: list[tuple[int, int]], db: Session) -> dict[tuple[int, int], ProductResponse]:
+        """
+        Products with the chosen price of (product_id, price_id) pairs from the catalog cache,
+        the missing products are loaded together and cached.
+        """
+        cache_client = get_redis()
+        keys = [self._catalog_key(*pair) for pair in pairs]
+        cached = cache_client.mget(keys) if cache_client and keys else [None] * len(keys)
+
+        products = {pair: pickle.loads(value) for pair, value in zip(pairs, cached) if value}
+
+        missing = [pair for pair in pairs if pair not in products]
+        loaded = await basket_products(missing, db)
+        products.update(loaded)
+
+        if cache_client and loaded:
+            pipeline = cache_client.pipeline()
+            for pair, product in loaded.items():
+                pipeline.set(self._catalog_key(*pair), pickle.dumps(product), ex=self.catalog_ttl)
+            pipeline.execute()
+
+        return products
+
+
+basket_store = BasketStore()
@@ -35,7 +35,11 @@ class CloudImage:
 
     @staticmethod
     def get_transformation_image(public_id: str, transformation: str):
-        public_id = re.search(r'(?<=/v\d/).+', public_id).group(0)
+        cloudinary_public_id = re.search(r'(?<=/v\d/).+', public_id)
+        if not cloudinary_public_id:
+            # images of the local storage are served as they were uploaded
+            return public_id
+        public_id = cloudinary_public_id.group(0)
         if transformation in Transformation.name.keys():
             transformation_image_url = cloudinary.utils.cloudinary_url(public_id,
                                                                        transformation=[
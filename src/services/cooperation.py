@@ -1,11 +1,10 @@
 import logging
 
-from fastapi_mail import FastMail, MessageSchema, MessageType
 from pydantic import EmailStr
 from typing import Optional
 
 from src.conf.config import settings
-from src.services.email import conf
+from src.services.email import mail_service
 
 logger = logging.getLogger(__name__)
 
@@ -13,9 +12,6 @@ email_owner = settings.email_recipients
 
 
 class EmailService:
-    def __init__(self):
-        self.mail = FastMail(conf)
-
     async def send_email(
         self,
         name: str,
@@ -30,13 +26,13 @@ class EmailService:
                 "phone_number": phone_number,
                 "message": message,
             }
-            message_schema = MessageSchema(
+            message_schema = mail_service.message(
                 subject=f"Нове повідомлення від {name}",
                 recipients=[email_owner],
-                template_body=template_data,
-                subtype=MessageType.html
+                template_name="email_cooperation.html",
+                data=template_data,
             )
-            await self.mail.send_message(message_schema, template_name="email_cooperation.html")
+            await mail_service.send(message_schema)
             logger.info(f"Email sent successfully from {name}")
         except Exception as e:
             logger.error(f"Error sending email from {name}: {str(e)}")
@@ -0,0 +1,37 @@
+import base64
+import binascii
+import enum
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, status
+
+
+def _encode_value(value):
+    if isinstance(value, enum.Enum):
+        return value.name
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _decode_value(value, value_type):
+    if isinstance(value_type, type) and issubclass(value_type, enum.Enum):
+        return value_type[value]
+    if value_type is datetime:
+        return datetime.fromisoformat(value)
+    return value_type(value)
+
+
+def encode_cursor(*sort_key) -> str:
+    """Opaque keyset cursor with the sort key of the last row on the page, enums are stored by name"""
+    return base64.urlsafe_b64encode(json.dumps([_encode_value(value) for value in sort_key]).encode()).decode()
+
+
+def decode_cursor(cursor: str, *value_types) -> tuple:
+    """The sort key of the cursor, its values converted to value_types: enum classes, datetime or int"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return tuple(_decode_value(value, value_type) for value, value_type in zip(values, value_types, strict=True))
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
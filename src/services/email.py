@@ -1,7 +1,13 @@
+import time
+from collections import defaultdict
+from email.message import Message
 from pathlib import Path
+from typing import Any, Mapping, Optional
 
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
 from fastapi_mail.errors import ConnectionErrors
+from fastapi_mail.msg import MailMsg
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from pydantic import EmailStr
 
 from src.services.auth import auth_service
@@ -22,18 +28,88 @@ conf = ConnectionConfig(
 )
 
 
+class MailService:
+    """
+    Renders and sends all emails of the shop.
+
+    The templates are compiled once when the service is created and kept by one Jinja
+    Environment, the compiled bytecode is also cached on disk for the next start.
+    Every render is timed per template, see render_timings.
+    """
+
+    def __init__(self, config: ConnectionConfig):
+        self.config = config
+        self.mail = FastMail(config)
+        self.env = Environment(
+            loader=FileSystemLoader(config.TEMPLATE_FOLDER),
+            bytecode_cache=FileSystemBytecodeCache(),
+        )
+        self.templates = {name: self.env.get_template(name) for name in self.env.list_templates(extensions=["html"])}
+        self._timings = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0})
+
+    def render(self, template_name: str, data: Mapping[str, Any]) -> str:
+        started = time.perf_counter()
+        html = self.templates[template_name].render(data)
+        elapsed = time.perf_counter() - started
+
+        timing = self._timings[template_name]
+        timing["count"] += 1
+        timing["total"] += elapsed
+        timing["max"] = max(timing["max"], elapsed)
+
+        return html
+
+    def render_timings(self) -> dict[str, dict]:
+        """Number of renders, average and slowest render in milliseconds per template"""
+        return {
+            template_name: {
+                "count": timing["count"],
+                "avg_ms": round(timing["total"] / timing["count"] * 1000, 3),
+                "max_ms": round(timing["max"] * 1000, 3),
+            }
+            for template_name, timing in self._timings.items()
+        }
+
+    def message(
+            self,
+            subject: str,
+            recipients: list,
+            template_name: str,
+            data: Mapping[str, Any],
+            bcc: Optional[list] = None,
+    ) -> MessageSchema:
+        return MessageSchema(
+            subject=subject,
+            recipients=recipients,
+            bcc=bcc or [],
+            body=self.render(template_name, data),
+            subtype=MessageType.html
+        )
+
+    async def send(self, message: MessageSchema) -> None:
+        await self.mail.send_message(message)
+
+    async def build(self, message: MessageSchema) -> Message:
+        """The MIME message as FastMail would send it, to send it over an already open connection"""
+        sender = f"{self.config.MAIL_FROM_NAME} <{self.config.MAIL_FROM}>" \
+            if self.config.MAIL_FROM_NAME else self.config.MAIL_FROM
+        return await MailMsg(message)._message(sender)
+
+
+mail_service = MailService(conf)
+
+
 async def send_email(email: EmailStr, username: str, host: str):
     try:
         token_verification = await auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
+        message = mail_service.message(
             subject="Confirm your email ",
             recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
+            template_name="email_template.html",
+            data={"host": host, "username": username, "token": token_verification},
         )
 
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
+        await mail_service.send(message)
     except ConnectionErrors as err:
         print(err)
 
@@ -41,14 +117,13 @@ async def send_email(email: EmailStr, username: str, host: str):
 async def send_reset_email(email: EmailStr, host: str):
     try:
         token_reset_password = await auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
+        message = mail_service.message(
             subject="Password recovery",
             recipients=[email],
-            template_body={"host": host, "token": token_reset_password},
-            subtype=MessageType.html
+            template_name="reset_password_template.html",
+            data={"host": host, "token": token_reset_password},
         )
 
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="reset_password_template.html")
+        await mail_service.send(message)
     except ConnectionErrors as err:
         print(err)
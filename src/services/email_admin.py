@@ -1,37 +1,31 @@
-import logging
-from typing import Optional
+from fastapi_mail import MessageSchema
 
-from fastapi_mail import FastMail, MessageSchema, MessageType
-from pydantic import EmailStr
-
-from src.services.email import conf
-
-logger = logging.getLogger(__name__)
+from src.database.models import Order
+from src.services.email import conf, mail_service
 
 
 class EmailService:
-    def __init__(self):
-        self.mail = FastMail(conf)
-
-    async def send_admin_email(self, email: EmailStr, order_id: int, message: Optional[str]):
-        try:
-            template_data = {
-                "email": email,
-                "order_id": order_id,
-                "message": message
-            }
-
-            message_schema = MessageSchema(
-                subject="Notification about the created order",
-                recipients=[email],
-                template_body=template_data,
-                subtype=MessageType.html
-            )
-            await self.mail.send_message(message_schema, template_name="email_admin.html")
-            logger.info("Email sent successfully from the Sushka Shop")
-        except Exception as e:
-            logger.error(f"Error sending email from the Sushka Shop: {str(e)}")
-            raise e
+    digest_template_name = "email_admin_digest.html"
+
+    @staticmethod
+    def admin_digest_message(emails: list[str], orders: list[Order]) -> MessageSchema:
+        """One message about several new orders, several admins get it as BCC of one message"""
+        template_data = {
+            "orders": [{"order_id": order.id, "message": order.comment} for order in orders]
+        }
+
+        if len(emails) == 1:
+            recipients, bcc = emails, []
+        else:
+            recipients, bcc = [conf.MAIL_FROM], emails
+
+        return mail_service.message(
+            subject=f"Notification about the created orders ({len(orders)})",
+            recipients=recipients,
+            bcc=bcc,
+            template_name=EmailService.digest_template_name,
+            data=template_data,
+        )
 
 
 email_admin_service = EmailService()
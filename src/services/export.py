@@ -0,0 +1,56 @@
+import csv
+import enum
+import io
+from datetime import datetime
+from typing import Iterator
+
+from sqlalchemy import Select
+
+from src.database.db import DBSession
+
+EXPORT_CHUNK_SIZE = 1000
+# a cell starting with one of these is run as a formula by Excel and LibreOffice
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # names, addresses and comments come from the customers, the quote makes the cell plain text
+        return "'" + value
+    return value
+
+
+def stream_csv(query: Select, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Stream the rows of the query as CSV, one chunk per batch of rows.
+
+    The rows are read through a server-side cursor, so memory does not grow with the row count.
+    The generator owns its session: the request session is closed before a streamed body is sent.
+    """
+    db = DBSession()
+    try:
+        result = db.execute(query.execution_options(yield_per=chunk_size))
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        # BOM, so Excel opens the Cyrillic text correctly
+        buffer.write("\ufeff")
+        writer.writerow(result.keys())
+
+        for rows in result.partitions():
+            writer.writerows([_csv_value(value) for value in row] for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
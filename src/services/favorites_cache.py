@@ -0,0 +1,65 @@
+import pickle
+from typing import Iterable, List
+
+from src.database.caching import get_redis
+from src.schemas.favorite_items import FavoriteItemsResponse
+
+
+class FavoritesCache:
+    """
+    Wishlists of users cached in Redis.
+
+    Adding or removing a favorite deletes the wishlist of that user only. Next to every
+    cached wishlist the user id is added to a set per product of the wishlist, so a change
+    of a product deletes just the wishlists that show it.
+    """
+    ttl = 1800
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"favorite_items_current_user_id:{user_id}"
+
+    @staticmethod
+    def _product_key(product_id: int) -> str:
+        return f"favorite_items_product:{product_id}"
+
+    def get(self, user_id: int) -> List[FavoriteItemsResponse] | None:
+        redis_client = get_redis()
+        cached = redis_client.get(self._key(user_id)) if redis_client else None
+        return pickle.loads(cached) if cached else None
+
+    def set(self, user_id: int, items: List[FavoriteItemsResponse]) -> None:
+        redis_client = get_redis()
+        if not redis_client:
+            return
+
+        pipeline = redis_client.pipeline()
+        pipeline.set(self._key(user_id), pickle.dumps(items), ex=self.ttl)
+        for item in items:
+            # the set lives as long as the newest wishlist that points to it
+            pipeline.sadd(self._product_key(item.product.id), user_id)
+            pipeline.expire(self._product_key(item.product.id), self.ttl)
+        pipeline.execute()
+
+    def invalidate_user(self, user_id: int) -> None:
+        redis_client = get_redis()
+        if redis_client:
+            redis_client.delete(self._key(user_id))
+
+    def invalidate_products(self, product_ids: Iterable[int]) -> None:
+        """Delete the cached wishlists that contain any of the products"""
+        product_keys = [self._product_key(product_id) for product_id in set(product_ids)]
+        redis_client = get_redis()
+        if not redis_client or not product_keys:
+            return
+
+        user_ids = redis_client.sunion(product_keys)
+
+        pipeline = redis_client.pipeline()
+        if user_ids:
+            pipeline.delete(*[self._key(int(user_id)) for user_id in user_ids])
+        pipeline.delete(*product_keys)
+        pipeline.execute()
+
+
+favorites_cache = FavoritesCache()
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Awaitable, Callable
+
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.caching import get_redis
+from src.database.db import DBSession
+from src.repository import idempotency_keys as repository_idempotency_keys
+
+logger = logging.getLogger(__name__)
+
+
+def request_fingerprint(body: Any) -> str:
+    """Hash of the request body, the same for equal bodies whatever the order of their fields"""
+    encoded = json.dumps(jsonable_encoder(body), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class IdempotencyService:
+    """
+    Runs a request handler at most once per Idempotency-Key.
+
+    The first attempt takes the key, repeats wait for it to finish and get its stored response.
+    The key is bound to the fingerprint of the first request body, a repeat with another body
+    is rejected with 422 instead of getting the response of a different request.
+    Keys live in Redis, the idempotency_keys table is used when Redis is not available.
+    """
+    poll_interval = 0.2
+    wait_seconds = settings.idempotency_wait_seconds
+    lock_ttl = settings.idempotency_wait_seconds * 2
+    ttl = timedelta(hours=settings.idempotency_key_ttl_hours)
+
+    async def run(
+            self,
+            scope: str,
+            key: str | None,
+            handler: Callable[[], Awaitable[Any]],
+            status_code: int,
+            fingerprint: str,
+    ) -> Any:
+        if not key:
+            return await handler()
+
+        key = f"idempotency:{scope}:{key}"
+
+        redis_client = get_redis()
+        if redis_client:
+            return await self._run_with_redis(redis_client, key, fingerprint, handler, status_code)
+
+        db = DBSession()
+        try:
+            return await self._run_with_db(db, key, fingerprint, handler, status_code)
+        finally:
+            db.close()
+
+    async def _run_with_redis(self, redis_client, key: str, fingerprint: str, handler, status_code: int) -> Any:
+        deadline = time.monotonic() + self.wait_seconds
+        in_progress = json.dumps({"fingerprint": fingerprint})
+
+        while not redis_client.set(key, in_progress, nx=True, ex=self.lock_ttl):
+            stored = redis_client.get(key)
+            if stored:
+                stored = json.loads(stored)
+                self._check_fingerprint(stored.get("fingerprint"), fingerprint)
+                if stored.get("status_code") is not None:
+                    return self._replay(stored["status_code"], stored["content"])
+            await self._wait(deadline)
+
+        try:
+            response = await handler()
+        except Exception:
+            redis_client.delete(key)
+            raise
+
+        content = self._serialize(response)
+        if content is None:
+            redis_client.delete(key)
+        else:
+            stored = json.dumps({"fingerprint": fingerprint, "status_code": status_code, "content": content})
+            redis_client.set(key, stored, ex=self.ttl)
+
+        return response
+
+    async def _run_with_db(self, db: Session, key: str, fingerprint: str, handler, status_code: int) -> Any:
+        deadline = time.monotonic() + self.wait_seconds
+
+        while not await repository_idempotency_keys.add_idempotency_key(key, fingerprint, db):
+            stored = await repository_idempotency_keys.get_idempotency_key(key, db)
+            if stored:
+                self._check_fingerprint(stored.fingerprint, fingerprint)
+                if stored.status_code is not None:
+                    return self._replay(stored.status_code, json.loads(stored.response))
+            await repository_idempotency_keys.delete_stale_idempotency_key(
+                key, timedelta(seconds=self.lock_ttl), db
+            )
+            await self._wait(deadline)
+
+        try:
+            response = await handler()
+        except Exception:
+            await repository_idempotency_keys.delete_idempotency_key(key, db)
+            raise
+
+        content = self._serialize(response)
+        if content is None:
+            await repository_idempotency_keys.delete_idempotency_key(key, db)
+        else:
+            await repository_idempotency_keys.complete_idempotency_key(key, status_code, json.dumps(content), db)
+
+        return response
+
+    @staticmethod
+    def _check_fingerprint(stored: str | None, fingerprint: str) -> None:
+        if stored != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="This Idempotency-Key was already used with a different request body"
+            )
+
+    async def _wait(self, deadline: float) -> None:
+        if time.monotonic() > deadline:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still in progress"
+            )
+        await asyncio.sleep(self.poll_interval)
+
+    @staticmethod
+    def _serialize(response: Any) -> Any | None:
+        """Only successful results are stored, ready-made responses are errors and may be retried"""
+        if isinstance(response, Response):
+            return None
+        return jsonable_encoder(response)
+
+    @staticmethod
+    def _replay(status_code: int, content: Any) -> JSONResponse:
+        logger.info("Replayed the stored response of an idempotent request")
+        return JSONResponse(status_code=status_code, content=content, headers={"Idempotent-Replayed": "true"})
+
+
+idempotency_service = IdempotencyService()
@@ -0,0 +1,203 @@
+import abc
+import asyncio
+import hashlib
+import io
+import logging
+import mimetypes
+import multiprocessing
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import BinaryIO
+
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.repository import images as repository_images
+from src.schemas.images import UploadedImage
+from src.services.cloud_image import CloudImage
+from src.services.image_variants import VARIANT_FORMATS, render_variants
+
+logger = logging.getLogger(__name__)
+
+
+class ImageStorage(abc.ABC):
+    """
+    Where uploaded images are kept.
+
+    save is blocking, it reads the file in chunks and returns the url of the stored image,
+    ImageUploader runs it in the thread pool.
+    """
+
+    @abc.abstractmethod
+    def save(self, file: BinaryIO, public_id: str, content_type: str) -> str:
+        ...
+
+
+class CloudinaryStorage(ImageStorage):
+
+    def save(self, file: BinaryIO, public_id: str, content_type: str) -> str:
+        CloudImage.upload(file, public_id, overwrite=False)
+        return CloudImage.get_url_for_image(public_id)
+
+
+class LocalStorage(ImageStorage):
+    """Images on the local disk served by the app under url_prefix, for development and tests without Cloudinary"""
+
+    def __init__(self, directory: str, url_prefix: str):
+        self.directory = Path(directory)
+        self.url_prefix = url_prefix.rstrip("/")
+
+    def save(self, file: BinaryIO, public_id: str, content_type: str) -> str:
+        name = f"{public_id}{mimetypes.guess_extension(content_type) or ''}"
+        path = self.directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(path, "wb") as destination:
+            shutil.copyfileobj(file, destination, length=1024 * 1024)
+
+        return f"{self.url_prefix}/{name}"
+
+
+class ImageUploader:
+    """
+    Uploads images without blocking the event loop.
+
+    Every uploaded file is identified by the sha256 of its content, a file that is already
+    stored is not processed or uploaded again, its image reuses the stored files. A new file is
+    resized to the responsive variants of image_variants in a process pool, then the original
+    and the variants are saved by the storage in the thread pool, the files of all requests are
+    saved at the same time up to concurrency.
+
+    The files are read into memory for hashing and resizing, so their size is limited by max_megabytes.
+    """
+
+    def __init__(self, storage: ImageStorage, concurrency: int, max_files: int, process_workers: int,
+                 max_megabytes: int):
+        self.storage = storage
+        self.max_files = max_files
+        self.process_workers = process_workers
+        self.max_bytes = max_megabytes * 1024 * 1024
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._executor = None
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        # spawned workers import image_variants only, not the app with its connections
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.process_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @staticmethod
+    def _check(image_file: UploadFile) -> None:
+        if not (image_file.content_type or "").startswith("image/"):
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f"{image_file.filename} is not an image"
+            )
+
+    async def _read(self, image_file: UploadFile) -> bytes:
+        data = await image_file.read(self.max_bytes + 1)
+        if len(data) > self.max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"{image_file.filename} is larger than {self.max_bytes // (1024 * 1024)} MB"
+            )
+        return data
+
+    async def _render(self, image_file: UploadFile, data: bytes) -> list[tuple[int, str, bytes]]:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._process_pool(), render_variants, data)
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # a worker died, the next upload starts a new pool
+                self.shutdown()
+            logger.warning(f"Variants of {image_file.filename} were not rendered: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"{image_file.filename} cannot be processed as an image"
+            )
+
+    async def _save(self, data: bytes, public_id: str, content_type: str) -> str:
+        async with self._semaphore:
+            return await run_in_threadpool(self.storage.save, io.BytesIO(data), public_id, content_type)
+
+    async def _store(self, image_file: UploadFile, data: bytes, content_hash: str) -> UploadedImage:
+        """Render the variants of a new file and save them together with the original"""
+        variants = await self._render(image_file, data)
+
+        public_id = f"sushka_store/{content_hash}"
+        image_url, *variant_urls = await asyncio.gather(
+            self._save(data, public_id, image_file.content_type),
+            *(self._save(variant, f"{public_id}_{width}_{image_format}", VARIANT_FORMATS[image_format])
+              for width, image_format, variant in variants)
+        )
+
+        return UploadedImage(
+            image_url=image_url,
+            content_hash=content_hash,
+            variants=[
+                {"width": width, "format": image_format, "url": url}
+                for (width, image_format, _), url in zip(variants, variant_urls)
+            ],
+        )
+
+    async def upload(self, image_file: UploadFile, db: Session) -> UploadedImage:
+        uploaded_images = await self.upload_many([image_file], db)
+        return uploaded_images[0]
+
+    async def upload_many(self, image_files: list[UploadFile], db: Session) -> list[UploadedImage]:
+        """Upload all new files concurrently, the uploaded images are in the order of the files"""
+        if len(image_files) > self.max_files:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"No more than {self.max_files} images can be uploaded at once"
+            )
+        for image_file in image_files:
+            self._check(image_file)
+
+        contents = [await self._read(image_file) for image_file in image_files]
+        content_hashes = [hashlib.sha256(data).hexdigest() for data in contents]
+
+        stored = await repository_images.images_by_content_hashes(content_hashes, db)
+        uploaded = {
+            content_hash: UploadedImage(image_url=image.image_url, content_hash=content_hash,
+                                        variants=image.variants or [])
+            for content_hash, image in stored.items()
+        }
+
+        # the same file sent twice in one request is stored once
+        new_files = {}
+        for image_file, data, content_hash in zip(image_files, contents, content_hashes):
+            if content_hash not in uploaded:
+                new_files.setdefault(content_hash, (image_file, data))
+
+        new_images = await asyncio.gather(
+            *(self._store(image_file, data, content_hash) for content_hash, (image_file, data) in new_files.items())
+        )
+        uploaded.update({image.content_hash: image for image in new_images})
+
+        logger.info(f"Uploaded {len(new_images)} images, {len(image_files) - len(new_images)} were already stored")
+        return [uploaded[content_hash] for content_hash in content_hashes]
+
+
+def _image_storage() -> ImageStorage:
+    if settings.image_storage == "local":
+        return LocalStorage(settings.image_storage_local_dir, settings.image_storage_local_url)
+    return CloudinaryStorage()
+
+
+image_uploader = ImageUploader(_image_storage(),
+                               settings.image_upload_concurrency,
+                               settings.image_upload_max_files,
+                               settings.image_process_workers,
+                               settings.image_max_megabytes)
@@ -0,0 +1,42 @@
+import io
+
+VARIANT_WIDTHS = (320, 640, 960, 1280)
+VARIANT_FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+def _flatten(image, pil_image):
+    """JPEG has no alpha channel, transparent pixels become white"""
+    if image.mode != "RGBA":
+        return image
+    background = pil_image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def render_variants(data: bytes) -> list[tuple[int, str, bytes]]:
+    """
+    Resize the image to every variant width in every variant format, a width above the width
+    of the image is replaced by the image width. Returns (width, format, bytes) of the variants.
+
+    It runs in a worker process of the ImageUploader, Pillow is imported there only.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+    variants = []
+    for width in sorted({min(width, image.width) for width in VARIANT_WIDTHS}):
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+
+        for image_format in VARIANT_FORMATS:
+            output = io.BytesIO()
+            if image_format == "jpeg":
+                _flatten(resized, Image).save(output, "JPEG", quality=82, optimize=True, progressive=True)
+            else:
+                resized.save(output, "WEBP", quality=80, method=4)
+            variants.append((width, image_format, output.getvalue()))
+
+    return variants
@@ -3,7 +3,52 @@ from typing import Optional
 
 NUMBER_REGEX = re.compile(r"№(\d+)")
 
+BRANCH_CATEGORY = "Відділення"
+POSTOMAT_CATEGORY = "Поштомат"
+
 
 def extract_warehouse_number(address: str, regex: re.Pattern) -> Optional[str]:
     match = regex.search(address)
     return match.group(1) if match else ""
+
+
+def category_of_warehouse(address: str) -> str:
+    return POSTOMAT_CATEGORY if "поштомат" in address.lower() else BRANCH_CATEGORY
+
+
+def _coordinate(value) -> Optional[float]:
+    """Coordinates come as strings, 0 or an empty string when the warehouse has none"""
+    try:
+        coordinate = float(value)
+    except (TypeError, ValueError):
+        return None
+    return coordinate or None
+
+
+def warehouse_from_api(item: dict) -> dict:
+    """Columns of a NovaPoshta warehouse from an item of the getWarehouses response"""
+    address_warehouse = item.get("Description", "")
+    return {
+        "warehouse_ref": item.get("Ref"),
+        "address_warehouse": address_warehouse,
+        "warehouse_number": extract_warehouse_number(address_warehouse, NUMBER_REGEX) or None,
+        "category_warehouse": category_of_warehouse(address_warehouse),
+        "city": item.get("SettlementDescription", ""),
+        "area": item.get("SettlementAreaDescription", ""),
+        "region": item.get("SettlementRegionsDescription", ""),
+        "latitude": _coordinate(item.get("Latitude")),
+        "longitude": _coordinate(item.get("Longitude")),
+    }
+
+
+def settlement_from_api(item: dict) -> dict:
+    """Columns of a NovaPoshtaSettlement from an item of the getSettlements response"""
+    return {
+        "settlement_ref": item.get("Ref"),
+        "name": item.get("Description", ""),
+        "name_ru": item.get("DescriptionRu") or None,
+        "settlement_type": item.get("SettlementTypeDescription", ""),
+        "area": item.get("AreaDescription", ""),
+        "region": item.get("RegionsDescription", ""),
+        "has_warehouses": str(item.get("Warehouse", "0")) == "1",
+    }
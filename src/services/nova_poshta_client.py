@@ -0,0 +1,236 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import OrderedDict
+from functools import partial
+
+import httpx
+
+from src.conf.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class NovaPoshtaError(Exception):
+    """The API did not answer after the retries, or answered that the call was not successful"""
+
+
+class CircuitOpenError(NovaPoshtaError):
+    """The API failed too often recently, it is not called until the breaker lets a trial call through"""
+
+
+class TokenBucket:
+    """Lets through rate calls per second on average, with bursts of up to capacity calls"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold failed calls in a row. While it is open the calls fail at once,
+    after reset_seconds one trial call is let through, its success closes the breaker again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        if not self._trial and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._trial = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            logger.info("Nova Poshta API is available again, the circuit is closed")
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._trial or self._failures >= self.failure_threshold:
+            if self._opened_at is None:
+                logger.warning(f"Nova Poshta API failed {self._failures} times in a row, the circuit is open")
+            self._opened_at = time.monotonic()
+            self._trial = False
+
+
+class NovaPoshtaClient:
+    """
+    The only way to the Nova Poshta API.
+
+    All calls share one pooled HTTP client, created in the lifespan of the app, and one rate
+    limit. Responses of the methods in cache_seconds are kept in memory for that long, identical
+    calls that are in flight at the same time share one request. Connection errors, 429 and 5xx
+    are retried with jittered exponential backoff, and after several failed calls in a row the
+    circuit breaker stops calling the API for a while, the callers fall back to local data.
+    """
+    retried_statuses = {429, 500, 502, 503, 504}
+    max_cached = 1000
+
+    def __init__(
+            self,
+            api_url: str,
+            api_key: str,
+            timeout: float,
+            max_connections: int,
+            requests_per_second: float,
+            retries: int,
+            backoff_seconds: float,
+            breaker: CircuitBreaker,
+            cache_seconds: dict[str, int],
+    ):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.requests_per_second = requests_per_second
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.breaker = breaker
+        self.cache_seconds = cache_seconds
+
+        self._client: httpx.AsyncClient | None = None
+        self._bucket: TokenBucket | None = None
+        self._cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    async def start(self) -> None:
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=limits)
+            self._bucket = TokenBucket(self.requests_per_second, self.max_connections)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._cache.clear()
+
+    def _cached(self, key: str) -> dict | None:
+        cached = self._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        return None
+
+    def _store(self, key: str, called_method: str, data: dict) -> None:
+        self._cache[key] = (time.monotonic() + self.cache_seconds[called_method], data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    def _forget(self, key: str, in_flight: asyncio.Future) -> None:
+        self._in_flight.pop(key, None)
+        # every caller may have been cancelled, the error is retrieved here so asyncio does not log it as lost
+        if not in_flight.cancelled():
+            in_flight.exception()
+
+    async def _post(self, payload: dict) -> dict:
+        if not self.breaker.allow():
+            raise CircuitOpenError("Nova Poshta API is unavailable")
+        # scripts and the scheduler may call the API outside of the lifespan of the app
+        await self.start()
+
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, self.backoff_seconds * 2 ** (attempt - 1)))
+
+            await self._bucket.acquire()
+            try:
+                response = await self._client.post(url=self.api_url, json=payload)
+                if response.status_code in self.retried_statuses:
+                    error = NovaPoshtaError(f"Nova Poshta API answered {response.status_code}")
+                    continue
+                response.raise_for_status()
+                data = response.json()
+            except (httpx.TransportError, ValueError) as e:
+                error = e
+                continue
+            except httpx.HTTPStatusError as e:
+                self.breaker.record_success()
+                raise NovaPoshtaError(str(e)) from e
+
+            self.breaker.record_success()
+            if not data.get("success"):
+                raise NovaPoshtaError(f"{payload['calledMethod']} was not successful: {data.get('errors')}")
+            return data
+
+        self.breaker.record_failure()
+        raise NovaPoshtaError(f"Nova Poshta API did not answer: {str(error)}") from error
+
+    async def call(
+            self, model_name: str, called_method: str, method_properties: dict, use_cache: bool = True
+    ) -> dict:
+        """The response of the API method with its data and info, raises NovaPoshtaError when there is none"""
+        payload = {
+            "apiKey": self.api_key,
+            "modelName": model_name,
+            "calledMethod": called_method,
+            "methodProperties": method_properties,
+        }
+        key = json.dumps([model_name, called_method, method_properties], sort_keys=True)
+
+        cacheable = use_cache and called_method in self.cache_seconds
+        if cacheable:
+            cached = self._cached(key)
+            if cached is not None:
+                return cached
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is None:
+            in_flight = asyncio.ensure_future(self._post(payload))
+            self._in_flight[key] = in_flight
+            in_flight.add_done_callback(partial(self._forget, key))
+
+        # a cancelled caller does not cancel the request of the others
+        data = await asyncio.shield(in_flight)
+        if cacheable:
+            self._store(key, called_method, data)
+        return data
+
+
+nova_poshta_client = NovaPoshtaClient(
+    api_url=settings.api_url_nova_poshta,
+    api_key=settings.api_key_nova_poshta,
+    timeout=settings.nova_poshta_timeout_seconds,
+    max_connections=settings.nova_poshta_max_connections,
+    requests_per_second=settings.nova_poshta_requests_per_second,
+    retries=settings.nova_poshta_retries,
+    backoff_seconds=settings.nova_poshta_backoff_seconds,
+    breaker=CircuitBreaker(settings.nova_poshta_breaker_failures, settings.nova_poshta_breaker_reset_seconds),
+    cache_seconds={
+        "getWarehouses": settings.nova_poshta_cache_seconds,
+        "getSettlements": settings.nova_poshta_cache_seconds,
+    },
+)
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import logging
+import math
+import time
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.repository import nova_poshta as repository_novaposhta
+from src.services.nova_poshta import settlement_from_api, warehouse_from_api
+from src.services.nova_poshta_client import CircuitOpenError, NovaPoshtaClient, NovaPoshtaError, nova_poshta_client
+
+logger = logging.getLogger(__name__)
+
+
+class NovaPoshtaSync:
+    """Base of the bulk loads from the Nova Poshta API, up to concurrency calls of a load at a time"""
+
+    def __init__(self, client: NovaPoshtaClient, concurrency: int):
+        self.client = client
+        self.concurrency = concurrency
+
+
+class WarehouseSync(NovaPoshtaSync):
+    """
+    Syncs the warehouses of every city in the database with the Nova Poshta API.
+
+    The cities are fetched concurrently, the warehouses of a city are written with one bulk
+    upsert in one transaction as soon as they arrive. A city that fails is logged and skipped,
+    the others are still synced.
+    """
+
+    async def _fetch(self, settle_ref: str, use_cache: bool) -> list[dict]:
+        data = await self.client.call("Address", "getWarehouses", {"SettlementRef": settle_ref}, use_cache=use_cache)
+        return data.get("data", [])
+
+    async def _sync_city(self, semaphore: asyncio.Semaphore, settle_ref: str, use_cache: bool, db: Session) -> bool:
+        async with semaphore:
+            try:
+                warehouse_data = await self._fetch(settle_ref, use_cache)
+            except CircuitOpenError:
+                return False
+            except NovaPoshtaError as e:
+                logger.error(f"Warehouses of {settle_ref} were not fetched: {str(e)}")
+                return False
+
+        warehouses = [warehouse_from_api(item) for item in warehouse_data if item.get("Ref")]
+        try:
+            await repository_novaposhta.upsert_city_warehouses(settle_ref, warehouses, db)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Warehouses of {settle_ref} were not saved: {str(e)}")
+            return False
+
+        return True
+
+    async def sync_cities(self, settle_refs: list[str], db: Session, use_cache: bool = False) -> int:
+        """
+        Sync the cities, returns the number of synced cities. With use_cache a city fetched
+        recently is taken from the client cache, the full sync always asks the API.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(self._sync_city(semaphore, settle_ref, use_cache, db) for settle_ref in settle_refs)
+        )
+
+        synced = sum(results)
+        logger.info(
+            f"Synced warehouses of {synced} of {len(settle_refs)} cities in {time.perf_counter() - started:.1f} s"
+        )
+        return synced
+
+    async def run(self, db: Session) -> int:
+        """Sync all cities that have warehouses in the database"""
+        settle_refs = await repository_novaposhta.settlement_refs(db)
+        return await self.sync_cities(settle_refs, db)
+
+
+class SettlementSync(NovaPoshtaSync):
+    """
+    Loads the settlement directory of Nova Poshta into nova_poshta_settlements.
+
+    The settlements are read from dump_file when it is set, a saved getSettlements response
+    or a list of its items, otherwise all pages of getSettlements are fetched concurrently.
+    """
+    page_size = 150
+
+    def __init__(self, *args, dump_file: str = "", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dump_file = dump_file
+
+    def _read_dump(self) -> list[dict]:
+        with open(self.dump_file, encoding="utf-8") as file:
+            data = json.load(file)
+        return data.get("data", []) if isinstance(data, dict) else data
+
+    async def _page(self, semaphore: asyncio.Semaphore, page: int) -> dict:
+        async with semaphore:
+            try:
+                return await self.client.call("AddressGeneral", "getSettlements",
+                                              {"Page": str(page), "Limit": str(self.page_size)}, use_cache=False)
+            except NovaPoshtaError as e:
+                # the settlements stay as they were loaded last time
+                logger.error(f"Page {page} of the settlements was not fetched: {str(e)}")
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                    detail="Failed to fetch settlements from Nova Poshta")
+
+    async def _fetch_all(self) -> list[dict]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        first_page = await self._page(semaphore, 1)
+        total_count = int((first_page.get("info") or {}).get("totalCount", 0))
+        pages = await asyncio.gather(
+            *(self._page(semaphore, page) for page in range(2, math.ceil(total_count / self.page_size) + 1))
+        )
+
+        return [item for page in [first_page, *pages] for item in page.get("data", [])]
+
+    async def run(self, db: Session) -> int:
+        """Load all settlements, returns the number of loaded settlements"""
+        started = time.perf_counter()
+        items = await run_in_threadpool(self._read_dump) if self.dump_file else await self._fetch_all()
+
+        # a ref may be repeated on the page boundaries, one INSERT ... ON CONFLICT must not have it twice
+        settlements = {item["Ref"]: settlement_from_api(item) for item in items if item.get("Ref")}
+        await repository_novaposhta.upsert_settlements(list(settlements.values()), db)
+
+        logger.info(f"Loaded {len(settlements)} settlements in {time.perf_counter() - started:.1f} s")
+        return len(settlements)
+
+
+warehouse_sync = WarehouseSync(nova_poshta_client, settings.nova_poshta_sync_concurrency)
+
+settlement_sync = SettlementSync(
+    nova_poshta_client,
+    settings.nova_poshta_sync_concurrency,
+    dump_file=settings.nova_poshta_settlements_file,
+)
@@ -1,43 +1,130 @@
-import logging
+import pickle
 
-from fastapi_mail import FastMail, MessageSchema, MessageType
+from fastapi_mail import MessageSchema
 
-from src.services.email import conf
+from src.conf.config import settings
+from src.database.caching import get_redis
+from src.database.models import Order, PostType
+from src.schemas.orders import OrderEmailModel, OrderedProductEmailModel
+from src.services.email import mail_service
 
-logger = logging.getLogger(__name__)
 
+def _delivery_of_order(order: Order) -> tuple[str, str]:
+    """Delivery mode and address, orders of authenticated users point to a saved post address"""
+    if order.selected_nova_poshta:
+        nova_poshta = order.selected_nova_poshta
+        if nova_poshta.is_delivery:
+            return "Нова Пошта (адресна доставка)", (
+                f"{nova_poshta.city}, "
+                f"{nova_poshta.street}, "
+                f"{nova_poshta.house_number}, "
+                f"кв. {nova_poshta.apartment_number}"
+            )
+        return "Нова Пошта (відділення/поштомат)", f"{nova_poshta.city}, {nova_poshta.address_warehouse}"
 
-class EmailService:
-    def __init__(self):
-        self.mail = FastMail(conf)
-
-    async def send_order_confirmation_email(self, order_data: dict):
-        try:
-            template_data = {
-                "order_id": order_data["order_id"],
-                "total_price": order_data["total_price"],
-                "customer": order_data["customer"],
-                "email_customer": order_data["email_customer"],
-                "phone_number_customer": order_data["phone_number_customer"],
-                "full_name_another_recipient": order_data["full_name_another_recipient"],
-                "phone_number_another_recipient": order_data["phone_number_another_recipient"],
-                "delivery_mode": order_data["delivery_mode"],
-                "address_delivery": order_data["address_delivery"],
-                "payment_mode": order_data["payment_mode"],
-                "ordered_products": order_data["ordered_products"],
-            }
-
-            message_schema = MessageSchema(
-                subject="Order confirmation",
-                recipients=[order_data["email_customer"]],
-                template_body=template_data,
-                subtype=MessageType.html
+    if order.selected_ukr_poshta:
+        ukr_poshta = order.selected_ukr_poshta
+        return "УкрПошта (адресна доставка)", (
+            f"{ukr_poshta.post_code}, "
+            f"{ukr_poshta.city}, "
+            f"{ukr_poshta.street}, "
+            f"{ukr_poshta.house_number}, "
+            f"кв. {ukr_poshta.apartment_number}"
+        )
+
+    if order.post_type == PostType.nova_poshta_warehouse:
+        return "Нова Пошта (відділення)", f"{order.city}, {order.address_warehouse}"
+
+    if order.post_type == PostType.nova_poshta_address:
+        return "Нова Пошта (адресна доставка)", (
+            f"{order.city}, "
+            f"{order.street}, "
+            f"{order.house_number}, "
+            f"кв. {order.apartment_number}"
+        )
+
+    return "УкрПошта (адресна доставка)", (
+        f"{order.post_code}, "
+        f"{order.city}, "
+        f"{order.street}, "
+        f"{order.house_number}, "
+        f"кв. {order.apartment_number}"
+    )
+
+
+def order_email_data(order: Order) -> OrderEmailModel:
+    """Data of the order confirmation, for orders of anonym and authenticated users"""
+    if order.email_anon_user:
+        customer = f"{order.first_name_anon_user} {order.last_name_anon_user}"
+        email_customer = order.email_anon_user
+        phone_number_customer = order.phone_number_anon_user
+    else:
+        customer = f"{order.user.first_name} {order.user.last_name}"
+        email_customer = order.user.email
+        phone_number_customer = order.user.phone_number
+
+    if order.is_another_recipient:
+        recipient_name = order.full_name_another_recipient
+        recipient_phone = order.phone_number_another_recipient
+    else:
+        recipient_name = customer
+        recipient_phone = phone_number_customer
+
+    delivery_mode, address_delivery = _delivery_of_order(order)
+
+    return OrderEmailModel(
+        order_id=order.id,
+        total_price=order.price_order,
+        customer=customer,
+        email_customer=email_customer,
+        phone_number_customer=phone_number_customer,
+        full_name_another_recipient=recipient_name,
+        phone_number_another_recipient=recipient_phone,
+        delivery_mode=delivery_mode,
+        address_delivery=address_delivery,
+        payment_mode=order.payment_type,
+        ordered_products=[
+            OrderedProductEmailModel(
+                name=product.products.name,
+                weight=product.prices.weight,
+                price=product.unit_price,
+                quantity=product.quantity,
             )
-            await self.mail.send_message(message_schema, template_name="order_to_email.html")
-            logger.info("Email sent successfully from the Sushka Shop")
-        except Exception as e:
-            logger.error(f"Error sending email from the Sushka Shop: {str(e)}")
-            raise e
+            for product in order.ordered_products
+        ],
+    )
+
+
+class EmailService:
+    template_name = "order_to_email.html"
+    cache_ttl = 86400
+
+    @staticmethod
+    def _cache_key(order_id: int) -> str:
+        return f"order_confirmation:{order_id}"
+
+    def cache_order_data(self, order_data: OrderEmailModel) -> None:
+        """
+        Keep the confirmation data built at checkout, so the outbox worker does not load the order again.
+        It lives in its own Redis database, the response cache database is flushed after every order.
+        """
+        redis_client = get_redis(settings.order_email_redis_db)
+        if redis_client:
+            redis_client.set(self._cache_key(order_data.order_id), pickle.dumps(order_data), ex=self.cache_ttl)
+
+    def cached_order_data(self, order_id: int) -> OrderEmailModel | None:
+        redis_client = get_redis(settings.order_email_redis_db)
+        cached = redis_client.get(self._cache_key(order_id)) if redis_client else None
+        return pickle.loads(cached) if cached else None
+
+    @staticmethod
+    def order_confirmation_message(order_data: OrderEmailModel) -> MessageSchema:
+        return mail_service.message(
+            subject="Order confirmation",
+            recipients=[order_data.email_customer],
+            template_name=EmailService.template_name,
+            data=dict(order_data),
+        )
 
 
 email_service = EmailService()
@@ -4,77 +4,60 @@ from fastapi import HTTPException, status
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
-from src.database.models import Basket, OrderedProduct, BasketItem
+from src.database.models import OrderedProduct, BasketItem, Price
 
 
 logger = logging.getLogger(__name__)
 
 
-async def calculate_basket_total_cost(basket: Basket):
-    """Determination of total order value"""
+async def calculate_ordered_products_total_cost(ordered_products: list[OrderedProduct]) -> float:
+    """Determination of total order value from the already validated prices"""
 
     total_cost = 0.0
 
-    if basket.basket_items:
-        for basket_item in basket.basket_items:
-            product = basket_item.product
-            price = next(
-                (p for p in product.prices if p.id == basket_item.price_id_by_the_user),
-                None
-            )
-
-            if price:
-                total_cost += float(price.price * basket_item.quantity)
+    for ordered_product in ordered_products:
+        total_cost += float(ordered_product.unit_price * ordered_product.quantity)
 
     return total_cost
 
 
-async def get_items_by_order_id(order_id: int, db: Session):
-    return db.query(OrderedProduct).filter(OrderedProduct.order_id == order_id)
+async def move_basket_items_to_ordered(
+        basket_items: list[BasketItem], prices: dict[int, Price]
+) -> list[OrderedProduct]:
+    """Build ordered products from the basket items, nothing is written to the database here"""
 
+    ordered_products = []
 
-async def calculate_basket_total_cost_for_anonym_user(order_id: int, db: Session):
-    """Determination of total order value for anonym user"""
+    for basket_item in basket_items:
+        price = prices.get(basket_item.price_id_by_the_user)
 
-    total_cost_order = 0.0
+        if not price or price.product_id != basket_item.product_id:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid price_id_by_the_user")
 
-    order_items = await get_items_by_order_id(order_id=order_id, db=db)
-
-    if order_items:
-        for item in order_items:
-            product = item.products
-            price = next(
-                (p for p in product.prices if p.id == item.price_id),
-                None
+        if basket_item.quantity <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid quantity. Product quantity must be greater than 0"
             )
 
-            if price:
-                total_cost_order += float(price.price * item.quantity)
-
-    return total_cost_order
-
-
-async def move_product_to_ordered(db: Session, basket_item: BasketItem) -> OrderedProduct | None:
-    ordered_product = OrderedProduct(
-        product_id=basket_item.product_id,
-        price_id=basket_item.price_id_by_the_user,
-        quantity=basket_item.quantity
-    )
-    db.add(ordered_product)
-    db.commit()
-    db.refresh(ordered_product)
+        ordered_products.append(
+            OrderedProduct(
+                product_id=basket_item.product_id,
+                products=price.product,
+                price_id=price.id,
+                prices=price,
+                quantity=basket_item.quantity,
+                unit_price=price.price,
+            )
+        )
 
-    if ordered_product.id is not None:
-        return ordered_product
-    else:
-        return None
+    return ordered_products
 
 
 async def delete_basket_items_by_basket_id(basket_id: int, db: Session):
-    """User Shopping Cart Cleaning"""
+    """User Shopping Cart Cleaning, the caller commits it together with the order"""
     try:
         db.query(BasketItem).filter(BasketItem.basket_id == basket_id).delete()
-        db.commit()
     except SQLAlchemyError as e:
         logger.exception("SQLAlchemyError")
         db.rollback()
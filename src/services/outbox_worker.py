@@ -0,0 +1,136 @@
+"""
+Sends the emails queued in the outbox_messages table.
+
+Runs as a separate process next to the web workers:
+
+    python -m src.services.outbox_worker
+"""
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Awaitable, Callable
+
+from fastapi_mail.connection import Connection
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.db import DBSession
+from src.database.models import OutboxMessage
+from src.repository import orders as repository_orders
+from src.repository import outbox as repository_outbox
+from src.services.admin_addresses import admin_addresses_cache
+from src.services.email import conf, mail_service
+from src.services.email_admin import email_admin_service
+from src.services.order_to_email import email_service, order_email_data
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxWorker:
+    """
+    Drains the outbox in batches.
+
+    A batch is locked, sent over one SMTP connection and its delivery status is stored
+    in one transaction. Failed messages are retried with exponential backoff.
+
+    Admin notifications are collected into a digest that is sent once admin_digest_max_orders
+    orders are waiting or the oldest of them has waited admin_digest_window_seconds.
+    """
+    batch_size = settings.outbox_batch_size
+    poll_seconds = settings.outbox_poll_seconds
+    digest_max_orders = settings.admin_digest_max_orders
+    digest_window = timedelta(seconds=settings.admin_digest_window_seconds)
+
+    @staticmethod
+    async def render_confirmation(message: OutboxMessage, db: Session):
+        # the data cached at checkout, the order is only loaded when the cache is gone
+        order_data = email_service.cached_order_data(message.order_id)
+        if not order_data:
+            order_data = order_email_data(await repository_orders.get_order_view(message.order_id, db))
+
+        message_schema = email_service.order_confirmation_message(order_data)
+        return await mail_service.build(message_schema)
+
+    @staticmethod
+    async def render_digest(emails: list[str], messages: list[OutboxMessage]):
+        message_schema = email_admin_service.admin_digest_message(emails, [message.order for message in messages])
+        return await mail_service.build(message_schema)
+
+    async def send_batch(self, db: Session) -> int:
+        """Send one batch of due messages, returns the number of processed messages"""
+        confirmations = await repository_outbox.lock_due_messages(self.batch_size, db)
+        admin_notifications = await repository_outbox.lock_due_admin_notifications(
+            self.digest_max_orders, self.digest_window, db
+        )
+
+        # every delivery is one email, it covers one or several outbox messages
+        deliveries: list[tuple[list[OutboxMessage], Callable[[], Awaitable]]] = [
+            ([message], lambda message=message: self.render_confirmation(message, db)) for message in confirmations
+        ]
+
+        if admin_notifications:
+            emails = admin_addresses_cache.get(db)
+            if emails:
+                deliveries.append((admin_notifications, lambda: self.render_digest(emails, admin_notifications)))
+            else:
+                logger.info("No admin addresses to notify about the new orders")
+                for message in admin_notifications:
+                    await repository_outbox.mark_sent(message)
+
+        if deliveries:
+            await self._deliver(deliveries)
+
+        db.commit()
+
+        processed = len(confirmations) + len(admin_notifications)
+        if processed:
+            logger.info(f"Outbox batch of {processed} messages processed, render timings: {mail_service.render_timings()}")
+        return processed
+
+    @staticmethod
+    async def _deliver(deliveries: list[tuple[list[OutboxMessage], Callable[[], Awaitable]]]) -> None:
+        delivered = 0
+        try:
+            async with Connection(conf) as connection:
+                for messages, render in deliveries:
+                    try:
+                        email = await render()
+                        if not conf.SUPPRESS_SEND:
+                            await connection.session.send_message(email)
+                        for message in messages:
+                            await repository_outbox.mark_sent(message)
+                    except Exception as e:
+                        logger.error(f"Failed to send the outbox messages {[m.id for m in messages]}: {str(e)}")
+                        for message in messages:
+                            await repository_outbox.mark_failed(message, str(e))
+                    delivered += 1
+        except Exception as e:
+            logger.error(f"Failed to connect to the mail server: {str(e)}")
+            for messages, _ in deliveries[delivered:]:
+                for message in messages:
+                    await repository_outbox.mark_failed(message, str(e))
+
+    async def run(self) -> None:
+        logger.info("Outbox worker started")
+        while True:
+            db = DBSession()
+            try:
+                processed = await self.send_batch(db)
+            except Exception as e:
+                logger.exception(f"Outbox batch failed: {str(e)}")
+                db.rollback()
+                processed = 0
+            finally:
+                db.close()
+
+            # a full batch means more messages are probably waiting
+            if processed < self.batch_size:
+                await asyncio.sleep(self.poll_seconds)
+
+
+outbox_worker = OutboxWorker()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(outbox_worker.run())
@@ -28,6 +28,8 @@ async def get_products_by_sort(limit: int, offset: int, sort: str, db: Session,
             return await repository_products.get_products_low_date(limit=limit, offset=offset, db=db)
         elif sort == "high_date":
             return await repository_products.get_products_high_date(limit=limit, offset=offset, db=db)
+        elif sort == "rating":
+            return await repository_products.get_products_rating(limit=limit, offset=offset, db=db)
 
     elif weight:
         if sort == "id":
@@ -42,6 +44,8 @@ async def get_products_by_sort(limit: int, offset: int, sort: str, db: Session,
             return await repository_products.get_products_low_date_with_weight(limit=limit, offset=offset, weight=weight, db=db)
         elif sort == "high_date":
             return await repository_products.get_products_high_date_with_weight(limit=limit, offset=offset, weight=weight, db=db)
+        elif sort == "rating":
+            return await repository_products.get_products_rating(limit=limit, offset=offset, weight=weight, db=db)
 
 
 async def get_products_by_sort_and_category_id(limit: int, offset: int, sort: str, pr_category_id: int, db: Session, weight: list[str] = None):
@@ -61,6 +65,8 @@ async def get_products_by_sort_and_category_id(limit: int, offset: int, sort: st
             return await repository_products.get_products_low_date_by_category_id(limit=limit, offset=offset, category_id=pr_category_id, db=db)
         elif sort == "high_date":
             return await repository_products.get_products_high_date_by_category_id(limit=limit, offset=offset, category_id=pr_category_id, db=db)
+        elif sort == "rating":
+            return await repository_products.get_products_rating(limit=limit, offset=offset, category_id=pr_category_id, db=db)
 
     elif weight:
         if sort == "id":
@@ -75,29 +81,38 @@ async def get_products_by_sort_and_category_id(limit: int, offset: int, sort: st
             return await repository_products.get_products_low_date_by_category_id_with_weight(limit=limit, offset=offset, category_id=pr_category_id, db=db, weight=weight)
         elif sort == "high_date":
             return await repository_products.get_products_high_date_by_category_id_with_weight(limit=limit, offset=offset, category_id=pr_category_id, db=db, weight=weight)
+        elif sort == "rating":
+            return await repository_products.get_products_rating(limit=limit, offset=offset, category_id=pr_category_id, db=db, weight=weight)
+
+
+def product_response(product: Product, prices: list) -> ProductResponse:
+    return ProductResponse(id=product.id,
+                           name=product.name,
+                           description=product.description,
+                           product_category_id=product.product_category_id,
+                           new_product=product.new_product,
+                           is_popular=product.is_popular,
+                           is_favorite=product.is_favorite,
+                           product_status=product.product_status,
+                           sub_categories=product.subcategories,
+                           images=[ImageResponse(id=item.id,
+                                                 product_id=item.product_id,
+                                                 image_url=CloudImage.get_transformation_image(item.image_url, "product"),
+                                                 description=item.description,
+                                                 image_type=item.image_type,
+                                                 main_image=item.main_image,
+                                                 srcset=item.srcset) for item in product.images],
+                           prices=prices,
+                           rating_count=product.rating_count,
+                           rating_average=product.rating_average,
+                           rating_histogram=product.rating_histogram)
 
 
 async def product_with_price_and_images_response(products: List[Type[Product]], db) -> list:
     result = []
     for product in products:
-        product_response = ProductResponse(id=product.id,
-                                           name=product.name,
-                                           description=product.description,
-                                           product_category_id=product.product_category_id,
-                                           new_product=product.new_product,
-                                           is_popular=product.is_popular,
-                                           is_favorite=product.is_favorite,
-                                           product_status=product.product_status,
-                                           sub_categories=product.subcategories,
-                                           images=[ImageResponse(id=item.id,
-                                                                 product_id=item.product_id,
-                                                                 image_url=CloudImage.get_transformation_image(item.image_url, "product"),
-                                                                 description=item.description,
-                                                                 image_type=item.image_type,
-                                                                 main_image=item.main_image) for item in product.images],
-                                           prices=await price_by_product(product, db))
-
-        result.append(product_response)
+        product_response_ = product_response(product, await price_by_product(product, db))
+        result.append(product_response_)
 
     return result
 
@@ -0,0 +1,31 @@
+from src.database.models import Review
+from src.schemas.images import ImageResponseReview
+from src.schemas.reviews import ReviewResponse
+from src.schemas.users import UserReviewResponse
+from src.services.cloud_image import CloudImage
+
+
+def review_response(review: Review) -> ReviewResponse:
+    """The review with its images, the first image is shown with the review transformation"""
+    images = [
+        ImageResponseReview(id=image.id,
+                            product_id=image.product_id,
+                            review_id=image.review_id,
+                            image_url=CloudImage.get_transformation_image(image.image_url, "review")
+                            if index == 0 else image.image_url,
+                            description=image.description,
+                            image_type=image.image_type,
+                            srcset=image.srcset)
+        for index, image in enumerate(review.images)
+    ]
+
+    return ReviewResponse(id=review.id,
+                          user_id=review.user_id,
+                          user=UserReviewResponse.from_orm(review.user),
+                          product_id=review.product_id,
+                          rating=review.rating,
+                          description=review.description,
+                          created_at=review.created_at,
+                          is_deleted=review.is_deleted,
+                          is_checked=review.is_checked,
+                          images=images)
@@ -1,18 +1,69 @@
+from datetime import date, timedelta
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
+from src.conf.config import settings
+
 from src.database.db import get_db
-from src.repository import nova_poshta as repository_novaposhta
+from src.repository import stock as repository_stock
+from src.repository import idempotency_keys as repository_idempotency_keys
+from src.repository import sales_analytics as repository_sales_analytics
+from src.repository import outbox as repository_outbox
+from src.services.basket_store import basket_store
+from src.services.idempotency import idempotency_service
+from src.services.settlement_index import settlement_directory
+from src.services.warehouse_directory import warehouse_directory
+from src.services.warehouse_locator import warehouse_locator
 
 scheduler = AsyncIOScheduler()
 
 
 async def scheduled_update():
     db = next(get_db())
-    await repository_novaposhta.update_warehouses_data(db=db)
+    await warehouse_directory.refresh(db=db)
+    warehouse_locator.invalidate()
+
+
+async def scheduled_update_settlements():
+    db = next(get_db())
+    await settlement_directory.refresh(db=db)
+
+
+async def scheduled_release_expired_stock_holds():
+    db = next(get_db())
+    await repository_stock.release_expired_holds(db=db)
+
+
+async def scheduled_delete_expired_idempotency_keys():
+    db = next(get_db())
+    await repository_idempotency_keys.delete_expired_idempotency_keys(ttl=idempotency_service.ttl, db=db)
+
+
+async def scheduled_reconcile_sales():
+    db = next(get_db())
+    date_from = date.today() - timedelta(days=settings.sales_reconciliation_days)
+    await repository_sales_analytics.reconcile(date_from=date_from, db=db)
+
+
+async def scheduled_delete_sent_outbox_messages():
+    db = next(get_db())
+    await repository_outbox.delete_sent_messages(older_than=timedelta(days=settings.outbox_retention_days), db=db)
+
+
+async def scheduled_flush_baskets():
+    db = next(get_db())
+    await basket_store.flush(db=db)
 
 
 def start_scheduler():
     scheduler.add_job(scheduled_update, "cron", hour=0, minute=0)
+    scheduler.add_job(scheduled_update_settlements, "cron", day_of_week="sun", hour=4, minute=0)
+    scheduler.add_job(scheduled_release_expired_stock_holds, "interval", minutes=5)
+    scheduler.add_job(scheduled_delete_expired_idempotency_keys, "cron", hour=1, minute=0)
+    scheduler.add_job(scheduled_reconcile_sales, "cron", hour=2, minute=0)
+    scheduler.add_job(scheduled_delete_sent_outbox_messages, "cron", hour=3, minute=0)
+    if basket_store.enabled:
+        scheduler.add_job(scheduled_flush_baskets, "interval", seconds=settings.basket_flush_seconds)
     scheduler.start()
 
 
@@ -0,0 +1,140 @@
+import asyncio
+import re
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.repository import nova_poshta as repository_novaposhta
+from src.services.nova_poshta_sync import SettlementSync, settlement_sync
+
+# Ukrainian and Russian letters in the Latin spelling, "Київ", "Киев", "Kyiv" and "Kiev" meet at "kiiv" or "kiev"
+CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "h", "д": "d", "е": "e", "є": "ie", "ё": "e", "ж": "zh",
+    "з": "z", "и": "i", "і": "i", "ї": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh",
+    "щ": "shch", "ь": "", "ъ": "", "ы": "i", "э": "e", "ю": "iu", "я": "ia",
+}
+# the same sounds spelled differently in Latin
+LATIN_FOLDING = {"y": "i", "j": "i", "g": "h", "w": "v", "q": "k", "x": "ks"}
+
+APOSTROPHES = re.compile(r"['’ʼ`]")
+SEPARATORS = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Lower case Latin spelling of a settlement name or a query, words separated by one space"""
+    text = APOSTROPHES.sub("", text.lower())
+    text = "".join(CYRILLIC_TO_LATIN.get(char, char) for char in text)
+    text = "".join(LATIN_FOLDING.get(char, char) for char in text)
+    return SEPARATORS.sub(" ", text).strip()
+
+
+def trigrams(key: str) -> set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SettlementIndex:
+    """
+    Prefix and trigram index over the normalized names of the settlements.
+
+    A query matches the start of the name or the start of any word of it (Ukrainian and
+    Russian names), found by binary search in the sorted name suffixes. When there are
+    not enough prefix matches, names sharing most trigrams with the query fill the rest,
+    so a typo still finds the settlement.
+    """
+    min_similarity = 0.5
+
+    def __init__(self, settlements: list[dict]):
+        self.settlements = settlements
+
+        entries = []
+        self._trigrams = defaultdict(set)
+        for position, settlement in enumerate(settlements):
+            for name in {settlement["name"], settlement["name_ru"]} - {None, ""}:
+                words = normalize(name).split()
+                for start in range(len(words)):
+                    entries.append((" ".join(words[start:]), start > 0, position))
+                for trigram in trigrams(" ".join(words)):
+                    self._trigrams[trigram].add(position)
+
+        entries.sort()
+        self._keys = [key for key, _, _ in entries]
+        self._entries = [(inner_word, position) for _, inner_word, position in entries]
+
+    def _rank(self, position: int) -> tuple:
+        settlement = self.settlements[position]
+        return not settlement["has_warehouses"], len(settlement["name"]), settlement["name"]
+
+    def suggest(self, query: str, limit: int) -> list[dict]:
+        key = normalize(query)
+        if not key:
+            return []
+
+        # the best match of every settlement: the whole name before a word of it
+        matches = {}
+        for i in range(bisect_left(self._keys, key), bisect_left(self._keys, key + "\x7f")):
+            inner_word, position = self._entries[i]
+            matches[position] = min(matches.get(position, True), inner_word)
+
+        ranked = sorted(matches, key=lambda position: (matches[position], *self._rank(position)))
+
+        if len(ranked) < limit:
+            query_trigrams = trigrams(key)
+            shared = Counter(
+                position for trigram in query_trigrams for position in self._trigrams.get(trigram, ())
+            )
+            similar = [
+                position for position, count in shared.items()
+                if position not in matches and count / len(query_trigrams) >= self.min_similarity
+            ]
+            similar.sort(key=lambda position: (-shared[position], *self._rank(position)))
+            ranked.extend(similar)
+
+        return [self.settlements[position] for position in ranked[:limit]]
+
+
+class SettlementDirectory:
+    """
+    The settlement index of this worker, built from nova_poshta_settlements on the first
+    suggestion and rebuilt after ttl seconds or after the settlements are loaded again.
+    """
+    ttl = settings.nova_poshta_directory_ttl_seconds
+
+    def __init__(self, sync: SettlementSync):
+        self.sync = sync
+        self._index: SettlementIndex | None = None
+        self._built = 0.0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self._index is not None and time.monotonic() - self._built < self.ttl
+
+    async def _get_index(self, db: Session) -> SettlementIndex:
+        if self._fresh():
+            return self._index
+
+        async with self._lock:
+            if not self._fresh():
+                rows = await repository_novaposhta.get_all_settlements(db)
+                settlements = [dict(row._mapping) for row in rows]
+                self._index = await run_in_threadpool(SettlementIndex, settlements)
+                self._built = time.monotonic()
+        return self._index
+
+    async def suggest(self, query: str, limit: int, db: Session) -> list[dict]:
+        index = await self._get_index(db)
+        return index.suggest(query, limit)
+
+    async def refresh(self, db: Session) -> int:
+        """Load the settlements again and drop the index of this worker, returns the number of settlements"""
+        loaded = await self.sync.run(db)
+        self._index = None
+        return loaded
+
+
+settlement_directory = SettlementDirectory(settlement_sync)
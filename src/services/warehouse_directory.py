@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.repository import nova_poshta as repository_novaposhta
+from src.services.nova_poshta_sync import WarehouseSync, warehouse_sync
+
+logger = logging.getLogger(__name__)
+
+
+class WarehouseDirectory:
+    """
+    Active warehouses of the cities kept in memory, by settlement_ref and category.
+
+    A city is loaded from the nova_poshta table the first time it is asked for and kept for
+    ttl seconds, so the workers that do not run the sync see its changes too. Up to max_cities
+    cities are kept, the least recently used one is dropped first.
+
+    A city that is not in the table yet is fetched from the API once and upserted, the lookups
+    never call the API for a known city, nor for a ref that is not a settlement with warehouses
+    in nova_poshta_settlements. While the API is unavailable such a city has no warehouses.
+    """
+    ttl = settings.nova_poshta_directory_ttl_seconds
+    max_cities = 2000
+
+    def __init__(self, sync: WarehouseSync):
+        self.sync = sync
+        self._cities: OrderedDict[str, tuple[float, dict[str, list[dict]]]] = OrderedDict()
+        # locks of the cities being loaded right now
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    @staticmethod
+    def _index(rows: list) -> dict[str, list[dict]]:
+        index = {}
+        for row in rows:
+            index.setdefault(row.category_warehouse, []).append({
+                "id": row.id,
+                "address_warehouse": row.address_warehouse,
+                "warehouse_number": row.warehouse_number or "",
+            })
+
+        # numbers are digits only, shorter numbers are smaller
+        for warehouses in index.values():
+            warehouses.sort(key=lambda warehouse: (len(warehouse["warehouse_number"]), warehouse["warehouse_number"]))
+        return index
+
+    def _cached(self, settle_ref: str) -> dict[str, list[dict]] | None:
+        cached = self._cities.get(settle_ref)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            self._cities.move_to_end(settle_ref)
+            return cached[1]
+        return None
+
+    def _store(self, settle_ref: str, index: dict[str, list[dict]]) -> None:
+        self._cities[settle_ref] = (time.monotonic(), index)
+        self._cities.move_to_end(settle_ref)
+        while len(self._cities) > self.max_cities:
+            self._cities.popitem(last=False)
+
+    async def _city(self, settle_ref: str, db: Session) -> dict[str, list[dict]]:
+        index = self._cached(settle_ref)
+        if index is not None:
+            return index
+
+        # concurrent lookups of the same city load it once
+        lock = self._locks.setdefault(settle_ref, asyncio.Lock())
+        try:
+            async with lock:
+                index = self._cached(settle_ref)
+                if index is None:
+                    index = await self._load(settle_ref, db)
+                return index
+        finally:
+            # a lookup still waiting for this lock finds the city loaded, a failed load is tried again
+            if self._locks.get(settle_ref) is lock:
+                del self._locks[settle_ref]
+
+    async def _load(self, settle_ref: str, db: Session) -> dict[str, list[dict]]:
+        rows = await repository_novaposhta.active_warehouses_of_city(settle_ref, db)
+        if not rows:
+            if not await repository_novaposhta.settlement_has_warehouses(settle_ref, db):
+                # not a settlement of Nova Poshta or one without warehouses, not worth asking the API
+                return {}
+
+            # a city without warehouses stays empty in the table, the cached answer saves asking the API
+            # for it again every time its index expires
+            if not await self.sync.sync_cities([settle_ref], db, use_cache=True):
+                # the API is unavailable, the city is asked for again with the next lookup
+                logger.warning(f"Warehouses of {settle_ref} are not in the database and were not fetched")
+                return {}
+            rows = await repository_novaposhta.active_warehouses_of_city(settle_ref, db)
+
+        index = self._index(rows)
+        self._store(settle_ref, index)
+        return index
+
+    async def search(self, settle_ref: str, category: str, search_term: str | None, db: Session) -> list[dict]:
+        """
+        Warehouses of the category in the city, sorted by number. With a search term it is
+        the warehouse with this number, or the warehouses whose number starts with it.
+
+        A search in a city that this worker does not keep is an indexed lookup by number,
+        the city is loaded only when the lookup finds nothing.
+        """
+        index = self._cached(settle_ref)
+        if index is None and search_term:
+            warehouses = await repository_novaposhta.get_warehouses_by_ref_and_number(
+                settle_ref, category, search_term, db
+            )
+            if warehouses:
+                return [dict(warehouse._mapping) for warehouse in warehouses]
+
+        if index is None:
+            index = await self._city(settle_ref, db)
+        warehouses = index.get(category, [])
+        if not search_term:
+            return list(warehouses)
+
+        for warehouse in warehouses:
+            if warehouse["warehouse_number"] == search_term:
+                return [warehouse]
+        return [warehouse for warehouse in warehouses if warehouse["warehouse_number"].startswith(search_term)]
+
+    def invalidate(self) -> None:
+        self._cities.clear()
+
+    async def refresh(self, db: Session) -> int:
+        """Sync all cities with the API and drop the cities kept by this worker, returns the number of synced cities"""
+        synced = await self.sync.run(db)
+        self.invalidate()
+        return synced
+
+
+warehouse_directory = WarehouseDirectory(warehouse_sync)
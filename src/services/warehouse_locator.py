@@ -0,0 +1,144 @@
+import asyncio
+import heapq
+import math
+import time
+from collections import defaultdict
+from operator import itemgetter
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.repository import nova_poshta as repository_novaposhta
+
+EARTH_RADIUS_KM = 6371.0
+# of a degree of latitude, and of longitude on the equator
+KM_PER_DEGREE = 111.32
+
+
+def distance_km(latitude: float, longitude: float, other_latitude: float, other_longitude: float) -> float:
+    """Great-circle distance by the haversine formula"""
+    d_latitude = math.radians(other_latitude - latitude)
+    d_longitude = math.radians(other_longitude - longitude)
+    a = (math.sin(d_latitude / 2) ** 2
+         + math.cos(math.radians(latitude)) * math.cos(math.radians(other_latitude)) * math.sin(d_longitude / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class GeoGrid:
+    """
+    Points in cells of cell_degrees by cell_degrees.
+
+    The nearest search walks the rings of cells around the cell of the point and stops as
+    soon as the next ring cannot hold a point closer than the k found ones, so it looks at
+    the neighbourhood of the point only, not at every point.
+    """
+
+    def __init__(self, points: list[dict], cell_degrees: float):
+        self.cell_degrees = cell_degrees
+        self._cells = defaultdict(list)
+        for point in points:
+            self._cells[self._cell(point["latitude"], point["longitude"])].append(point)
+
+        rows = [row for row, _ in self._cells]
+        columns = [column for _, column in self._cells]
+        self._bounds = (min(rows), max(rows), min(columns), max(columns)) if self._cells else None
+
+        # the shortest side of any cell, a degree of longitude gets shorter away from the equator
+        max_latitude = max((abs(point["latitude"]) for point in points), default=0)
+        self._cell_km = cell_degrees * KM_PER_DEGREE * math.cos(math.radians(min(max_latitude + cell_degrees, 89)))
+
+    def _cell(self, latitude: float, longitude: float) -> tuple[int, int]:
+        return math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees)
+
+    @staticmethod
+    def _ring(row: int, column: int, ring: int):
+        if ring == 0:
+            yield row, column
+            return
+        for d_column in range(-ring, ring + 1):
+            yield row - ring, column + d_column
+            yield row + ring, column + d_column
+        for d_row in range(-ring + 1, ring):
+            yield row + d_row, column - ring
+            yield row + d_row, column + ring
+
+    def nearest(self, latitude: float, longitude: float, k: int, radius_km: float = None) -> list[tuple[float, dict]]:
+        """Up to k (distance_km, point) pairs closest to the point, within radius_km when it is given"""
+        if not self._bounds:
+            return []
+
+        row, column = self._cell(latitude, longitude)
+        min_row, max_row, min_column, max_column = self._bounds
+        last_ring = max(abs(row - min_row), abs(row - max_row), abs(column - min_column), abs(column - max_column))
+        if radius_km is not None:
+            last_ring = min(last_ring, math.ceil(radius_km / self._cell_km) + 1)
+
+        # the k closest points so far, the closest first
+        found = []
+        for ring in range(last_ring + 1):
+            # a point of this ring or farther is at least (ring - 1) cells away
+            if len(found) == k and found[-1][0] <= (ring - 1) * self._cell_km:
+                break
+
+            for cell in self._ring(row, column, ring):
+                for point in self._cells.get(cell, ()):
+                    distance = distance_km(latitude, longitude, point["latitude"], point["longitude"])
+                    if radius_km is None or distance <= radius_km:
+                        found.append((distance, point))
+            found = heapq.nsmallest(k, found, key=itemgetter(0))
+
+        return found
+
+
+class WarehouseLocator:
+    """
+    Grids of the active warehouses with coordinates, one per category, kept in memory and
+    rebuilt from the nova_poshta table after ttl seconds or after a sync of this worker.
+    """
+    ttl = settings.nova_poshta_directory_ttl_seconds
+    cell_degrees = 0.1
+
+    def __init__(self):
+        self._grids: dict[str, GeoGrid] | None = None
+        self._built = 0.0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self._grids is not None and time.monotonic() - self._built < self.ttl
+
+    def _build(self, warehouses: list[dict]) -> dict[str, GeoGrid]:
+        by_category = defaultdict(list)
+        for warehouse in warehouses:
+            by_category[warehouse["category_warehouse"]].append(warehouse)
+        return {category: GeoGrid(points, self.cell_degrees) for category, points in by_category.items()}
+
+    async def _get_grids(self, db: Session) -> dict[str, GeoGrid]:
+        if self._fresh():
+            return self._grids
+
+        async with self._lock:
+            if not self._fresh():
+                rows = await repository_novaposhta.active_warehouses_with_location(db)
+                self._grids = await run_in_threadpool(self._build, [dict(row._mapping) for row in rows])
+                self._built = time.monotonic()
+        return self._grids
+
+    async def nearest(
+            self, category: str, latitude: float, longitude: float, limit: int, radius_km: float | None, db: Session
+    ) -> list[dict]:
+        """Warehouses of the category nearest to the point, the closest first, with their distance"""
+        grid = (await self._get_grids(db)).get(category)
+        if not grid:
+            return []
+
+        return [
+            {**warehouse, "distance_km": round(distance, 3)}
+            for distance, warehouse in grid.nearest(latitude, longitude, limit, radius_km)
+        ]
+
+    def invalidate(self) -> None:
+        self._grids = None
+
+
+warehouse_locator = WarehouseLocator()
@@ -0,0 +1,5 @@
+import os
+
+# the settings require these, the tests do not send mail
+os.environ.setdefault("MAIL_PORT", "465")
+os.environ.setdefault("MAIL_FROM", "test@example.com")
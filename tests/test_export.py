@@ -0,0 +1,36 @@
+import enum
+from datetime import datetime
+
+import pytest
+
+from src.services.export import _csv_value
+
+
+class Status(enum.Enum):
+    new = "new"
+
+
+@pytest.mark.parametrize("value", [
+    "=HYPERLINK(\"http://example.com\")",
+    "+380501234567",
+    "-2+3",
+    "@SUM(A1:A2)",
+    "\tcmd",
+    "\rcmd",
+])
+def test_formula_is_escaped(value):
+    assert _csv_value(value) == "'" + value
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("Київ", "Київ"),
+    ("a=b", "a=b"),
+    ("", ""),
+    (None, ""),
+    (Status.new, "new"),
+    (datetime(2024, 1, 2, 3, 4, 5), "2024-01-02 03:04:05"),
+    (-5, -5),
+    (1.5, 1.5),
+])
+def test_plain_values(value, expected):
+    assert _csv_value(value) == expected